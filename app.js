@@ -2768,6 +2768,7 @@ Ankara Çankaya
         if (this.analysisUpdateInterval) {
             clearInterval(this.analysisUpdateInterval);
         }
+        this.apiClient.stopEarthquakeStream();
         
         // Clean up charts
         Object.values(this.charts).forEach(chart => {
@@ -3189,6 +3190,58 @@ class APIClient {
         // Do not default to localhost for GitHub Pages; require explicit API_BASE_URL to enable backend calls.
         this.baseURL = window.RISKO_CONFIG?.API_BASE_URL || '';
         this.demoMode = window.RISKO_CONFIG?.DEMO_MODE || false;
+        // Live earthquakes pushed by the backend stream (key: "source:id")
+        this.liveEarthquakes = new Map();
+        this.maxLiveEarthquakes = 500;
+        this.earthquakeStream = null;
+    }
+
+    // Canlı deprem akışı: tüm sekmeler için sunucuda tek bir AFAD/Kandilli yoklayıcısı
+    startEarthquakeStream() {
+        if (this.earthquakeStream || !this.baseURL || typeof EventSource === 'undefined') {
+            return this.earthquakeStream;
+        }
+
+        const stream = new EventSource(`${this.baseURL}/api/v1/proxy/earthquakes/stream`);
+        stream.addEventListener('earthquake', (message) => {
+            try {
+                this.rememberEarthquakes([JSON.parse(message.data)]);
+            } catch (error) {
+                console.warn('Canlı deprem verisi okunamadı:', error);
+            }
+        });
+        stream.onerror = () => {
+            // EventSource reconnects by itself; CLOSED means the server refused the stream
+            if (stream.readyState === EventSource.CLOSED) {
+                console.warn('⚠️ Canlı deprem akışı kapandı, periyodik sorguya dönülüyor');
+                this.earthquakeStream = null;
+            }
+        };
+        this.earthquakeStream = stream;
+        return stream;
+    }
+
+    stopEarthquakeStream() {
+        if (this.earthquakeStream) {
+            this.earthquakeStream.close();
+            this.earthquakeStream = null;
+        }
+    }
+
+    isEarthquakeStreamLive() {
+        return !!this.earthquakeStream
+            && this.earthquakeStream.readyState === EventSource.OPEN
+            && this.liveEarthquakes.size > 0;
+    }
+
+    rememberEarthquakes(events) {
+        events.forEach(event => {
+            this.liveEarthquakes.set(`${event.source}:${event.id}`, event);
+        });
+        // Map keeps insertion order, so the oldest entries are dropped first
+        while (this.liveEarthquakes.size > this.maxLiveEarthquakes) {
+            this.liveEarthquakes.delete(this.liveEarthquakes.keys().next().value);
+        }
     }
 
     async request(endpoint, options = {}) {
@@ -3266,15 +3319,33 @@ class APIClient {
 
     async getAFADData(location) {
         console.log('🔍 AFAD gerçek verilerini çekiliyor...');
+
+        // Once the stream is open, new events arrive pushed; the proxies below are only the fallback
+        this.startEarthquakeStream();
+        if (this.isEarthquakeStreamLive()) {
+            return {
+                ...this.processRealAFADData(Array.from(this.liveEarthquakes.values()), location),
+                data_source: 'AFAD/Kandilli (Canlı akış)'
+            };
+        }
         
         try {
             // Prefer server-side proxy to avoid CORS issues when deployed
-            if (this.apiClient && this.apiClient.baseURL) {
-                const proxyUrl = `${this.apiClient.baseURL}/api/v1/proxy/afad/events?limit=100`;
+            if (this.baseURL) {
+                const proxyUrl = `${this.baseURL}/api/v1/proxy/afad/events?limit=100`;
                 const proxyResp = await fetch(proxyUrl);
                 if (proxyResp.ok) {
                     const earthquakeData = await proxyResp.json();
                     console.log('✅ AFAD gerçek deprem verisi alındı (proxy):', earthquakeData.length || 0, 'deprem');
+                    // Seed the live buffer so the stream only has to deliver newer events
+                    this.rememberEarthquakes((earthquakeData || []).map(eq => ({
+                        id: String(eq.eventID ?? eq.eventId ?? eq.id),
+                        source: 'afad',
+                        magnitude: eq.magnitude,
+                        latitude: eq.latitude,
+                        longitude: eq.longitude,
+                        time: eq.date
+                    })));
                     return this.processRealAFADData(earthquakeData, location);
                 }
             } else {
@@ -3304,8 +3375,8 @@ class APIClient {
 
         try {
             // Kandilli via proxy if available
-            if (this.apiClient && this.apiClient.baseURL) {
-                const kandilliProxy = `${this.apiClient.baseURL}/api/v1/proxy/kandilli/recent`;
+            if (this.baseURL) {
+                const kandilliProxy = `${this.baseURL}/api/v1/proxy/kandilli/recent`;
                 const kandResp = await fetch(kandilliProxy);
                 if (kandResp.ok) {
                     const kandilliData = await kandResp.json();
@@ -4664,6 +4735,7 @@ class APIClient {
             this.realtimeInterval = null;
             console.log('⏹️ Gerçek zamanlı güncellemeler durduruldu');
         }
+        this.stopEarthquakeStream();
         
         this.showRealtimeStatus(false);
     }
@@ -0,0 +1,154 @@
+"""typed analysis columns, indexes and monthly partitioning
+
+Revision ID: 0002_typed_partitioned_analyses
+Revises: 0001_create_analyses_table
+Create Date: 2026-10-18
+
+Brings ``analyses`` in line with the model: ``user_id`` and the full JSON
+``risk_scores`` next to typed latitude/longitude, component scores, overall
+score and risk level, plus indexes for history, statistics and map queries.
+
+On PostgreSQL the table is rebuilt as a range-partitioned table on
+``created_at`` (one partition per month and a default partition); existing
+rows are copied over and typed columns missing in the old table are filled
+from the JSON result (and vice versa). The primary key becomes
+``(id, created_at)`` because the partition key must be part of it.
+Other dialects only get the missing columns and the indexes.
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.partitions import add_months, ensure_analysis_partitions, month_start
+
+revision = '0002_typed_partitioned_analyses'
+down_revision = '0001_create_analyses_table'
+branch_labels = None
+depends_on = None
+
+SCORE_COLUMNS = ('earthquake_risk', 'flood_risk', 'fire_risk', 'landslide_risk', 'overall_risk_score')
+FLOAT_COLUMNS = ('latitude', 'longitude') + SCORE_COLUMNS
+INDEXES = (
+    ('ix_analyses_address', ['address']),
+    ('ix_analyses_user_id_created_at', ['user_id', 'created_at']),
+    ('ix_analyses_created_at', ['created_at']),
+    ('ix_analyses_overall_risk_score', ['overall_risk_score']),
+    ('ix_analyses_risk_level', ['risk_level']),
+    ('ix_analyses_lat_lon', ['latitude', 'longitude']),
+)
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _copy_select(old_columns):
+    """SELECT list mapping the legacy table onto the new column set."""
+    user_id = 'user_id' if 'user_id' in old_columns else ('owner_id' if 'owner_id' in old_columns else 'NULL')
+    if 'risk_scores' in old_columns:
+        risk_scores = 'risk_scores'
+    else:
+        pairs = ", ".join(f"'{c}', {c}" for c in FLOAT_COLUMNS + ('risk_level', 'address') if c in old_columns)
+        risk_scores = f"json_build_object({pairs})"
+
+    def typed(column, cast):
+        if column in old_columns:
+            return column
+        if 'risk_scores' in old_columns:
+            return f"NULLIF(risk_scores::jsonb ->> '{column}', '')::{cast}"
+        return 'NULL'
+
+    values = [user_id, 'address', risk_scores]
+    values += [typed(c, 'double precision') for c in FLOAT_COLUMNS]
+    values += [typed('risk_level', 'varchar(16)'), 'COALESCE(created_at, now())']
+    return ", ".join(values)
+
+
+def _upgrade_postgresql():
+    bind = op.get_bind()
+    old_columns = _columns('analyses')
+    op.rename_table('analyses', 'analyses_unpartitioned')
+    op.execute('ALTER INDEX IF EXISTS analyses_pkey RENAME TO analyses_unpartitioned_pkey')
+    # Index names must be free for the partitioned parent
+    for name, _ in INDEXES + (('ix_analyses_id', None), ('ix_analyses_user_id', None), ('ix_analyses_owner_id', None)):
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+
+    float_defs = ",\n            ".join(f"{c} DOUBLE PRECISION" for c in FLOAT_COLUMNS)
+    op.execute(f"""
+        CREATE TABLE analyses (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            user_id VARCHAR,
+            address VARCHAR NOT NULL,
+            risk_scores JSON NOT NULL,
+            {float_defs},
+            risk_level VARCHAR(16),
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute('CREATE TABLE analyses_default PARTITION OF analyses DEFAULT')
+    for name, columns in INDEXES:
+        op.create_index(name, 'analyses', columns)
+
+    oldest = bind.execute(sa.text('SELECT min(created_at) FROM analyses_unpartitioned')).scalar()
+    first_month = month_start(oldest) if oldest else month_start(datetime.utcnow())
+    # Keep at most two years of history in monthly partitions; older rows go to the default partition
+    first_month = max(first_month, add_months(month_start(datetime.utcnow()), -24))
+    ensure_analysis_partitions(bind, first_month=first_month)
+
+    target = ", ".join(('user_id', 'address', 'risk_scores') + FLOAT_COLUMNS + ('risk_level', 'created_at'))
+    op.execute(f"INSERT INTO analyses ({target}) SELECT {_copy_select(old_columns)} FROM analyses_unpartitioned")
+    op.execute("SELECT setval(pg_get_serial_sequence('analyses', 'id'), COALESCE((SELECT max(id) FROM analyses), 0) + 1, false)")
+    op.drop_table('analyses_unpartitioned')
+
+
+def _upgrade_other():
+    old_columns = _columns('analyses')
+    with op.batch_alter_table('analyses') as batch:
+        if 'owner_id' in old_columns and 'user_id' not in old_columns:
+            batch.alter_column('owner_id', new_column_name='user_id', existing_type=sa.String(), nullable=True)
+        if 'risk_scores' not in old_columns:
+            batch.add_column(sa.Column('risk_scores', sa.JSON(), nullable=True))
+        for column in FLOAT_COLUMNS:
+            if column not in old_columns:
+                batch.add_column(sa.Column(column, sa.Float(), nullable=True))
+        if 'risk_level' not in old_columns:
+            batch.add_column(sa.Column('risk_level', sa.String(16), nullable=True))
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('analyses')}
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'analyses', columns)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        _upgrade_postgresql()
+    else:
+        _upgrade_other()
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.rename_table('analyses', 'analyses_partitioned')
+        op.execute('ALTER INDEX IF EXISTS analyses_pkey RENAME TO analyses_partitioned_pkey')
+        for name, _ in INDEXES:
+            op.execute(f'DROP INDEX IF EXISTS {name}')
+        op.create_table(
+            'analyses',
+            sa.Column('id', sa.Integer(), primary_key=True, nullable=False, autoincrement=True),
+            sa.Column('owner_id', sa.String(), nullable=True, index=True),
+            sa.Column('address', sa.String(), nullable=False),
+            *[sa.Column(c, sa.Float(), nullable=True) for c in FLOAT_COLUMNS],
+            sa.Column('risk_level', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        )
+        columns = ", ".join(('address',) + FLOAT_COLUMNS + ('risk_level', 'created_at'))
+        op.execute(f"INSERT INTO analyses (owner_id, {columns}) SELECT user_id, {columns} FROM analyses_partitioned")
+        op.execute('DROP TABLE analyses_partitioned CASCADE')
+    else:
+        for name, _ in INDEXES:
+            op.drop_index(name, table_name='analyses')
+        with op.batch_alter_table('analyses') as batch:
+            batch.drop_column('risk_scores')
+            batch.alter_column('user_id', new_column_name='owner_id', existing_type=sa.String())
@@ -0,0 +1,149 @@
+"""content-addressed analysis results
+
+Revision ID: 0003_content_addressed_results
+Revises: 0002_typed_partitioned_analyses
+Create Date: 2026-10-18
+
+Moves the result payload (address, JSON result and typed score columns) out
+of ``analyses`` into ``analysis_results``, keyed by the SHA-256 of the
+canonical JSON result, so identical results are stored once. ``analyses``
+keeps the user, the time and a ``result_hash`` reference.
+
+Existing rows are hashed in Python, in batches, with the same function the
+application uses, so old and new rows share result entries.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.analysis import AnalysisResult
+
+revision = '0003_content_addressed_results'
+down_revision = '0002_typed_partitioned_analyses'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+FLOAT_COLUMNS = ('latitude', 'longitude', 'earthquake_risk', 'flood_risk', 'fire_risk', 'landslide_risk', 'overall_risk_score')
+PAYLOAD_COLUMNS = ('address', 'risk_scores') + FLOAT_COLUMNS + ('risk_level',)
+OLD_INDEXES = ('ix_analyses_address', 'ix_analyses_overall_risk_score', 'ix_analyses_risk_level', 'ix_analyses_lat_lon')
+RESULT_INDEXES = (
+    ('ix_analysis_results_address', ['address']),
+    ('ix_analysis_results_overall_risk_score', ['overall_risk_score']),
+    ('ix_analysis_results_risk_level', ['risk_level']),
+    ('ix_analysis_results_lat_lon', ['latitude', 'longitude']),
+)
+
+
+def _analyses_table():
+    return sa.Table(
+        'analyses', sa.MetaData(),
+        sa.Column('id', sa.BigInteger()),
+        sa.Column('result_hash', sa.String(64)),
+        sa.Column('address', sa.String()),
+        sa.Column('risk_scores', sa.JSON()),
+        *[sa.Column(c, sa.Float()) for c in FLOAT_COLUMNS],
+        sa.Column('risk_level', sa.String(16)),
+        sa.Column('created_at', sa.DateTime()),
+    )
+
+
+def _results_table():
+    return sa.Table(
+        'analysis_results', sa.MetaData(),
+        sa.Column('result_hash', sa.String(64)),
+        sa.Column('address', sa.String()),
+        sa.Column('risk_scores', sa.JSON()),
+        *[sa.Column(c, sa.Float()) for c in FLOAT_COLUMNS],
+        sa.Column('risk_level', sa.String(16)),
+        sa.Column('created_at', sa.DateTime()),
+    )
+
+
+def _backfill(bind):
+    analyses, results = _analyses_table(), _results_table()
+    stored = set()
+    last_id = None
+    while True:
+        query = sa.select(analyses).where(analyses.c.result_hash.is_(None)).order_by(analyses.c.id).limit(BATCH_SIZE)
+        if last_id is not None:
+            query = query.where(analyses.c.id > last_id)
+        rows = bind.execute(query).mappings().all()
+        if not rows:
+            return
+        new_results, updates = {}, []
+        for row in rows:
+            payload = row['risk_scores'] or {c: row[c] for c in PAYLOAD_COLUMNS if c != 'risk_scores'}
+            result_hash = AnalysisResult.hash_result(payload)
+            updates.append({'row_id': row['id'], 'result_hash': result_hash})
+            if result_hash not in stored:
+                values = {c: row[c] for c in FLOAT_COLUMNS + ('risk_level',)}
+                new_results[result_hash] = {
+                    'result_hash': result_hash, 'address': row['address'], 'risk_scores': payload,
+                    'created_at': row['created_at'], **values,
+                }
+        existing = bind.execute(
+            sa.select(results.c.result_hash).where(results.c.result_hash.in_(list(new_results)))
+        ).scalars().all() if new_results else []
+        for result_hash in existing:
+            new_results.pop(result_hash, None)
+        if new_results:
+            bind.execute(results.insert(), list(new_results.values()))
+        stored.update(u['result_hash'] for u in updates)
+        bind.execute(
+            analyses.update().where(analyses.c.id == sa.bindparam('row_id')).values(result_hash=sa.bindparam('result_hash')),
+            updates,
+        )
+        last_id = rows[-1]['id']
+
+
+def upgrade() -> None:
+    op.create_table(
+        'analysis_results',
+        sa.Column('result_hash', sa.String(64), primary_key=True),
+        sa.Column('address', sa.String(), nullable=False),
+        sa.Column('risk_scores', sa.JSON(), nullable=False),
+        *[sa.Column(c, sa.Float(), nullable=True) for c in FLOAT_COLUMNS],
+        sa.Column('risk_level', sa.String(16), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    )
+    for name, columns in RESULT_INDEXES:
+        op.create_index(name, 'analysis_results', columns)
+
+    op.add_column('analyses', sa.Column('result_hash', sa.String(64), nullable=True))
+    _backfill(op.get_bind())
+
+    for name in OLD_INDEXES:
+        op.drop_index(name, table_name='analyses')
+    with op.batch_alter_table('analyses') as batch:
+        batch.alter_column('result_hash', existing_type=sa.String(64), nullable=False)
+        for column in PAYLOAD_COLUMNS:
+            batch.drop_column(column)
+        batch.create_foreign_key('fk_analyses_result_hash', 'analysis_results', ['result_hash'], ['result_hash'])
+    op.create_index('ix_analyses_result_hash', 'analyses', ['result_hash'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_analyses_result_hash', table_name='analyses')
+    with op.batch_alter_table('analyses') as batch:
+        batch.drop_constraint('fk_analyses_result_hash', type_='foreignkey')
+        batch.add_column(sa.Column('address', sa.String(), nullable=True))
+        batch.add_column(sa.Column('risk_scores', sa.JSON(), nullable=True))
+        for column in FLOAT_COLUMNS:
+            batch.add_column(sa.Column(column, sa.Float(), nullable=True))
+        batch.add_column(sa.Column('risk_level', sa.String(16), nullable=True))
+
+    assignments = ", ".join(
+        f"{c} = (SELECT r.{c} FROM analysis_results r WHERE r.result_hash = analyses.result_hash)"
+        for c in PAYLOAD_COLUMNS
+    )
+    op.execute(f"UPDATE analyses SET {assignments}")
+
+    with op.batch_alter_table('analyses') as batch:
+        batch.alter_column('address', existing_type=sa.String(), nullable=False)
+        batch.alter_column('risk_scores', existing_type=sa.JSON(), nullable=False)
+        batch.drop_column('result_hash')
+    op.create_index('ix_analyses_address', 'analyses', ['address'])
+    op.create_index('ix_analyses_overall_risk_score', 'analyses', ['overall_risk_score'])
+    op.create_index('ix_analyses_risk_level', 'analyses', ['risk_level'])
+    op.create_index('ix_analyses_lat_lon', 'analyses', ['latitude', 'longitude'])
+    op.drop_table('analysis_results')
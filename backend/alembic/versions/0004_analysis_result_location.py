@@ -0,0 +1,50 @@
+"""geography point and GiST index on analysis results
+
+Revision ID: 0004_analysis_result_location
+Revises: 0003_content_addressed_results
+Create Date: 2026-10-18
+
+Adds ``analysis_results.location``, a ``geography(Point, 4326)`` column
+generated from latitude/longitude (so existing rows are filled by the ALTER
+and new rows need no application change), with a GiST index for
+``ST_DWithin`` radius and bounding-box searches.
+
+Only applies to PostgreSQL with PostGIS available; other databases use the
+in-process grid index in ``app.services.spatial``.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004_analysis_result_location'
+down_revision = '0003_content_addressed_results'
+branch_labels = None
+depends_on = None
+
+
+def _postgis_available(bind) -> bool:
+    return bind.execute(
+        sa.text("SELECT count(*) FROM pg_available_extensions WHERE name = 'postgis'")
+    ).scalar() > 0
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or not _postgis_available(bind):
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS postgis')
+    op.execute("""
+        ALTER TABLE analysis_results ADD COLUMN location geography(Point, 4326)
+        GENERATED ALWAYS AS (
+            CASE WHEN latitude IS NOT NULL AND longitude IS NOT NULL
+                 THEN ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography
+            END
+        ) STORED
+    """)
+    op.execute('CREATE INDEX ix_analysis_results_location ON analysis_results USING GIST (location)')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP INDEX IF EXISTS ix_analysis_results_location')
+    op.execute('ALTER TABLE analysis_results DROP COLUMN IF EXISTS location')
@@ -0,0 +1,50 @@
+"""risk_data as a read-through cache of component scores
+
+Revision ID: 0005_risk_data_cache
+Revises: 0004_analysis_result_location
+Create Date: 2026-10-18
+
+Creates ``risk_data`` keyed by ``cell_key`` (rounded latitude/longitude plus
+building age) with ``data_version`` and an index on ``updated_at`` for
+staleness checks and clean-up. The table was defined by the model but never
+created or written before, so it is (re)created empty.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005_risk_data_cache'
+down_revision = '0004_analysis_result_location'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('risk_data'):
+        op.drop_table('risk_data')
+    op.create_table(
+        'risk_data',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('cell_key', sa.String(64), nullable=False),
+        sa.Column('address', sa.String(), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('earthquake_risk', sa.Float(), nullable=True),
+        sa.Column('flood_risk', sa.Float(), nullable=True),
+        sa.Column('fire_risk', sa.Float(), nullable=True),
+        sa.Column('landslide_risk', sa.Float(), nullable=True),
+        sa.Column('overall_risk_score', sa.Float(), nullable=True),
+        sa.Column('building_age', sa.Integer(), nullable=True),
+        sa.Column('construction_quality', sa.String(), nullable=True),
+        sa.Column('data_version', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('metadata', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_risk_data_id', 'risk_data', ['id'])
+    op.create_index('ix_risk_data_cell_key', 'risk_data', ['cell_key'], unique=True)
+    op.create_index('ix_risk_data_address', 'risk_data', ['address'])
+    op.create_index('ix_risk_data_updated_at', 'risk_data', ['updated_at'])
+
+
+def downgrade() -> None:
+    op.drop_table('risk_data')
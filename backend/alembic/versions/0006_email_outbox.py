@@ -0,0 +1,38 @@
+"""email outbox for background delivery
+
+Revision ID: 0006_email_outbox
+Revises: 0005_risk_data_cache
+Create Date: 2026-10-18
+
+Creates ``email_outbox``. Request handlers insert messages here and the
+background sender delivers them in batches, polling on
+``(status, next_attempt_at)``.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006_email_outbox'
+down_revision = '0005_risk_data_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('to_email', sa.String(255), nullable=False),
+        sa.Column('subject', sa.String(255), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(16), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_email_outbox_status_next_attempt_at', 'email_outbox', ['status', 'next_attempt_at'])
+
+
+def downgrade() -> None:
+    op.drop_table('email_outbox')
@@ -0,0 +1,86 @@
+"""hashed, expiring auth tokens
+
+Revision ID: 0007_hashed_auth_tokens
+Revises: 0006_email_outbox
+Create Date: 2026-10-18
+
+``refresh_tokens`` and ``password_reset_tokens`` stored tokens in plain
+text. Replace the ``token`` column with ``token_hash`` (SHA-256 hex,
+unique index), backfilled from the existing values so issued tokens keep
+working, and index ``expires_at`` for the token sweeper
+(``refresh_tokens.expires_at`` is new: creation time plus the 30-day token
+lifetime; revoked rows are due immediately).
+
+These tables are created by ``init_db`` rather than by a migration; where
+they do not exist yet this revision does nothing and ``create_all`` creates
+them with the new columns.
+"""
+import hashlib
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0007_hashed_auth_tokens'
+down_revision = '0006_email_outbox'
+branch_labels = None
+depends_on = None
+
+REFRESH_TOKEN_LIFETIME = timedelta(days=30)
+
+
+def _backfill_hashes(name: str, with_expiry: bool) -> None:
+    bind = op.get_bind()
+    now = datetime.utcnow()
+    table = sa.table(
+        name, sa.column('id', sa.Integer), sa.column('token', sa.String), sa.column('token_hash', sa.String),
+        sa.column('created_at', sa.DateTime), sa.column('revoked', sa.Boolean), sa.column('expires_at', sa.DateTime),
+    )
+    columns = [table.c.id, table.c.token] + ([table.c.created_at, table.c.revoked] if with_expiry else [])
+    for row in bind.execute(sa.select(*columns)).fetchall():
+        values = {'token_hash': hashlib.sha256(row.token.encode()).hexdigest()}
+        if with_expiry:
+            values['expires_at'] = now if row.revoked else (row.created_at or now) + REFRESH_TOKEN_LIFETIME
+        bind.execute(table.update().where(table.c.id == row.id).values(**values))
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if inspector.has_table('refresh_tokens'):
+        op.add_column('refresh_tokens', sa.Column('token_hash', sa.String(64), nullable=True))
+        op.add_column('refresh_tokens', sa.Column('expires_at', sa.DateTime(), nullable=True))
+        _backfill_hashes('refresh_tokens', with_expiry=True)
+        with op.batch_alter_table('refresh_tokens') as batch:
+            batch.drop_index('ix_refresh_tokens_token')
+            batch.drop_column('token')
+            batch.alter_column('token_hash', existing_type=sa.String(64), nullable=False)
+            batch.alter_column('expires_at', existing_type=sa.DateTime(), nullable=False)
+            batch.create_index('ix_refresh_tokens_token_hash', ['token_hash'], unique=True)
+            batch.create_index('ix_refresh_tokens_expires_at', ['expires_at'])
+
+    if inspector.has_table('password_reset_tokens'):
+        op.add_column('password_reset_tokens', sa.Column('token_hash', sa.String(64), nullable=True))
+        _backfill_hashes('password_reset_tokens', with_expiry=False)
+        with op.batch_alter_table('password_reset_tokens') as batch:
+            batch.drop_index('ix_password_reset_tokens_token')
+            batch.drop_column('token')
+            batch.alter_column('token_hash', existing_type=sa.String(64), nullable=False)
+            batch.create_index('ix_password_reset_tokens_token_hash', ['token_hash'], unique=True)
+            batch.create_index('ix_password_reset_tokens_expires_at', ['expires_at'])
+
+
+def downgrade() -> None:
+    # Plain-text tokens cannot be recovered from their hashes; outstanding tokens are invalidated
+    inspector = sa.inspect(op.get_bind())
+    for table in ('refresh_tokens', 'password_reset_tokens'):
+        if not inspector.has_table(table):
+            continue
+        with op.batch_alter_table(table) as batch:
+            batch.drop_index(f'ix_{table}_expires_at')
+            batch.drop_index(f'ix_{table}_token_hash')
+            batch.alter_column('token_hash', new_column_name='token', existing_type=sa.String(64),
+                               type_=sa.String(255))
+            if table == 'refresh_tokens':
+                batch.drop_column('expires_at')
+        op.create_index(f'ix_{table}_token', table, ['token'], unique=True)
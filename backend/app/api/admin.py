@@ -0,0 +1,57 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.core.profiler import StackSampler, profiler_state
+
+router = APIRouter()
+
+
+async def verify_admin_key(x_admin_key: Optional[str] = Header(None)):
+    """Verify the operator key for admin endpoints."""
+    if not settings.ADMIN_API_KEYS:
+        raise HTTPException(status_code=403, detail="Admin endpoints disabled")
+    if not x_admin_key:
+        raise HTTPException(status_code=401, detail="Admin key required")
+    if x_admin_key not in settings.ADMIN_API_KEYS:
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+    return x_admin_key
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=60),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    by_route: bool = False,
+    admin_key: str = Depends(verify_admin_key)
+):
+    """
+    Sample the Python stacks of this worker for N seconds.
+    Returns a collapsed-stack file for flamegraph tools; `by_route=true`
+    prefixes samples with the route being served on the event loop.
+    """
+    if not profiler_state.lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+    try:
+        profiler_state.loop = asyncio.get_running_loop()
+        profiler_state.loop_thread_id = threading.get_ident()
+        sampler = StackSampler(interval=interval_ms / 1000.0, attribute_routes=by_route)
+        await anyio.to_thread.run_sync(sampler.run, seconds)
+    finally:
+        profiler_state.lock.release()
+
+    filename = f"risko-profile-{os.getpid()}-{int(time.time())}.collapsed"
+    return PlainTextResponse(
+        sampler.collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Samples": str(sampler.sample_count),
+        },
+    )
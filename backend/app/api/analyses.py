@@ -1,22 +1,22 @@
 from typing import Optional, List
 
 from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 
-from app.db.session import get_db
+from app.db.session import get_db_session, fetch_all
 from app.models.analysis import Analysis
-from app.services.supabase_auth import verify_supabase_jwt
+from app.services.supabase_auth import verify_supabase_jwt_async
 
 router = APIRouter()
 
 
 @router.get('/analyses/me')
-def get_my_analyses(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)):
+async def get_my_analyses(authorization: Optional[str] = Header(None), db=Depends(get_db_session)):
     if not authorization or not authorization.lower().startswith('bearer '):
         raise HTTPException(status_code=401, detail="Authorization required")
     token = authorization.split(' ', 1)[1]
     try:
-        claims = verify_supabase_jwt(token)
+        claims = await verify_supabase_jwt_async(token)
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
@@ -25,14 +25,15 @@ def get_my_analyses(authorization: Optional[str] = Header(None), db: Session = D
     if not user_id:
         raise HTTPException(status_code=401, detail="User id not found in token")
 
-    records = db.query(Analysis).filter(Analysis.user_id == user_id).order_by(Analysis.created_at.desc()).all()
+    # No session is opened (or connection checked out) until here
+    records = await fetch_all(db, select(Analysis).where(Analysis.user_id == user_id).order_by(Analysis.created_at.desc()))
     # Return simplified list
     result = []
     for r in records:
-        rs = r.risk_scores or {}
+        rs = r.result.risk_scores or {}
         result.append({
             'id': r.id,
-            'address': r.address,
+            'address': r.result.address,
             'overall_risk_score': rs.get('overall_risk_score'),
             'created_at': r.created_at.isoformat() if r.created_at else None,
             'risk_scores': rs,
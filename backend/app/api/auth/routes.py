@@ -1,9 +1,10 @@
 from datetime import datetime, timedelta
 from typing import Optional
+import secrets
 
+from anyio import to_thread
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from jose import jwt, JWTError
 from pydantic import BaseModel, EmailStr
 from sqlalchemy.orm import Session
 
@@ -12,16 +13,19 @@ from app.db.session import get_db
 from app.services.user_service import (
     create_user,
     get_user_by_email,
-    verify_password,
     create_password_reset_token,
     get_valid_password_reset,
     mark_password_reset_used,
     update_user_password,
+    store_refresh_token,
+    get_active_refresh_token,
+    revoke_refresh_token,
 )
 from app.schemas.user import UserCreate, UserPublic, Token
-from app.models.user import RefreshToken
 from app.services.email_service import send_password_reset_email
 from app.services.supabase_auth import verify_supabase_jwt
+from app.services.user_cache import user_cache
+from app.services.password_hasher import HasherBusy, password_hasher
 
 
 router = APIRouter()
@@ -29,6 +33,16 @@ router = APIRouter()
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 8
 REFRESH_TOKEN_EXPIRE_DAYS = 30
 ALGORITHM = "HS256"
+
+
+async def _hashing(operation):
+    """Await a password_hasher call; a full hashing queue becomes 503 instead of an unbounded wait."""
+    try:
+        return await operation
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Sunucu yoğun, lütfen tekrar deneyin")
+
+
 @router.get("/config")
 def auth_config():
     if settings.AUTH_PROVIDER == "supabase":
@@ -47,6 +61,7 @@ def create_access_token(subject: str, expires_delta: Optional[timedelta] = None)
         expires_delta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     expire = datetime.utcnow() + expires_delta
     to_encode = {"exp": expire, "sub": subject, "type": "access"}
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -55,11 +70,17 @@ def create_refresh_token(subject: str, expires_delta: Optional[timedelta] = None
     if expires_delta is None:
         expires_delta = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     expire = datetime.utcnow() + expires_delta
-    to_encode = {"exp": expire, "sub": subject, "type": "refresh"}
+    # jti keeps two tokens issued to the same user in the same second distinct
+    to_encode = {"exp": expire, "sub": subject, "type": "refresh", "jti": secrets.token_hex(8)}
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def refresh_token_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+
 def get_current_user_from_token(authorization: Optional[str], db: Session) -> UserPublic:
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Yetkilendirme gerekli")
@@ -75,28 +96,41 @@ def get_current_user_from_token(authorization: Optional[str], db: Session) -> Us
         except Exception:
             raise HTTPException(status_code=401, detail="Geçersiz token")
     # Default local JWT
+    from jose import jwt, JWTError
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
         if payload.get("type") != "access":
             raise HTTPException(status_code=401, detail="Geçersiz token türü")
         email = payload.get("sub")
+        # Recently resolved users skip the database (entries are dropped on password change/deactivation/logout)
+        cached = user_cache.get(email)
+        if cached is not None:
+            return cached
         user = get_user_by_email(db, email)
         if not user:
             raise HTTPException(status_code=401, detail="Kullanıcı bulunamadı")
-        return UserPublic.model_validate(user)
+        if user.is_active is False:
+            raise HTTPException(status_code=401, detail="Hesap devre dışı")
+        public = UserPublic.model_validate(user)
+        user_cache.put(email, public)
+        return public
     except JWTError:
         raise HTTPException(status_code=401, detail="Geçersiz token")
 
 
 @router.post("/register", response_model=UserPublic)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: Session = Depends(get_db)):
     if settings.AUTH_PROVIDER == "supabase":
         # Registration should be handled on the frontend via Supabase; backend returns 405
         raise HTTPException(status_code=405, detail="Register is handled by Supabase")
-    existing = get_user_by_email(db, user.email)
+    existing = await to_thread.run_sync(get_user_by_email, db, user.email)
     if existing:
         raise HTTPException(status_code=400, detail="Kullanıcı zaten var")
-    created = create_user(db, name=user.name, email=user.email, password=user.password)
+    # bcrypt runs on the dedicated hashing pool, database calls on the shared threadpool
+    password_hash = await _hashing(password_hasher.hash(user.password))
+    created = await to_thread.run_sync(
+        lambda: create_user(db, name=user.name, email=user.email, password_hash=password_hash)
+    )
     return UserPublic.model_validate(created)
 
 
@@ -128,20 +162,29 @@ def admin_register(user: AdminCreateUser):
 
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     if settings.AUTH_PROVIDER == "supabase":
         # Login handled by Supabase on the client; backend does not issue tokens
         raise HTTPException(status_code=405, detail="Login is handled by Supabase")
     # OAuth2PasswordRequestForm fields: username, password
-    user = get_user_by_email(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.password_hash):
+    user = await to_thread.run_sync(get_user_by_email, db, form_data.username)
+    if not user:
+        raise HTTPException(status_code=400, detail="E-posta veya şifre hatalı")
+    valid, new_hash = await _hashing(password_hasher.verify_and_update(form_data.password, user.password_hash))
+    if not valid:
         raise HTTPException(status_code=400, detail="E-posta veya şifre hatalı")
     access = create_access_token(subject=user.email)
     refresh = create_refresh_token(subject=user.email)
-    # Persist refresh token
-    rt = RefreshToken(user_id=user.id, token=refresh)
-    db.add(rt)
-    db.commit()
+
+    def persist():
+        if new_hash:
+            # Stored hash used outdated cost parameters; upgrade it now that we know the password
+            user.password_hash = new_hash
+        # Persist refresh token
+        store_refresh_token(db, user, refresh, refresh_token_expiry())
+        db.commit()
+
+    await to_thread.run_sync(persist)
     return Token(access_token=access, refresh_token=refresh)
 
 
@@ -154,13 +197,14 @@ def refresh_token(body: RefreshRequest, db: Session = Depends(get_db)):
     if settings.AUTH_PROVIDER == "supabase":
         raise HTTPException(status_code=405, detail="Refresh is handled by Supabase")
     token_str = body.refresh_token
+    from jose import jwt, JWTError
     try:
         payload = jwt.decode(token_str, settings.SECRET_KEY, algorithms=[ALGORITHM])
         if payload.get("type") != "refresh":
             raise HTTPException(status_code=401, detail="Geçersiz token türü")
         email = payload.get("sub")
         # Check token exists and not revoked
-        stored = db.query(RefreshToken).filter(RefreshToken.token == token_str, RefreshToken.revoked == False).first()
+        stored = get_active_refresh_token(db, token_str)
         if not stored:
             raise HTTPException(status_code=401, detail="Token iptal edilmiş veya bulunamadı")
         user = get_user_by_email(db, email)
@@ -168,8 +212,9 @@ def refresh_token(body: RefreshRequest, db: Session = Depends(get_db)):
             raise HTTPException(status_code=401, detail="Kullanıcı bulunamadı")
         # Rotate refresh token
         stored.revoked = True
+        stored.expires_at = datetime.utcnow()
         new_refresh = create_refresh_token(subject=user.email)
-        db.add(RefreshToken(user_id=user.id, token=new_refresh))
+        store_refresh_token(db, user, new_refresh, refresh_token_expiry())
         db.commit()
         new_access = create_access_token(subject=user.email)
         return Token(access_token=new_access, refresh_token=new_refresh)
@@ -190,10 +235,10 @@ class LogoutRequest(BaseModel):
 def logout(body: LogoutRequest = None, db: Session = Depends(get_db)):
     # Stateless JWT for access; optionally revoke provided refresh token
     if body and body.refresh_token:
-        rt = db.query(RefreshToken).filter(RefreshToken.token == body.refresh_token).first()
-        if rt:
-            rt.revoked = True
+        if revoke_refresh_token(db, body.refresh_token):
             db.commit()
+            from jose import jwt
+            user_cache.invalidate(jwt.get_unverified_claims(body.refresh_token).get("sub"))
     return {"status": "ok"}
 
 
@@ -212,7 +257,7 @@ def password_reset_request(body: PasswordResetRequest, db: Session = Depends(get
     if user:
         token = create_password_reset_token(db, user)
         # E-posta gönder (SMTP yoksa loglanır)
-        send_password_reset_email(user.email, token)
+        send_password_reset_email(user.email, token, db)
     # Production'da token'ı dönmeyiz; burada geliştirme için veriyoruz
     resp = {"status": "ok"}
     if settings.ENVIRONMENT != "production" and token:
@@ -226,16 +271,25 @@ class PasswordResetConfirm(BaseModel):
 
 
 @router.post("/password-reset/confirm")
-def password_reset_confirm(body: PasswordResetConfirm, db: Session = Depends(get_db)):
+async def password_reset_confirm(body: PasswordResetConfirm, db: Session = Depends(get_db)):
     if settings.AUTH_PROVIDER == "supabase":
         raise HTTPException(status_code=405, detail="Password reset is handled by Supabase")
-    rec = get_valid_password_reset(db, body.token)
+    from app.models.user import User as UserModel
+
+    def lookup():
+        rec = get_valid_password_reset(db, body.token)
+        return rec, rec and db.query(UserModel).filter_by(id=rec.user_id).first()
+
+    rec, user = await to_thread.run_sync(lookup)
     if not rec:
         raise HTTPException(status_code=400, detail="Geçersiz veya süresi dolmuş bağlantı")
-    from app.models.user import User as UserModel
-    user = db.query(UserModel).filter_by(id=rec.user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
-    update_user_password(db, user, body.password)
-    mark_password_reset_used(db, rec)
+    password_hash = await _hashing(password_hasher.hash(body.password))
+
+    def save():
+        update_user_password(db, user, password_hash=password_hash)
+        mark_password_reset_used(db, rec)
+
+    await to_thread.run_sync(save)
     return {"status": "ok"}
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, Header, Depends
+from datetime import datetime, timedelta
+from fastapi import APIRouter, HTTPException, Header, Depends, Query
+from anyio import to_thread
 from typing import Optional, List
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from sqlalchemy import case, func, select
+from app.db.session import get_db_session, fetch_one, run_in_session
+from app.models.analysis import Analysis, AnalysisResult
 from app.schemas.risk import AddressInput, RiskScoreResponse, DetailedRiskReport
 from app.services.risk_calculator import risk_service
+from app.services.analysis_writer import analysis_writer
 from app.services.recommendations import recommendation_service
+from app.services.spatial import MAX_BBOX_DEGREES, find_nearby
 from app.core.config import settings
-from app.models.analysis import Analysis
 
 router = APIRouter()
 
@@ -27,8 +31,7 @@ async def verify_api_key(x_api_key: Optional[str] = Header(None)):
 @router.post("/batch-analyze", response_model=List[RiskScoreResponse])
 async def batch_analyze(
     addresses: List[AddressInput],
-    api_key: str = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    api_key: str = Depends(verify_api_key)
 ):
     """
     Batch analysis for multiple addresses (B2B API).
@@ -40,16 +43,12 @@ async def batch_analyze(
     results = []
     
     for address_input in addresses:
-        result = risk_service.analyze_address(address_input.address, address_input.building_age)
+        result = await to_thread.run_sync(
+            risk_service.analyze_address, address_input.address, address_input.building_age
+        )
         if 'error' not in result:
             # Save each result
-            try:
-                record = Analysis(user_id=None, address=result.get('address') or address_input.address, risk_scores=result)
-                db.add(record)
-                db.commit()
-                db.refresh(record)
-            except Exception:
-                pass
+            analysis_writer.submit(None, result.get('address') or address_input.address, result)
             results.append(RiskScoreResponse(**result))
     
     return results
@@ -65,7 +64,7 @@ async def premium_analyze(
     Premium analysis with additional parameters (B2B API).
     Includes building age and construction quality assessment.
     """
-    result = risk_service.analyze_address(address_input.address, building_age)
+    result = await to_thread.run_sync(risk_service.analyze_address, address_input.address, building_age)
     
     if 'error' in result:
         raise HTTPException(status_code=404, detail=result['error'])
@@ -99,20 +98,83 @@ async def premium_analyze(
 @router.get("/risk-statistics")
 async def get_risk_statistics(
     region: Optional[str] = None,
-    api_key: str = Depends(verify_api_key)
+    days: int = Query(30, ge=1, le=365),
+    api_key: str = Depends(verify_api_key),
+    db=Depends(get_db_session)
 ):
     """
     Get aggregated risk statistics for a region (B2B API).
     For insurance companies to understand regional risk patterns.
+    Aggregates the typed score columns of analyses stored in the last `days` days.
     """
-    # In production, this would query the database for statistics
+    def share(level):
+        return func.sum(case((AnalysisResult.risk_level == level, 1), else_=0))
+
+    stmt = select(
+        func.count(Analysis.id),
+        func.avg(AnalysisResult.earthquake_risk),
+        func.avg(AnalysisResult.flood_risk),
+        func.avg(AnalysisResult.fire_risk),
+        func.avg(AnalysisResult.landslide_risk),
+        share("high"),
+        share("critical"),
+    ).join(AnalysisResult, Analysis.result_hash == AnalysisResult.result_hash).where(
+        Analysis.created_at >= datetime.utcnow() - timedelta(days=days)
+    )
+    if region:
+        stmt = stmt.where(AnalysisResult.address.ilike(f"%{region}%"))
+
+    try:
+        row = await fetch_one(db, stmt)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Statistics are temporarily unavailable")
+    total, eq, flood, fire, landslide, high, critical = row
+
+    def pct(n):
+        return round(100.0 * (n or 0) / total, 1) if total else 0.0
+
     return {
         "region": region or "Turkey",
-        "average_earthquake_risk": 52.3,
-        "average_flood_risk": 28.7,
-        "average_fire_risk": 31.5,
-        "average_landslide_risk": 24.8,
-        "total_analyzed_addresses": 15847,
-        "high_risk_percentage": 34.2,
-        "critical_risk_percentage": 12.5
+        "average_earthquake_risk": round(eq or 0, 1),
+        "average_flood_risk": round(flood or 0, 1),
+        "average_fire_risk": round(fire or 0, 1),
+        "average_landslide_risk": round(landslide or 0, 1),
+        "total_analyzed_addresses": total,
+        "high_risk_percentage": pct(high),
+        "critical_risk_percentage": pct(critical)
     }
+
+
+@router.get("/nearby")
+async def get_nearby_analyses(
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius_m: float = Query(1000, gt=0, le=50000),
+    bbox: Optional[str] = Query(None, description="min_lat,min_lon,max_lat,max_lon"),
+    limit: int = Query(50, ge=1, le=500),
+    api_key: str = Depends(verify_api_key),
+    db=Depends(get_db_session)
+):
+    """
+    Previously analysed locations around a point or inside a bounding box (B2B API).
+    Gives underwriters neighbourhood context: nearest results first, with average scores.
+    """
+    box = None
+    if bbox:
+        try:
+            box = tuple(float(v) for v in bbox.split(","))
+        except ValueError:
+            box = ()
+        if len(box) != 4 or box[0] > box[2] or box[1] > box[3]:
+            raise HTTPException(status_code=400, detail="bbox must be min_lat,min_lon,max_lat,max_lon")
+        if box[2] - box[0] > MAX_BBOX_DEGREES or box[3] - box[1] > MAX_BBOX_DEGREES:
+            raise HTTPException(status_code=400, detail=f"bbox sides must be at most {MAX_BBOX_DEGREES} degrees")
+    elif lat is None or lon is None:
+        raise HTTPException(status_code=400, detail="Either lat and lon or bbox is required")
+
+    try:
+        return await run_in_session(
+            db, find_nearby, lat=lat, lon=lon, radius_m=None if box else radius_m, bbox=box, limit=limit
+        )
+    except Exception:
+        raise HTTPException(status_code=503, detail="Nearby analyses are temporarily unavailable")
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from app.core.config import settings
+from app.services.quake_feed import earthquake_feed
+import asyncio
 import httpx
+import json
 from typing import Optional
 
 router = APIRouter()
@@ -40,6 +44,40 @@ async def kandilli_recent():
         raise HTTPException(status_code=502, detail=str(e))
 
 
+@router.get('/proxy/earthquakes/stream')
+async def earthquake_stream(request: Request):
+    """Server-Sent Events stream of new AFAD/Kandilli earthquakes.
+
+    All clients share one upstream poller per worker; slow clients are dropped
+    once their buffer fills and are expected to reconnect.
+    """
+    try:
+        sub = earthquake_feed.subscribe()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def event_source():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield f"id: {event['source']}:{event['id']}\nevent: earthquake\ndata: {json.dumps(event)}\n\n"
+        finally:
+            earthquake_feed.unsubscribe(sub)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(event_source(), media_type="text/event-stream", headers=headers)
+
+
 @router.get('/proxy/weather')
 async def weather(lat: float, lon: float):
     # Prefer OpenWeather if API key provided, else try Weatherbit
@@ -1,8 +1,6 @@
 from fastapi import APIRouter, HTTPException, Header, Depends
+from anyio import to_thread
 from typing import Optional
-from sqlalchemy.orm import Session
-from app.db.session import get_db
-from app.models.analysis import Analysis
 from app.schemas.risk import (
     AddressInput, 
     RiskScoreResponse, 
@@ -10,6 +8,7 @@ from app.schemas.risk import (
     RiskVisualization
 )
 from app.services.risk_calculator import risk_service
+from app.services.analysis_writer import analysis_writer
 from app.services.recommendations import recommendation_service
 
 router = APIRouter()
@@ -17,49 +16,40 @@ router = APIRouter()
 
 # Public endpoints (Freemium)
 @router.post("/analyze", response_model=RiskScoreResponse)
-async def analyze_address(address_input: AddressInput, db: Session = Depends(get_db)):
+async def analyze_address(address_input: AddressInput):
     """
     Analyze risk for a given address (Free tier - basic risk score).
     Returns overall risk score and individual risk scores.
     """
-    result = risk_service.analyze_address(address_input.address, address_input.building_age)
+    result = await to_thread.run_sync(
+        risk_service.analyze_address, address_input.address, address_input.building_age
+    )
 
     if 'error' in result:
         raise HTTPException(status_code=404, detail=result['error'])
 
     # Persist analysis to DB (MVP: user_id is None for public analyses)
-    try:
-        record = Analysis(user_id=None, address=result.get('address') or address_input.address, risk_scores=result)
-        db.add(record)
-        db.commit()
-        db.refresh(record)
-    except Exception:
-        # On DB failure, continue returning result but log is handled by global handler
-        pass
+    analysis_writer.submit(None, result.get('address') or address_input.address, result)
 
     return RiskScoreResponse(**result)
 
 
 @router.post("/analyze/detailed", response_model=DetailedRiskReport)
-async def get_detailed_report(address_input: AddressInput, db: Session = Depends(get_db)):
+async def get_detailed_report(address_input: AddressInput):
     """
     Get detailed risk report with recommendations and analysis (Premium feature).
     Includes personalized recommendations and detailed analysis.
     """
     # For MVP premium endpoint: return basic analysis plus a static placeholder message
-    result = risk_service.analyze_address(address_input.address, address_input.building_age)
+    result = await to_thread.run_sync(
+        risk_service.analyze_address, address_input.address, address_input.building_age
+    )
 
     if 'error' in result:
         raise HTTPException(status_code=404, detail=result['error'])
 
     # Save to DB
-    try:
-        record = Analysis(user_id=None, address=result.get('address') or address_input.address, risk_scores=result)
-        db.add(record)
-        db.commit()
-        db.refresh(record)
-    except Exception:
-        pass
+    analysis_writer.submit(None, result.get('address') or address_input.address, result)
 
     risk_score = RiskScoreResponse(**result)
 
@@ -78,7 +68,7 @@ async def get_visualization_data(address_input: AddressInput):
     Get risk visualization data for mapping (Premium feature).
     Returns GeoJSON data and heat map layers.
     """
-    result = risk_service.analyze_address(address_input.address)
+    result = await to_thread.run_sync(risk_service.analyze_address, address_input.address)
     
     if 'error' in result:
         raise HTTPException(status_code=404, detail=result['error'])
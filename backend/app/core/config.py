@@ -21,13 +21,57 @@ class Settings(BaseSettings):
     
     # Database - for MVP use a Postgres URL (e.g. Supabase). Do NOT use sqlite in production.
     DATABASE_URL: Optional[str] = None
+    # Create missing tables (Base.metadata.create_all) when a worker starts; disable when
+    # the schema is managed by Alembic or created once by the entrypoint
+    DB_CREATE_ALL_ON_STARTUP: bool = True
+    # Connection pool per worker process (total = workers * (size + overflow))
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_TIMEOUT: int = 30
+    # Async engine (asyncpg); DB_ASYNC_URL defaults to DATABASE_URL with the async driver
+    DB_ASYNC: bool = False
+    DB_ASYNC_URL: Optional[str] = None
+    # Write-behind persistence of analyses: flush every N ms or M rows, buffer at most K rows
+    ANALYSIS_WRITE_BEHIND: bool = True
+    ANALYSIS_FLUSH_INTERVAL_MS: int = 200
+    ANALYSIS_FLUSH_MAX_ROWS: int = 500
+    ANALYSIS_BUFFER_MAX_ROWS: int = 10000
+    # Archival of old analyses to Parquet (python -m app.db.archive)
+    ANALYSIS_ARCHIVE_DIR: str = "archive"
+    ANALYSIS_ARCHIVE_AFTER_DAYS: int = 365
+    # Read-through cache of component scores in risk_data (keyed by rounded location)
+    RISK_CACHE_ENABLED: bool = True
+    RISK_CACHE_MAX_AGE_HOURS: int = 168
+    RISK_CACHE_PRECISION: int = 3
+    RISK_CACHE_LOCAL_SIZE: int = 10000
+    RISK_CACHE_FLUSH_SECONDS: float = 1.0
+    RISK_DATA_VERSION: int = 1
     
     # API Keys for B2B
     API_KEY_HEADER: str = "X-API-Key"
     B2B_API_KEYS: List[str] = ["demo-api-key-123", "test-api-key-456"]
+    # Operator keys for /admin endpoints (profiling); admin endpoints are disabled when empty
+    ADMIN_API_KEYS: List[str] = []
     
+    # Password hashing: bcrypt cost, and the dedicated hashing pool (threads, max queued hashes)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
     # Redis
     REDIS_URL: Optional[str] = None
+    # Users resolved from local access tokens are cached per worker for this long;
+    # with REDIS_URL, invalidations are broadcast to all workers on this channel
+    USER_CACHE_TTL_SECONDS: int = 30
+    USER_CACHE_CHANNEL: str = "risko:user-cache:invalidate"
+    # Background deletion of expired/revoked refresh and password reset tokens
+    TOKEN_SWEEP_ENABLED: bool = True
+    TOKEN_SWEEP_INTERVAL_SECONDS: int = 300
+    TOKEN_SWEEP_BATCH_SIZE: int = 1000
+    # Scheduled creation of upcoming monthly analyses partitions (PostgreSQL)
+    PARTITION_MAINTENANCE_ENABLED: bool = True
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 86400
     
     # Rate limiting
     RATE_LIMIT_PER_MINUTE: int = 60
@@ -45,6 +89,13 @@ class Settings(BaseSettings):
     SMTP_USERNAME: Optional[str] = None
     SMTP_PASSWORD: Optional[str] = None
     SMTP_TLS: bool = True
+    SMTP_IDLE_SECONDS: int = 60
+    # E-mail outbox: background delivery in batches, retried with exponential backoff
+    EMAIL_OUTBOX_POLL_SECONDS: float = 5.0
+    EMAIL_BATCH_SIZE: int = 50
+    EMAIL_MAX_ATTEMPTS: int = 6
+    EMAIL_RETRY_BASE_SECONDS: int = 30
+    EMAIL_RETRY_MAX_SECONDS: int = 3600
 
     # Auth Provider: "local" (default) or "supabase"
     AUTH_PROVIDER: str = "local"
@@ -56,6 +107,11 @@ class Settings(BaseSettings):
     # JWT verify settings for Supabase (RS256)
     SUPABASE_JWT_ALG: str = "RS256"
     SUPABASE_JWKS_URL: Optional[str] = None
+    # JWKS is refreshed in the background after this many seconds; unknown kids refetch at most this often
+    JWKS_REFRESH_SECONDS: int = 3600
+    JWKS_MIN_REFETCH_SECONDS: int = 30
+    # Verified token claims remembered per worker (until each token's exp)
+    JWT_CLAIMS_CACHE_SIZE: int = 10000
 
     # Map & Geocoding (Google Maps alternative)
     MAP_PROVIDER: str = "leaflet"  # leaflet | maplibre
@@ -73,6 +129,20 @@ class Settings(BaseSettings):
     OPENWEATHER_API_KEY: Optional[str] = None
     WEATHERBIT_API_KEY: Optional[str] = None
 
+    # Live earthquake feed (Server-Sent Events)
+    QUAKE_FEED_POLL_SECONDS: float = 30.0
+    QUAKE_FEED_CLIENT_BUFFER: int = 100
+    QUAKE_FEED_MAX_CLIENTS: int = 1000
+
+    # Metrics: directory where each worker writes its snapshot for cross-worker aggregation
+    METRICS_MULTIPROC_DIR: Optional[str] = None
+
+    # Tracing: fraction of requests traced, and where finished traces are exported (OTLP/JSON)
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_EXPORT_FILE: Optional[str] = None
+    TRACE_OTLP_ENDPOINT: Optional[str] = None
+    TRACE_SERVICE_NAME: str = "risko-backend"
+
 
 # Use a tolerant runtime settings object built from environment variables. pydantic's
 # Settings() can fail during import when docker-compose provides non-JSON serialised
@@ -105,9 +175,72 @@ settings = SimpleNamespace(
     ALLOWED_HOSTS=_safe_list_from_env('ALLOWED_HOSTS', ['*']),
     CORS_ORIGINS=_safe_list_from_env('CORS_ORIGINS', ['*']),
     DATABASE_URL=os.environ.get('DATABASE_URL'),
+    DB_CREATE_ALL_ON_STARTUP=os.environ.get('DB_CREATE_ALL_ON_STARTUP', 'true').lower() in ('1', 'true', 'yes'),
+    DB_POOL_SIZE=int(os.environ.get('DB_POOL_SIZE', '5')),
+    DB_MAX_OVERFLOW=int(os.environ.get('DB_MAX_OVERFLOW', '5')),
+    DB_POOL_RECYCLE=int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+    DB_POOL_TIMEOUT=int(os.environ.get('DB_POOL_TIMEOUT', '30')),
+    DB_ASYNC=os.environ.get('DB_ASYNC', 'false').lower() in ('1', 'true', 'yes'),
+    DB_ASYNC_URL=os.environ.get('DB_ASYNC_URL') or None,
+    ANALYSIS_WRITE_BEHIND=os.environ.get('ANALYSIS_WRITE_BEHIND', 'true').lower() in ('1', 'true', 'yes'),
+    ANALYSIS_FLUSH_INTERVAL_MS=int(os.environ.get('ANALYSIS_FLUSH_INTERVAL_MS', '200')),
+    ANALYSIS_FLUSH_MAX_ROWS=int(os.environ.get('ANALYSIS_FLUSH_MAX_ROWS', '500')),
+    ANALYSIS_BUFFER_MAX_ROWS=int(os.environ.get('ANALYSIS_BUFFER_MAX_ROWS', '10000')),
+    ANALYSIS_ARCHIVE_DIR=os.environ.get('ANALYSIS_ARCHIVE_DIR', 'archive'),
+    ANALYSIS_ARCHIVE_AFTER_DAYS=int(os.environ.get('ANALYSIS_ARCHIVE_AFTER_DAYS', '365')),
+    RISK_CACHE_ENABLED=os.environ.get('RISK_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+    RISK_CACHE_MAX_AGE_HOURS=int(os.environ.get('RISK_CACHE_MAX_AGE_HOURS', '168')),
+    RISK_CACHE_PRECISION=int(os.environ.get('RISK_CACHE_PRECISION', '3')),
+    RISK_CACHE_LOCAL_SIZE=int(os.environ.get('RISK_CACHE_LOCAL_SIZE', '10000')),
+    RISK_CACHE_FLUSH_SECONDS=float(os.environ.get('RISK_CACHE_FLUSH_SECONDS', '1')),
+    RISK_DATA_VERSION=int(os.environ.get('RISK_DATA_VERSION', '1')),
     B2B_API_KEYS=_safe_list_from_env('B2B_API_KEYS', []),
+    BCRYPT_ROUNDS=int(os.environ.get('BCRYPT_ROUNDS', '12')),
+    PASSWORD_HASH_WORKERS=int(os.environ.get('PASSWORD_HASH_WORKERS', '2')),
+    PASSWORD_HASH_MAX_QUEUE=int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '64')),
+    REDIS_URL=os.environ.get('REDIS_URL') or None,
+    USER_CACHE_TTL_SECONDS=int(os.environ.get('USER_CACHE_TTL_SECONDS', '30')),
+    USER_CACHE_CHANNEL=os.environ.get('USER_CACHE_CHANNEL', 'risko:user-cache:invalidate'),
+    TOKEN_SWEEP_ENABLED=os.environ.get('TOKEN_SWEEP_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+    TOKEN_SWEEP_INTERVAL_SECONDS=int(os.environ.get('TOKEN_SWEEP_INTERVAL_SECONDS', '300')),
+    TOKEN_SWEEP_BATCH_SIZE=int(os.environ.get('TOKEN_SWEEP_BATCH_SIZE', '1000')),
+    PARTITION_MAINTENANCE_ENABLED=os.environ.get('PARTITION_MAINTENANCE_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS=int(os.environ.get('PARTITION_MAINTENANCE_INTERVAL_SECONDS', '86400')),
+    AUTH_PROVIDER=os.environ.get('AUTH_PROVIDER', 'local'),
+    SUPABASE_URL=os.environ.get('SUPABASE_URL') or None,
+    SUPABASE_ANON_KEY=os.environ.get('SUPABASE_ANON_KEY') or None,
+    SUPABASE_SERVICE_ROLE_KEY=os.environ.get('SUPABASE_SERVICE_ROLE_KEY') or None,
+    SUPABASE_JWT_ALG=os.environ.get('SUPABASE_JWT_ALG', 'RS256'),
+    SUPABASE_JWKS_URL=os.environ.get('SUPABASE_JWKS_URL') or None,
+    JWKS_REFRESH_SECONDS=int(os.environ.get('JWKS_REFRESH_SECONDS', '3600')),
+    JWKS_MIN_REFETCH_SECONDS=int(os.environ.get('JWKS_MIN_REFETCH_SECONDS', '30')),
+    JWT_CLAIMS_CACHE_SIZE=int(os.environ.get('JWT_CLAIMS_CACHE_SIZE', '10000')),
+    FRONTEND_BASE_URL=os.environ.get('FRONTEND_BASE_URL') or None,
+    SMTP_HOST=os.environ.get('SMTP_HOST') or None,
+    SMTP_PORT=int(os.environ['SMTP_PORT']) if os.environ.get('SMTP_PORT') else None,
+    SMTP_USERNAME=os.environ.get('SMTP_USERNAME') or None,
+    SMTP_PASSWORD=os.environ.get('SMTP_PASSWORD') or None,
+    SMTP_TLS=os.environ.get('SMTP_TLS', 'true').lower() in ('1', 'true', 'yes'),
+    SMTP_IDLE_SECONDS=int(os.environ.get('SMTP_IDLE_SECONDS', '60')),
+    EMAIL_OUTBOX_POLL_SECONDS=float(os.environ.get('EMAIL_OUTBOX_POLL_SECONDS', '5')),
+    EMAIL_BATCH_SIZE=int(os.environ.get('EMAIL_BATCH_SIZE', '50')),
+    EMAIL_MAX_ATTEMPTS=int(os.environ.get('EMAIL_MAX_ATTEMPTS', '6')),
+    EMAIL_RETRY_BASE_SECONDS=int(os.environ.get('EMAIL_RETRY_BASE_SECONDS', '30')),
+    EMAIL_RETRY_MAX_SECONDS=int(os.environ.get('EMAIL_RETRY_MAX_SECONDS', '3600')),
+    ADMIN_API_KEYS=_safe_list_from_env('ADMIN_API_KEYS', []),
     MAP_PROVIDER=os.environ.get('MAP_PROVIDER', 'leaflet'),
     TILE_URL=os.environ.get('TILE_URL', 'https://tile.openstreetmap.org/{z}/{x}/{y}.png'),
     NOMINATIM_URL=os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org'),
-    MAPTILER_API_KEY=os.environ.get('MAPTILER_API_KEY')
+    MAPTILER_API_KEY=os.environ.get('MAPTILER_API_KEY'),
+    AFAD_API_URL=os.environ.get('AFAD_API_URL', 'https://deprem.afad.gov.tr/apiv2'),
+    KANDILLI_API_URL=os.environ.get('KANDILLI_API_URL'),
+    KANDILLI_HTTPS_URL=os.environ.get('KANDILLI_HTTPS_URL'),
+    QUAKE_FEED_POLL_SECONDS=float(os.environ.get('QUAKE_FEED_POLL_SECONDS', '30')),
+    QUAKE_FEED_CLIENT_BUFFER=int(os.environ.get('QUAKE_FEED_CLIENT_BUFFER', '100')),
+    QUAKE_FEED_MAX_CLIENTS=int(os.environ.get('QUAKE_FEED_MAX_CLIENTS', '1000')),
+    METRICS_MULTIPROC_DIR=os.environ.get('METRICS_MULTIPROC_DIR') or None,
+    TRACE_SAMPLE_RATE=float(os.environ.get('TRACE_SAMPLE_RATE', '0')),
+    TRACE_EXPORT_FILE=os.environ.get('TRACE_EXPORT_FILE') or None,
+    TRACE_OTLP_ENDPOINT=os.environ.get('TRACE_OTLP_ENDPOINT') or None,
+    TRACE_SERVICE_NAME=os.environ.get('TRACE_SERVICE_NAME', 'risko-backend'),
 )
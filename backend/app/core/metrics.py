@@ -1,85 +1,251 @@
 """
-Simple metrics collection middleware for API monitoring.
-In production, use Prometheus or similar monitoring solutions.
+Request metrics for API monitoring.
+
+``MetricsMiddleware`` is a pure ASGI middleware: timing, request/error
+counting, the ``X-Response-Time`` header and the access log line are all
+handled in a single pass without the extra task and body stream that
+``BaseHTTPMiddleware`` adds to every request.
+
+Latencies go into fixed-bucket histograms keyed by method and route
+template (``/api/v1/risk/analyze``, ``/app/{path}``), so memory is bounded
+by the number of routes rather than by distinct URLs. When
+``METRICS_MULTIPROC_DIR`` is set, each worker periodically writes its
+cumulative snapshot there and ``/metrics`` merges all of them, giving
+totals and percentiles across uvicorn workers.
 """
-import time
+import bisect
 import json
-from collections import defaultdict, deque
-from typing import Dict, Any
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-
-class MetricsMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
-        self.request_count = defaultdict(int)
-        self.response_times = defaultdict(deque)
-        self.error_count = defaultdict(int)
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency buckets; the last bucket is +Inf
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+KNOWN_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _new_series(n_buckets: int) -> Dict[str, Any]:
+    return {"buckets": [0] * (n_buckets + 1), "count": 0, "sum": 0.0, "errors": 0, "min": None, "max": None}
+
+
+def _merge_series(target: Dict[str, Any], other: Dict[str, Any]):
+    target["buckets"] = [a + b for a, b in zip(target["buckets"], other["buckets"])]
+    target["count"] += other["count"]
+    target["sum"] += other["sum"]
+    target["errors"] += other["errors"]
+    for key, pick in (("min", min), ("max", max)):
+        values = [v for v in (target[key], other[key]) if v is not None]
+        target[key] = pick(values) if values else None
+
+
+def histogram_quantile(q: float, buckets: Tuple[float, ...], counts: List[int]) -> float:
+    """Estimate a quantile by linear interpolation inside the matching bucket (as Prometheus does)."""
+    total = sum(counts)
+    if total == 0:
+        return 0.0
+    rank = q * total
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if cumulative + count >= rank and count > 0:
+            if i == len(buckets):
+                # +Inf bucket: the best we can say is "above the last bound"
+                return buckets[-1]
+            lower = buckets[i - 1] if i > 0 else 0.0
+            upper = buckets[i]
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+    return buckets[-1]
+
+
+class RequestMetrics:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, multiproc_dir: Optional[str] = None,
+                 flush_interval: float = 1.0, max_series: int = 500):
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple[str, str], Dict[str, Any]] = {}
         self.start_time = time.time()
-        
-        # Keep only last 1000 response times per endpoint
-        self.max_response_times = 1000
-    
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        path = request.url.path
-        method = request.method
-        endpoint = f"{method} {path}"
-        
-        # Count request
-        self.request_count[endpoint] += 1
-        
-        response = await call_next(request)
-        
-        # Calculate response time
-        response_time = time.time() - start_time
-        
-        # Store response time (keep only last N measurements)
-        if len(self.response_times[endpoint]) >= self.max_response_times:
-            self.response_times[endpoint].popleft()
-        self.response_times[endpoint].append(response_time)
-        
-        # Count errors
-        if response.status_code >= 400:
-            self.error_count[endpoint] += 1
-        
-        # Add response time header
-        response.headers["X-Response-Time"] = f"{response_time:.3f}s"
-        
-        return response
-    
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        # Hard cap on distinct (method, route) series; extra ones share an overflow series
+        self.max_series = max_series
+        self._last_flush = 0.0
+
+    def record(self, method: str, route: str, response_time: float, status_code: int):
+        method = method if method in KNOWN_METHODS else "OTHER"
+        key = (method, route)
+        series = self.series.get(key)
+        if series is None:
+            if len(self.series) >= self.max_series:
+                key = (method, "other")
+                series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = _new_series(len(self.buckets))
+
+        series["buckets"][bisect.bisect_left(self.buckets, response_time)] += 1
+        series["count"] += 1
+        series["sum"] += response_time
+        if status_code >= 400:
+            series["errors"] += 1
+        if series["min"] is None or response_time < series["min"]:
+            series["min"] = response_time
+        if series["max"] is None or response_time > series["max"]:
+            series["max"] = response_time
+
+        if self.multiproc_dir and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    # --- multi-process aggregation ---
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "start_time": self.start_time,
+            "buckets": list(self.buckets),
+            "series": [{"method": m, "route": r, **s} for (m, r), s in self.series.items()],
+        }
+
+    def flush(self):
+        """Atomically write this worker's cumulative snapshot into the multiprocess directory."""
+        self._last_flush = time.monotonic()
+        try:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.multiproc_dir, prefix=".tmp-")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, os.path.join(self.multiproc_dir, f"metrics_{os.getpid()}.json"))
+        except OSError as e:
+            logger.warning("Failed to write metrics snapshot: %s", e)
+
+    def collect(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Return series merged across all workers (or just this one without a multiprocess dir)."""
+        if not self.multiproc_dir:
+            return self.series
+        self.flush()
+        merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for name in os.listdir(self.multiproc_dir):
+            if not (name.startswith("metrics_") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.multiproc_dir, name)) as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if tuple(snap.get("buckets", ())) != self.buckets:
+                continue
+            for s in snap["series"]:
+                key = (s["method"], s["route"])
+                if key not in merged:
+                    merged[key] = _new_series(len(self.buckets))
+                _merge_series(merged[key], s)
+        return merged
+
+    # --- output formats ---
     def get_metrics(self) -> Dict[str, Any]:
         """Get current metrics."""
-        uptime = time.time() - self.start_time
-        
+        series = self.collect()
         metrics = {
-            "uptime_seconds": round(uptime, 2),
-            "total_requests": sum(self.request_count.values()),
-            "total_errors": sum(self.error_count.values()),
+            "uptime_seconds": round(time.time() - self.start_time, 2),
+            "total_requests": sum(s["count"] for s in series.values()),
+            "total_errors": sum(s["errors"] for s in series.values()),
             "endpoints": {}
         }
-        
-        for endpoint in self.request_count.keys():
-            response_times = list(self.response_times[endpoint])
-            avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-            
-            metrics["endpoints"][endpoint] = {
-                "request_count": self.request_count[endpoint],
-                "error_count": self.error_count[endpoint],
-                "avg_response_time": round(avg_response_time, 3),
-                "min_response_time": round(min(response_times), 3) if response_times else 0,
-                "max_response_time": round(max(response_times), 3) if response_times else 0
+
+        for (method, route), s in sorted(series.items()):
+            metrics["endpoints"][f"{method} {route}"] = {
+                "request_count": s["count"],
+                "error_count": s["errors"],
+                "avg_response_time": round(s["sum"] / s["count"], 3) if s["count"] else 0,
+                "min_response_time": round(s["min"] or 0, 3),
+                "max_response_time": round(s["max"] or 0, 3),
+                "p50_response_time": round(histogram_quantile(0.50, self.buckets, s["buckets"]), 3),
+                "p95_response_time": round(histogram_quantile(0.95, self.buckets, s["buckets"]), 3),
+                "p99_response_time": round(histogram_quantile(0.99, self.buckets, s["buckets"]), 3),
             }
-        
+
         return metrics
 
-# Global metrics instance
-metrics_middleware = None
+    def openmetrics(self, extra_lines: Optional[List[str]] = None) -> str:
+        """Render the histograms in the OpenMetrics text exposition format."""
+        series = self.collect()
+        name = "http_request_duration_seconds"
+        lines = [
+            f"# TYPE {name} histogram",
+            f"# UNIT {name} seconds",
+            f"# HELP {name} HTTP request latency by route template.",
+        ]
+        for (method, route), s in sorted(series.items()):
+            labels = f'method="{method}",route="{_escape(route)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), s["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{name}_count{{{labels}}} {s['count']}")
+            lines.append(f"{name}_sum{{{labels}}} {s['sum']:.6f}")
+        lines += [
+            "# TYPE http_request_errors counter",
+            "# HELP http_request_errors HTTP responses with status >= 400.",
+        ]
+        for (method, route), s in sorted(series.items()):
+            lines.append(f'http_request_errors_total{{method="{method}",route="{_escape(route)}"}} {s["errors"]}')
+        lines += extra_lines or []
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def route_template(scope: Scope, root_path: str) -> str:
+    """Route template of a handled request, e.g. ``/api/v1/risk/analyze`` or ``/app/{path}``."""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    mount_root = scope.get("root_path", "")
+    if mount_root and mount_root != root_path:
+        return mount_root[len(root_path):] + "/{path}"
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, metrics: Optional[RequestMetrics] = None, access_log: bool = True):
+        self.app = app
+        self.metrics = metrics or request_metrics
+        self.access_log = access_log
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+        root_path = scope.get("root_path", "")
+
+        async def send_with_timing(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Response-Time", f"{time.perf_counter() - start_time:.3f}s")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            response_time = time.perf_counter() - start_time
+            method = scope["method"]
+            self.metrics.record(method, route_template(scope, root_path), response_time, status_code)
+            if self.access_log:
+                logger.info("%s %s - Status: %s - Time: %.3fs", method, scope["path"], status_code, response_time)
 
-def get_metrics_middleware():
-    global metrics_middleware
-    return metrics_middleware
 
-def set_metrics_middleware(middleware):
-    global metrics_middleware
-    metrics_middleware = middleware
\ No newline at end of file
+# Global metrics instance shared by the middleware and the /metrics endpoint
+request_metrics = RequestMetrics(multiproc_dir=settings.METRICS_MULTIPROC_DIR)
@@ -0,0 +1,122 @@
+"""
+On-demand statistical stack sampler for live workers.
+
+A background thread snapshots every thread's Python stack with
+``sys._current_frames()`` at a fixed interval and counts identical stacks.
+The result is rendered in the collapsed-stack format understood by
+``flamegraph.pl``, speedscope and similar tools::
+
+    main@main.py;analyze@risk.py;get_real_flood_risk@risk_calculator.py 42
+
+With route attribution enabled, samples taken while a request task is
+running on the event loop are prefixed with ``route:<METHOD> <template>``.
+Nothing is sampled (and ``ProfilerMiddleware`` does no bookkeeping) unless a
+profile is in progress.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.metrics import route_template
+
+
+class ProfilerState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.attribute_routes = False
+        # Request task -> (ASGI scope, root_path); filled only while attributing routes
+        self.active_requests: Dict[asyncio.Task, tuple] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+
+
+profiler_state = ProfilerState()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name}@{os.path.basename(code.co_filename)}:{code.co_firstlineno}"
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    def __init__(self, interval: float = 0.01, attribute_routes: bool = False, state: ProfilerState = profiler_state):
+        self.interval = interval
+        self.attribute_routes = attribute_routes
+        self.state = state
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+
+    def _route_prefix(self, thread_id: int) -> Optional[str]:
+        state = self.state
+        if thread_id != state.loop_thread_id or state.loop is None:
+            return None
+        task = asyncio.current_task(state.loop)
+        entry = state.active_requests.get(task) if task is not None else None
+        if entry is None:
+            return None
+        scope, root_path = entry
+        return f"route:{scope.get('method')} {route_template(scope, root_path)}"
+
+    def sample_once(self):
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = _collapse(frame)
+            if self.attribute_routes:
+                prefix = self._route_prefix(thread_id)
+                if prefix:
+                    stack = f"{prefix};{stack}"
+            self.samples[stack] += 1
+        self.sample_count += 1
+
+    def run(self, duration: float) -> Counter:
+        """Sample for ``duration`` seconds (blocking; call from a worker thread)."""
+        self.state.attribute_routes = self.attribute_routes
+        try:
+            deadline = time.monotonic() + duration
+            next_tick = time.monotonic()
+            while next_tick < deadline:
+                self.sample_once()
+                next_tick += self.interval
+                time.sleep(max(0.0, next_tick - time.monotonic()))
+        finally:
+            self.state.attribute_routes = False
+            self.state.active_requests.clear()
+        return self.samples
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfilerMiddleware:
+    """Tags request tasks with their scope while a route-attributed profile is running."""
+
+    def __init__(self, app: ASGIApp, state: ProfilerState = profiler_state):
+        self.app = app
+        self.state = state
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.state.attribute_routes:
+            await self.app(scope, receive, send)
+            return
+        task = asyncio.current_task()
+        self.state.active_requests[task] = (scope, scope.get("root_path", ""))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.state.active_requests.pop(task, None)
@@ -0,0 +1,166 @@
+"""
+Precompressed, fingerprinted static asset build and serving.
+
+Build step (run once per deploy, not per request):
+
+    python -m app.core.static_assets ../frontend ../frontend-dist
+
+copies the frontend into the output directory, adds content-hashed copies of
+scripts, stylesheets and icons (``app.3f2a1b4c.js``), rewrites HTML references
+to the hashed names and writes ``.gz`` / ``.br`` variants next to every
+compressible file. ``PrecompressedStaticFiles`` then serves those variants by
+``Accept-Encoding`` so the workers never compress static files themselves.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import stat
+import sys
+from typing import Dict, Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always written
+    brotli = None
+
+
+MANIFEST_NAME = "asset-manifest.json"
+FINGERPRINT_EXTENSIONS = {".js", ".css", ".svg", ".png", ".jpg", ".webp", ".woff2"}
+COMPRESS_EXTENSIONS = {".js", ".css", ".html", ".svg", ".json", ".txt", ".map"}
+MIN_COMPRESS_SIZE = 500
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def _content_hash(path: str, length: int = 8) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()[:length]
+
+
+def _rewrite_references(html: str, manifest: Dict[str, str]) -> str:
+    for original, hashed in manifest.items():
+        pattern = re.compile(r'((?:src|href)=["\'])(\./|/)?' + re.escape(original) + r'(["\'])')
+        html = pattern.sub(lambda m: f"{m.group(1)}{m.group(2) or ''}{hashed}{m.group(3)}", html)
+    return html
+
+
+def _write_compressed(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return
+    with open(path + ".gz", "wb") as f:
+        # mtime=0 keeps the output reproducible between builds
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build_static_assets(source_dir: str, output_dir: str) -> Dict[str, str]:
+    """Build fingerprinted and precompressed assets; return the original -> hashed manifest."""
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    shutil.copytree(source_dir, output_dir)
+
+    manifest: Dict[str, str] = {}
+    for root, _, files in os.walk(output_dir):
+        for name in files:
+            base, ext = os.path.splitext(name)
+            if ext.lower() not in FINGERPRINT_EXTENSIONS:
+                continue
+            full = os.path.join(root, name)
+            hashed_name = f"{base}.{_content_hash(full)}{ext}"
+            shutil.copy2(full, os.path.join(root, hashed_name))
+            rel = os.path.relpath(full, output_dir).replace(os.sep, "/")
+            manifest[rel] = os.path.relpath(os.path.join(root, hashed_name), output_dir).replace(os.sep, "/")
+
+    for root, _, files in os.walk(output_dir):
+        for name in files:
+            if name.endswith(".html"):
+                full = os.path.join(root, name)
+                with open(full, encoding="utf-8") as f:
+                    html = f.read()
+                with open(full, "w", encoding="utf-8") as f:
+                    f.write(_rewrite_references(html, manifest))
+
+    for root, _, files in os.walk(output_dir):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in COMPRESS_EXTENSIONS:
+                _write_compressed(os.path.join(root, name))
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves build-time ``.br``/``.gz`` variants and long-lived caching for hashed assets."""
+
+    encodings = (("br", ".br"), ("gzip", ".gz"))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable_paths = set()
+        manifest_path = os.path.join(str(self.directory), MANIFEST_NAME) if self.directory else None
+        if manifest_path and os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                self.immutable_paths = set(json.load(f).values())
+
+    def _accepted_encodings(self, scope: Scope):
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        accepted = {part.split(";")[0].strip().lower() for part in accept.split(",")}
+        return [(enc, suffix) for enc, suffix in self.encodings if enc in accepted]
+
+    async def _precompressed_response(self, path: str, scope: Scope) -> Optional[Response]:
+        for encoding, suffix in self._accepted_encodings(scope):
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                media_type = mimetypes.guess_type(path)[0] or "text/plain"
+                response = FileResponse(full_path, stat_result=stat_result, media_type=media_type)
+                response.headers["Content-Encoding"] = encoding
+                # ETag is per representation; keep it distinct from the identity file
+                response.headers["ETag"] = response.headers["ETag"].rstrip('"') + f'-{encoding}"'
+                if self.is_not_modified(response.headers, Headers(scope=scope)):
+                    return NotModifiedResponse(response.headers)
+                return response
+        return None
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = None
+        if scope["method"] in ("GET", "HEAD"):
+            if self.html and scope["path"].endswith("/"):
+                path = os.path.join(path, "index.html")
+            if os.path.splitext(path)[1]:
+                response = await self._precompressed_response(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            rel = path.replace(os.sep, "/").lstrip("/")
+            response.headers["Cache-Control"] = (
+                IMMUTABLE_CACHE_CONTROL if rel in self.immutable_paths else REVALIDATE_CACHE_CONTROL
+            )
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python -m app.core.static_assets <source_dir> <output_dir>")
+        raise SystemExit(2)
+    result = build_static_assets(sys.argv[1], sys.argv[2])
+    print(f"Built {len(result)} fingerprinted assets into {sys.argv[2]}" + ("" if brotli else " (brotli not installed, gzip only)"))
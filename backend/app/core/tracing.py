@@ -0,0 +1,214 @@
+"""
+Lightweight span tracing for request pipelines.
+
+``TracingMiddleware`` samples a fraction of requests (``TRACE_SAMPLE_RATE``).
+For sampled requests, code wrapped in ``span("name")`` records its timing
+into the current trace; the stage durations are returned in a
+``Server-Timing`` header and the finished trace is exported in OTLP/JSON
+form, either appended to ``TRACE_EXPORT_FILE`` or POSTed to an OTLP/HTTP
+collector (``TRACE_OTLP_ENDPOINT``, e.g. ``http://localhost:4318/v1/traces``).
+
+Outside a sampled request ``span`` is a no-op, so instrumented code costs a
+single context variable lookup per stage.
+"""
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("risko_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("risko_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self.root = Span(name, None, {})
+
+    def server_timing(self) -> str:
+        """Render child stage durations for the ``Server-Timing`` header (same-named spans are summed)."""
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            if s.end_ns is not None:
+                totals[s.name] = totals.get(s.name, 0.0) + s.duration_ms
+        parts = [f"{name};dur={dur:.2f}" for name, dur in totals.items()]
+        parts.append(f"total;dur={self.root.duration_ms:.2f}")
+        return ", ".join(parts)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        def encode(s: Span) -> Dict[str, Any]:
+            item = {
+                "traceId": self.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 2 if s is self.root else 1,  # SERVER for the request, INTERNAL for stages
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                "attributes": [_otlp_attribute(k, v) for k, v in s.attributes.items()],
+            }
+            if s.parent_id:
+                item["parentSpanId"] = s.parent_id
+            return item
+
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", settings.TRACE_SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "risko.tracing"},
+                    "spans": [encode(self.root)] + [encode(s) for s in self.spans],
+                }],
+            }]
+        }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a pipeline stage within the current sampled trace; no-op otherwise."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get() or trace.root
+    s = Span(name, parent.span_id, attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except Exception as e:
+        s.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current_span.reset(token)
+        trace.spans.append(s)
+
+
+def traced(name: str):
+    """Decorator form of ``span`` for whole functions."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class SpanExporter:
+    """Exports finished traces from a background thread; drops traces when the queue is full."""
+
+    def __init__(self, file_path: Optional[str] = None, endpoint: Optional[str] = None, max_queue: int = 1000):
+        self.file_path = file_path
+        self.endpoint = endpoint
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.file_path or self.endpoint)
+
+    def submit(self, trace: Trace):
+        if not self.enabled:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self.queue.put_nowait(trace.to_otlp())
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        client = None
+        if self.endpoint:
+            import httpx
+            client = httpx.Client(timeout=5.0)
+        while True:
+            payload = self.queue.get()
+            try:
+                if client is not None:
+                    client.post(self.endpoint, json=payload)
+                if self.file_path:
+                    with open(self.file_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(payload) + "\n")
+            except Exception as e:
+                logger.warning("Trace export failed: %s", e)
+
+
+class TracingMiddleware:
+    def __init__(self, app: ASGIApp, sample_rate: float = 1.0, exporter: Optional[SpanExporter] = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.exporter = exporter or span_exporter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        trace.root.attributes.update({"http.method": scope["method"], "http.target": scope["path"]})
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                trace.root.attributes["http.status_code"] = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            trace.root.end_ns = time.time_ns()
+            self.exporter.submit(trace)
+
+
+span_exporter = SpanExporter(file_path=settings.TRACE_EXPORT_FILE, endpoint=settings.TRACE_OTLP_ENDPOINT)
@@ -0,0 +1,263 @@
+"""
+Columnar archive of historical analyses.
+
+``archive_analyses`` streams analyses older than a cutoff (joined with their
+stored result) through a server-side cursor into zstd-compressed Parquet
+files, one directory per month in Hive layout::
+
+    <ANALYSIS_ARCHIVE_DIR>/analyses/month=2025-03/part-<first id>-<last id>.parquet
+
+Rows are deleted from the live tables only after the month's file has been
+written completely, in batches of bounded size, so the job can run next to
+live traffic. Result rows no longer referenced by any analysis are compacted
+away afterwards. A run interrupted between writing a file and deleting its
+rows leaves those rows in the database; the next run skips every row whose
+id is already in one of the month's files (and then deletes it), so
+re-running never duplicates archived rows.
+
+``read_archived_analyses`` and ``archived_risk_statistics`` query the archive
+(pruning by month) for exports and statistics. pyarrow is imported on use.
+
+    cd backend && python -m app.db.archive [--older-than-days 365] [--dir archive]
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import delete, exists, select
+
+from app.core.config import settings
+from app.db.partitions import add_months, month_start
+from app.models.analysis import Analysis, AnalysisResult, TYPED_RESULT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLUMNS = ("id", "user_id", "created_at", "result_hash", "address") + TYPED_RESULT_FIELDS + ("risk_scores",)
+
+
+def _schema():
+    import pyarrow as pa
+
+    fields = [
+        ("id", pa.int64()), ("user_id", pa.string()), ("created_at", pa.timestamp("us")),
+        ("result_hash", pa.string()), ("address", pa.string()),
+    ]
+    fields += [(f, pa.string() if f == "risk_level" else pa.float64()) for f in TYPED_RESULT_FIELDS]
+    fields.append(("risk_scores", pa.string()))  # full result as JSON text
+    return pa.schema(fields)
+
+
+def _month_dir(archive_dir: str, month) -> str:
+    return os.path.join(archive_dir, "analyses", f"month={month.year:04d}-{month.month:02d}")
+
+
+def _archived_ids(directory: str) -> set:
+    """Ids already stored in a month directory's Parquet files."""
+    import pyarrow.parquet as pq
+
+    ids = set()
+    for name in os.listdir(directory):
+        if name.startswith("part-") and name.endswith(".parquet"):
+            ids.update(pq.read_table(os.path.join(directory, name), columns=["id"]).column("id").to_pylist())
+    return ids
+
+
+class _MonthFile:
+    """Parquet file for one month, written under a temporary name and renamed when complete.
+
+    Rows already present in the month's earlier files are skipped.
+    """
+
+    def __init__(self, archive_dir: str, month, schema):
+        import pyarrow.parquet as pq
+
+        self.month = month
+        self.schema = schema
+        self.directory = _month_dir(archive_dir, month)
+        os.makedirs(self.directory, exist_ok=True)
+        self.archived_ids = _archived_ids(self.directory)
+        self.tmp_path = os.path.join(self.directory, f".tmp-{os.getpid()}.parquet")
+        self.writer = pq.ParquetWriter(self.tmp_path, schema, compression="zstd")
+        self.rows = 0
+        self.first_id = None
+        self.last_id = None
+
+    def write(self, rows: List[Any]):
+        import pyarrow as pa
+
+        rows = [row for row in rows if row.id not in self.archived_ids]
+        if not rows:
+            return
+        columns = {name: [] for name in ARCHIVE_COLUMNS}
+        for row in rows:
+            for name in ARCHIVE_COLUMNS:
+                value = getattr(row, name)
+                if name == "risk_scores" and value is not None and not isinstance(value, str):
+                    value = json.dumps(value, ensure_ascii=False)
+                columns[name].append(value)
+        self.writer.write_batch(pa.record_batch([columns[n] for n in ARCHIVE_COLUMNS], schema=self.schema))
+        if self.first_id is None:
+            self.first_id = rows[0].id
+        self.last_id = rows[-1].id
+        self.rows += len(rows)
+
+    def close(self) -> Optional[str]:
+        self.writer.close()
+        if not self.rows:
+            os.remove(self.tmp_path)
+            return None
+        path = os.path.join(self.directory, f"part-{self.first_id}-{self.last_id}.parquet")
+        os.replace(self.tmp_path, path)
+        return path
+
+
+def _delete_archived(engine, start: datetime, end: datetime, batch_size: int) -> int:
+    """Delete analyses with start <= created_at < end, ``batch_size`` rows per transaction."""
+    in_range = (Analysis.created_at >= start) & (Analysis.created_at < end)
+    deleted = 0
+    while True:
+        ids = select(Analysis.id).where(in_range).limit(batch_size).scalar_subquery()
+        with engine.begin() as conn:
+            count = conn.execute(delete(Analysis).where(in_range, Analysis.id.in_(ids))).rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def compact_results(engine, older_than: datetime, batch_size: int = 1000) -> int:
+    """Delete stored results that no analysis references any more (and that predate the cutoff)."""
+    unreferenced = ~exists().where(Analysis.result_hash == AnalysisResult.result_hash)
+    deleted = 0
+    while True:
+        hashes = (
+            select(AnalysisResult.result_hash)
+            .where(AnalysisResult.created_at < older_than, unreferenced)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        with engine.begin() as conn:
+            count = conn.execute(delete(AnalysisResult).where(AnalysisResult.result_hash.in_(hashes))).rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def _finish(month_file: _MonthFile) -> int:
+    path = month_file.close()
+    if path is None:
+        logger.info("Analyses of %s were already archived", f"{month_file.month:%Y-%m}")
+    else:
+        logger.info("Archived %d analyses to %s", month_file.rows, path)
+    return month_file.rows
+
+
+def archive_analyses(engine, archive_dir: str, older_than: datetime, fetch_size: int = 5000,
+                     delete_batch_size: int = 1000) -> Dict[str, int]:
+    """Archive and delete analyses created before ``older_than``; returns rows archived per month."""
+    schema = _schema()
+    columns = [Analysis.id, Analysis.user_id, Analysis.created_at, Analysis.result_hash, AnalysisResult.address]
+    columns += [getattr(AnalysisResult, f) for f in TYPED_RESULT_FIELDS] + [AnalysisResult.risk_scores]
+    stmt = (
+        select(*columns)
+        .join(AnalysisResult, Analysis.result_hash == AnalysisResult.result_hash)
+        .where(Analysis.created_at < older_than)
+        .order_by(Analysis.created_at, Analysis.id)
+    )
+
+    archived: Dict[Any, int] = {}
+    current: Optional[_MonthFile] = None
+    with engine.connect() as conn:
+        # yield_per streams through a server-side cursor in fixed-size partitions
+        result = conn.execution_options(yield_per=fetch_size).execute(stmt)
+        for rows in result.partitions():
+            for month, group in groupby(rows, key=lambda r: month_start(r.created_at)):
+                if current is None or current.month != month:
+                    if current is not None:
+                        archived[current.month] = _finish(current)
+                    current = _MonthFile(archive_dir, month, schema)
+                current.write(list(group))
+    if current is not None:
+        archived[current.month] = _finish(current)
+
+    # Files are complete; only now remove the rows from the live table
+    for month in archived:
+        start = datetime(month.year, month.month, 1)
+        end = min(datetime.combine(add_months(month, 1), datetime.min.time()), older_than)
+        _delete_archived(engine, start, end, delete_batch_size)
+    if archived:
+        logger.info("Compacted %d unreferenced results", compact_results(engine, older_than, delete_batch_size))
+    return {f"{m.year:04d}-{m.month:02d}": n for m, n in archived.items()}
+
+
+def read_archived_analyses(archive_dir: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                           columns: Optional[Sequence[str]] = None):
+    """Archived analyses with start <= created_at < end as a ``pyarrow.Table`` (only matching months are read)."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    root = os.path.join(archive_dir, "analyses")
+    if not os.path.isdir(root):
+        return _schema().empty_table()
+    schema = _schema().append(pa.field("month", pa.string()))
+    dataset = ds.dataset(root, format="parquet", schema=schema,
+                         partitioning=ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive"))
+    condition = None
+    for bound, op in ((start, "ge"), (end, "lt")):
+        if bound is None:
+            continue
+        month_filter = (ds.field("month") >= f"{bound:%Y-%m}") if op == "ge" else (ds.field("month") <= f"{bound:%Y-%m}")
+        time_filter = (ds.field("created_at") >= bound) if op == "ge" else (ds.field("created_at") < bound)
+        part = month_filter & time_filter
+        condition = part if condition is None else condition & part
+    return dataset.to_table(columns=list(columns) if columns else list(ARCHIVE_COLUMNS), filter=condition)
+
+
+def archived_risk_statistics(archive_dir: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                             region: Optional[str] = None) -> Dict[str, Any]:
+    """Aggregate statistics over archived analyses, in the shape of ``/b2b/risk-statistics``."""
+    import pyarrow.compute as pc
+
+    table = read_archived_analyses(archive_dir, start, end, columns=["address", *TYPED_RESULT_FIELDS])
+    if region:
+        table = table.filter(pc.match_substring(table["address"], region, ignore_case=True))
+    total = table.num_rows
+
+    def avg(column):
+        value = pc.mean(table[column]).as_py() if total else None
+        return round(value or 0, 1)
+
+    def pct(level):
+        if not total:
+            return 0.0
+        return round(100.0 * pc.sum(pc.equal(table["risk_level"], level)).as_py() / total, 1)
+
+    return {
+        "region": region or "Turkey",
+        "average_earthquake_risk": avg("earthquake_risk"),
+        "average_flood_risk": avg("flood_risk"),
+        "average_fire_risk": avg("fire_risk"),
+        "average_landslide_risk": avg("landslide_risk"),
+        "total_analyzed_addresses": total,
+        "high_risk_percentage": pct("high"),
+        "critical_risk_percentage": pct("critical"),
+    }
+
+
+if __name__ == "__main__":
+    from app.db.session import engine
+
+    parser = argparse.ArgumentParser(description="Archive old analyses to Parquet and delete them from the database")
+    parser.add_argument("--older-than-days", type=int, default=settings.ANALYSIS_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--dir", default=settings.ANALYSIS_ARCHIVE_DIR)
+    parser.add_argument("--fetch-size", type=int, default=5000)
+    parser.add_argument("--delete-batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    cutoff = datetime.utcnow() - timedelta(days=args.older_than_days)
+    summary = archive_analyses(engine, args.dir, cutoff, args.fetch_size, args.delete_batch_size)
+    logger.info("Archive run complete (cutoff %s): %s", cutoff.isoformat(), summary or "nothing to archive")
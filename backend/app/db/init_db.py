@@ -0,0 +1,46 @@
+"""
+Schema bootstrap for development and single-container deployments.
+
+Production schemas are managed with Alembic; ``create_all`` only creates
+tables that do not exist yet. Run it once before starting the workers::
+
+    cd backend && python -m app.db.init_db
+
+``python -m app.db.init_db partitions`` only creates the upcoming monthly
+partitions of ``analyses`` (PostgreSQL, after migration 0002); run it at
+least monthly, e.g. from the entrypoint or a scheduled job.
+"""
+import logging
+import sys
+
+from app.db.partitions import ensure_analysis_partitions
+from app.db.session import Base, engine
+
+logger = logging.getLogger(__name__)
+
+
+def maintain_partitions():
+    """Create missing monthly partitions of ``analyses``; no-op unless the table is partitioned."""
+    with engine.begin() as conn:
+        return ensure_analysis_partitions(conn)
+
+
+def init_db():
+    """Create any missing tables for the models registered on ``Base``."""
+    # Import the model modules so their tables are registered on Base.metadata
+    import app.models.analysis  # noqa: F401
+    import app.models.outbox  # noqa: F401
+    import app.models.risk  # noqa: F401
+    import app.models.user  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
+    maintain_partitions()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] == ["partitions"]:
+        logger.info("Analyses partitions ensured: %s", ", ".join(maintain_partitions()) or "none")
+    else:
+        init_db()
+        logger.info("Database tables ensured (create_all).")
@@ -0,0 +1,110 @@
+"""
+Monthly range partitions of the ``analyses`` table (PostgreSQL).
+
+The table is partitioned on ``created_at`` by the ``0002`` migration; one
+partition per calendar month is named ``analyses_yYYYYmMM`` and rows outside
+all monthly ranges land in ``analyses_default``. Partitions for upcoming
+months are created ahead of time by ``ensure_analysis_partitions``, which runs
+from the entrypoint, the migration and daily from ``PartitionMaintainer``. If a month
+was missed and its rows already went to the default partition (where a plain
+``CREATE ... PARTITION OF`` would fail), the default partition is detached,
+the month's rows are moved into the new partition and the default is
+re-attached, all in one transaction. A whole month can be taken out of the
+live table in O(1) with ``detach_analysis_partition``.
+"""
+from datetime import date, datetime
+from typing import List, Tuple, Union
+
+from sqlalchemy import text
+
+PARENT_TABLE = "analyses"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+
+def month_start(value: Union[date, datetime]) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_bounds(month: date) -> Tuple[date, date]:
+    start = month_start(month)
+    return start, add_months(start, 1)
+
+
+def is_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {"name": PARENT_TABLE}).scalar())
+
+
+def create_partition_sql(month: date) -> str:
+    start, end = partition_bounds(month)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def move_default_rows_sql(month: date) -> List[str]:
+    """Statements creating the month's partition when ``analyses_default`` already holds rows of that month."""
+    start, end = partition_bounds(month)
+    name = partition_name(start)
+    return [
+        f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}",
+        create_partition_sql(start),
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE created_at >= '{start.isoformat()}' AND created_at < '{end.isoformat()}' RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT",
+    ]
+
+
+def _default_has_rows(conn, month: date) -> bool:
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": DEFAULT_PARTITION}).scalar() is None:
+        return False
+    start, end = partition_bounds(month)
+    return bool(conn.execute(text(
+        f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end LIMIT 1"
+    ), {"start": start, "end": end}).scalar())
+
+
+def ensure_analysis_partitions(conn, first_month: date = None, months_ahead: int = 3) -> List[str]:
+    """Create monthly partitions from ``first_month`` (default: this month) up to ``months_ahead`` ahead.
+
+    Call it inside a transaction; concurrent callers are serialized with an advisory lock.
+    """
+    if not is_partitioned(conn):
+        return []
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"{PARENT_TABLE}_partitions"})
+    current = month_start(datetime.utcnow())
+    month = month_start(first_month) if first_month else current
+    last = add_months(current, months_ahead)
+    created = []
+    while month <= last:
+        exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": partition_name(month)}).scalar()
+        if exists is None and _default_has_rows(conn, month):
+            for statement in move_default_rows_sql(month):
+                conn.execute(text(statement))
+        else:
+            conn.execute(text(create_partition_sql(month)))
+        created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def detach_analysis_partition(conn, month: date) -> str:
+    """Detach one month from ``analyses``; the returned table keeps the rows for archiving or dropping."""
+    name = partition_name(month_start(month))
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+    return name
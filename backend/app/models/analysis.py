@@ -1,22 +1,88 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON
+import hashlib
+import json
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, JSON, Index, ForeignKey
+from sqlalchemy.orm import relationship
 from datetime import datetime
+from typing import Any, Dict
 from app.db.session import Base
 
+# Result fields stored in typed columns next to the full JSON result
+TYPED_RESULT_FIELDS = (
+    "latitude", "longitude",
+    "earthquake_risk", "flood_risk", "fire_risk", "landslide_risk",
+    "overall_risk_score", "risk_level",
+)
+
+
+class AnalysisResult(Base):
+    """A distinct analysis result, stored once and keyed by the hash of its content."""
+    __tablename__ = "analysis_results"
+    __table_args__ = (
+        Index("ix_analysis_results_address", "address"),
+        Index("ix_analysis_results_overall_risk_score", "overall_risk_score"),
+        Index("ix_analysis_results_risk_level", "risk_level"),
+        Index("ix_analysis_results_lat_lon", "latitude", "longitude"),
+    )
+
+    result_hash = Column(String(64), primary_key=True)
+    address = Column(String, nullable=False)
+    risk_scores = Column(JSON, nullable=False)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    earthquake_risk = Column(Float, nullable=True)
+    flood_risk = Column(Float, nullable=True)
+    fire_risk = Column(Float, nullable=True)
+    landslide_risk = Column(Float, nullable=True)
+    overall_risk_score = Column(Float, nullable=True)
+    risk_level = Column(String(16), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    @staticmethod
+    def hash_result(result: Dict[str, Any]) -> str:
+        """SHA-256 of the canonical JSON form of a result (sorted keys, no whitespace)."""
+        canonical = json.dumps(result, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def typed_values(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Typed column values extracted from an analysis result."""
+        return {field: result.get(field) for field in TYPED_RESULT_FIELDS}
+
+    @classmethod
+    def row_for(cls, result: Dict[str, Any], address: str, result_hash: str) -> Dict[str, Any]:
+        return {
+            "result_hash": result_hash,
+            "address": address,
+            "risk_scores": result,
+            **cls.typed_values(result),
+            "created_at": datetime.utcnow(),
+        }
+
 
 class Analysis(Base):
+    """One analysis request: who asked, when, and which stored result it produced."""
     __tablename__ = "analyses"
+    # On PostgreSQL the table is range-partitioned by month on created_at (migration 0002)
+    __table_args__ = (
+        Index("ix_analyses_user_id_created_at", "user_id", "created_at"),
+        Index("ix_analyses_created_at", "created_at"),
+        Index("ix_analyses_result_hash", "result_hash"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, nullable=True, index=True)
-    address = Column(String, nullable=False, index=True)
-    risk_scores = Column(JSON, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, index=True)
+    user_id = Column(String, nullable=True)
+    result_hash = Column(String(64), ForeignKey("analysis_results.result_hash"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    result = relationship(AnalysisResult, lazy="joined", innerjoin=True)
 
     def to_dict(self):
+        result = self.result
         return {
             "id": self.id,
             "user_id": self.user_id,
-            "address": self.address,
-            "risk_scores": self.risk_scores,
+            "address": result.address if result else None,
+            "risk_scores": result.risk_scores if result else None,
+            **{field: getattr(result, field, None) for field in TYPED_RESULT_FIELDS},
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
@@ -1,19 +1,22 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON, Index
 from datetime import datetime
-from geoalchemy2 import Geometry
-
-Base = declarative_base()
+from app.db.session import Base
 
 
 class RiskData(Base):
+    """Component scores per quantized location; read-through cache of RiskCalculationService."""
     __tablename__ = "risk_data"
+    __table_args__ = (
+        Index("ix_risk_data_cell_key", "cell_key", unique=True),
+        Index("ix_risk_data_updated_at", "updated_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    # "<lat>:<lon>:<building age or ->" with coordinates rounded to RISK_CACHE_PRECISION decimals
+    cell_key = Column(String(64), nullable=False)
     address = Column(String, index=True)
     latitude = Column(Float)
     longitude = Column(Float)
-    location = Column(Geometry('POINT'))
     
     # Risk scores (0-100)
     earthquake_risk = Column(Float, default=0.0)
@@ -28,8 +31,11 @@ class RiskData(Base):
     building_age = Column(Integer, nullable=True)
     construction_quality = Column(String, nullable=True)
     
-    # Additional metadata
-    metadata = Column(JSON, nullable=True)
+    # Version of the scoring model / source data the scores were computed with
+    data_version = Column(Integer, nullable=False, default=1)
+    
+    # Additional metadata ("metadata" is reserved on declarative classes)
+    details = Column("metadata", JSON, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -21,21 +21,25 @@ class User(Base):
 
 
 class RefreshToken(Base):
+    """A refresh token, stored as its SHA-256 (see ``user_service.hash_token``), never in plain text."""
     __tablename__ = "refresh_tokens"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    token = Column(String(255), unique=True, index=True, nullable=False)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
     revoked = Column(Boolean, default=False)
+    # Revoking also moves expires_at to now, so the sweeper only needs this index
+    expires_at = Column(DateTime, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class PasswordResetToken(Base):
+    """A password reset token, stored as its SHA-256 like ``RefreshToken``."""
     __tablename__ = "password_reset_tokens"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    token = Column(String(255), unique=True, index=True, nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     used = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,243 @@
+"""
+Write-behind persistence of ``Analysis`` rows.
+
+Analysis endpoints hand their result to ``analysis_writer.submit`` and return
+immediately; a background thread flushes the buffered rows with one
+multi-row ``INSERT`` every ``ANALYSIS_FLUSH_INTERVAL_MS`` or as soon as
+``ANALYSIS_FLUSH_MAX_ROWS`` rows are waiting, whichever comes first. The
+buffer is bounded (``ANALYSIS_BUFFER_MAX_ROWS``): when the database cannot
+keep up, new rows are dropped and counted rather than held in memory.
+Pending rows are flushed on application shutdown.
+
+Results are content-addressed: each distinct result is stored once in
+``analysis_results`` under the SHA-256 of its canonical JSON, and the
+``analyses`` row only records the hash, the user and the time. Hashes known
+to be stored already are remembered (bounded) so repeated results cost a
+single narrow insert.
+
+With ``ANALYSIS_WRITE_BEHIND=false`` every submit is written synchronously,
+as before.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.tracing import span
+from app.db.session import SessionLocal
+from app.models.analysis import Analysis, AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisWriter:
+    def __init__(self, session_factory: Callable = SessionLocal, flush_interval: float = 0.2,
+                 batch_size: int = 500, max_pending: int = 10000, enabled: bool = True,
+                 known_hashes: int = 10000):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.enabled = enabled
+        self.pending: deque = deque()
+        self._lock = threading.Lock()
+        # Serialises flushes between the background thread and close()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.deduplicated = 0
+        # Hashes already present in analysis_results (insertion ordered, bounded)
+        self._known: "OrderedDict[str, None]" = OrderedDict()
+        self._max_known = known_hashes
+
+    def submit(self, user_id: Optional[str], address: str, risk_scores: Dict[str, Any]) -> bool:
+        """Queue an analysis for persistence; return False if it was dropped."""
+        # The request-path part of persistence; the batched INSERT happens in the background
+        with span("db.persist", write_behind=self.enabled) as s:
+            queued = self._submit(user_id, address, risk_scores)
+            if s is not None:
+                s.attributes["queued"] = queued
+            return queued
+
+    def _submit(self, user_id: Optional[str], address: str, risk_scores: Dict[str, Any]) -> bool:
+        result_hash = AnalysisResult.hash_result(risk_scores)
+        row = {
+            "user_id": user_id,
+            "result_hash": result_hash,
+            "created_at": datetime.utcnow(),
+            # Only inserted into analysis_results if this hash is not stored yet
+            "result": AnalysisResult.row_for(risk_scores, address, result_hash),
+        }
+        if not self.enabled:
+            return self._write([row])
+
+        with self._lock:
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.pending.append(row)
+            size = len(self.pending)
+        self._ensure_thread()
+        if size >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _ensure_thread(self):
+        if self._stopping:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="analysis-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            n = min(len(self.pending), self.batch_size)
+            return [self.pending.popleft() for _ in range(n)]
+
+    def flush(self):
+        """Write everything currently buffered, in batches of at most ``batch_size`` rows."""
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    return
+                self._write(batch)
+
+    def _new_results(self, db, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Result rows of this batch that are not stored yet (one per hash)."""
+        candidates = {}
+        for row in rows:
+            if row["result_hash"] not in self._known:
+                candidates.setdefault(row["result_hash"], row["result"])
+        if candidates:
+            stored = db.execute(
+                select(AnalysisResult.result_hash).where(AnalysisResult.result_hash.in_(list(candidates)))
+            ).scalars().all()
+            for result_hash in stored:
+                candidates.pop(result_hash, None)
+        return list(candidates.values())
+
+    def _remember(self, hashes):
+        for result_hash in hashes:
+            self._known[result_hash] = None
+            self._known.move_to_end(result_hash)
+        while len(self._known) > self._max_known:
+            self._known.popitem(last=False)
+
+    def _insert_results(self, db, results: List[Dict[str, Any]]):
+        if not results:
+            return
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            # Another worker may store the same result concurrently
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            db.execute(dialect_insert(AnalysisResult).on_conflict_do_nothing(index_elements=["result_hash"]), results)
+        else:
+            db.execute(insert(AnalysisResult), results)
+
+    def _write(self, rows: List[Dict[str, Any]], retry: bool = True) -> bool:
+        start = time.perf_counter()
+        db = self.session_factory()
+        try:
+            results = self._new_results(db, rows)
+            self._insert_results(db, results)
+            db.execute(insert(Analysis), [
+                {"user_id": r["user_id"], "result_hash": r["result_hash"], "created_at": r["created_at"]} for r in rows
+            ])
+            db.commit()
+            self._remember(r["result_hash"] for r in rows)
+            self.written += len(rows)
+            self.deduplicated += len(rows) - len(results)
+            return True
+        except IntegrityError as e:
+            db.rollback()
+            if retry and self._known:
+                # A remembered result may have been compacted away by the archive job; re-check them all
+                self._known.clear()
+                return self._write(rows, retry=False)
+            self.failed += len(rows)
+            logger.error("Failed to persist %d analyses: %s", len(rows), e)
+            return False
+        except Exception as e:
+            db.rollback()
+            self.failed += len(rows)
+            logger.error("Failed to persist %d analyses: %s", len(rows), e)
+            return False
+        finally:
+            db.close()
+            self.flushes += 1
+            self.last_flush_seconds = time.perf_counter() - start
+
+    def close(self, timeout: float = 10.0):
+        """Stop the background thread and flush whatever is still buffered."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        # A later submit (e.g. another app instance in tests) starts a fresh thread
+        self._thread = None
+        self._stopping = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self.pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "deduplicated": self.deduplicated,
+            "flushes": self.flushes,
+            "last_flush_seconds": round(self.last_flush_seconds, 4),
+        }
+
+    def openmetrics_lines(self) -> List[str]:
+        """This worker's counters in OpenMetrics form (not aggregated across workers)."""
+        s = self.stats()
+        lines = [
+            "# TYPE analysis_writes_pending gauge",
+            "# HELP analysis_writes_pending Analyses buffered and not yet written.",
+            f"analysis_writes_pending {s['pending']}",
+        ]
+        for name, help_text in (
+            ("written", "Analyses persisted by the write-behind buffer."),
+            ("dropped", "Analyses dropped because the buffer was full."),
+            ("failed", "Analyses lost to failed database writes."),
+            ("deduplicated", "Analyses whose result was already stored."),
+        ):
+            lines += [
+                f"# TYPE analysis_writes_{name} counter",
+                f"# HELP analysis_writes_{name} {help_text}",
+                f"analysis_writes_{name}_total {s[name]}",
+            ]
+        return lines
+
+
+analysis_writer = AnalysisWriter(
+    flush_interval=settings.ANALYSIS_FLUSH_INTERVAL_MS / 1000.0,
+    batch_size=settings.ANALYSIS_FLUSH_MAX_ROWS,
+    max_pending=settings.ANALYSIS_BUFFER_MAX_ROWS,
+    enabled=settings.ANALYSIS_WRITE_BEHIND,
+)
@@ -0,0 +1,275 @@
+"""
+Persistent e-mail outbox and its background sender.
+
+Request handlers call ``enqueue_email`` (one INSERT into ``email_outbox``)
+and return; they never wait on the mail server. Each worker runs an
+``EmailOutboxSender`` thread that claims due messages in batches of
+``EMAIL_BATCH_SIZE`` (``FOR UPDATE SKIP LOCKED`` on PostgreSQL, so workers
+never send the same message twice) and delivers them over one SMTP
+connection that is kept open between batches and re-established when the
+server drops it or it has been idle for ``SMTP_IDLE_SECONDS``.
+
+A failed delivery is retried with exponential backoff
+(``EMAIL_RETRY_BASE_SECONDS`` doubling up to ``EMAIL_RETRY_MAX_SECONDS``);
+after ``EMAIL_MAX_ATTEMPTS`` attempts, or on a permanent (5xx) SMTP error,
+the message is marked ``failed``. The body of a sent or failed message is
+blanked, since it may hold a password reset link, and ``TokenSweeper``
+deletes such rows. Enqueuing wakes the local sender at once;
+otherwise it polls every ``EMAIL_OUTBOX_POLL_SECONDS``.
+"""
+import logging
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.outbox import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPConnection:
+    """One SMTP session reused across messages (STARTTLS and login happen once per connection)."""
+
+    def __init__(self, host: str, port: int = 587, username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = True, idle_timeout: float = 60.0, timeout: float = 10.0,
+                 factory: Callable[..., smtplib.SMTP] = smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.factory = factory
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = self.factory(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self.connects += 1
+        return smtp
+
+    def send(self, msg):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+        reused = self._smtp is not None
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+            self.discard()
+            if not reused:
+                raise
+            # The server closed the idle connection; reconnect once
+            logger.debug("SMTP connection lost (%s), reconnecting", e)
+            self._smtp = self._connect()
+            self._smtp.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def discard(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                smtp.close()
+
+
+def smtp_from_settings() -> Optional[SMTPConnection]:
+    if not settings.SMTP_HOST:
+        return None
+    return SMTPConnection(
+        settings.SMTP_HOST, settings.SMTP_PORT or 587, settings.SMTP_USERNAME, settings.SMTP_PASSWORD,
+        use_tls=settings.SMTP_TLS, idle_timeout=settings.SMTP_IDLE_SECONDS,
+    )
+
+
+class EmailOutboxSender:
+    def __init__(self, session_factory=SessionLocal, smtp: Optional[SMTPConnection] = None,
+                 poll_interval: float = 5.0, batch_size: int = 50, max_attempts: int = 6,
+                 retry_base: float = 30.0, retry_max: float = 3600.0, sender: Optional[str] = None):
+        self.session_factory = session_factory
+        self.smtp = smtp
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.sender = sender or "no-reply@risko"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+
+    # --- lifecycle ---
+    def start(self):
+        if self.smtp is None:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="email-outbox", daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        """Wake the sender now (called after a message was committed to the outbox)."""
+        self.start()
+        self._wake.set()
+
+    def close(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self.smtp is not None:
+            self.smtp.close()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                handled = self.run_once()
+            except Exception as e:
+                logger.error("Email outbox batch failed: %s", e)
+                handled = 0
+            if handled < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    # --- delivery ---
+    def backoff(self, attempts: int) -> float:
+        return min(self.retry_base * (2 ** max(attempts - 1, 0)), self.retry_max)
+
+    def _message(self, row: EmailOutbox) -> MIMEText:
+        msg = MIMEText(row.body, "plain", "utf-8")
+        msg["Subject"] = row.subject
+        msg["From"] = self.sender
+        msg["To"] = row.to_email
+        return msg
+
+    def run_once(self) -> int:
+        """Deliver one batch of due messages; returns how many were handled."""
+        now = datetime.utcnow()
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(EmailOutbox)
+                .where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+                .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            handled = 0
+            for row in rows:
+                handled += 1
+                if not self._deliver(row):
+                    # Server unreachable: leave the rest of the batch for the next poll
+                    break
+            db.commit()
+        if rows:
+            self.batches += 1
+        return handled
+
+    def _deliver(self, row: EmailOutbox) -> bool:
+        """Send one message and update its row; False if the SMTP connection itself failed."""
+        row.attempts += 1
+        try:
+            self.smtp.send(self._message(row))
+        except Exception as e:
+            if isinstance(e, smtplib.SMTPRecipientsRefused):
+                permanent = all(code >= 500 for code, _ in e.recipients.values())
+            else:
+                permanent = isinstance(e, smtplib.SMTPResponseException) and e.smtp_code >= 500
+            row.last_error = str(e)[:1000]
+            if permanent or row.attempts >= self.max_attempts:
+                row.status = "failed"
+                row.body = ""
+                self.failed += 1
+                logger.error("Giving up on e-mail %s to %s after %d attempts: %s",
+                             row.id, row.to_email, row.attempts, e)
+            else:
+                row.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.backoff(row.attempts))
+                self.retried += 1
+                logger.warning("E-mail %s delivery failed (attempt %d), retrying: %s", row.id, row.attempts, e)
+            if isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                return True  # the server answered; the connection is still usable
+            self.smtp.discard()
+            return False
+        row.status = "sent"
+        row.sent_at = datetime.utcnow()
+        row.last_error = None
+        # The body may carry a live reset token; it is not kept once delivered
+        row.body = ""
+        self.sent += 1
+        return True
+
+    # --- metrics ---
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.smtp is not None,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "batches": self.batches,
+            "smtp_connects": self.smtp.connects if self.smtp is not None else 0,
+        }
+
+    def openmetrics_lines(self) -> List[str]:
+        """This worker's delivery counters in OpenMetrics form (not aggregated across workers)."""
+        s = self.stats()
+        lines = []
+        for name, help_text in (
+            ("sent", "E-mails delivered from the outbox."),
+            ("retried", "E-mail deliveries that failed and were rescheduled."),
+            ("failed", "E-mails given up on."),
+        ):
+            lines += [
+                f"# TYPE email_outbox_{name} counter",
+                f"# HELP email_outbox_{name} {help_text}",
+                f"email_outbox_{name}_total {s[name]}",
+            ]
+        return lines
+
+
+email_sender = EmailOutboxSender(
+    smtp=smtp_from_settings(),
+    poll_interval=settings.EMAIL_OUTBOX_POLL_SECONDS,
+    batch_size=settings.EMAIL_BATCH_SIZE,
+    max_attempts=settings.EMAIL_MAX_ATTEMPTS,
+    retry_base=settings.EMAIL_RETRY_BASE_SECONDS,
+    retry_max=settings.EMAIL_RETRY_MAX_SECONDS,
+    sender=settings.SMTP_USERNAME,
+)
+
+
+def enqueue_email(db, to_email: str, subject: str, body: str) -> EmailOutbox:
+    """Store a message in the outbox (committed here) and wake the sender."""
+    row = EmailOutbox(to_email=to_email, subject=subject, body=body)
+    db.add(row)
+    db.commit()
+    email_sender.notify()
+    return row
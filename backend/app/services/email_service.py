@@ -1,13 +1,13 @@
-import smtplib
-from email.mime.text import MIMEText
 from typing import Optional
 from app.core.config import settings
+from app.services.email_outbox import enqueue_email
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def send_password_reset_email(to_email: str, token: str):
+def send_password_reset_email(to_email: str, token: str, db=None):
+    """Queue the password reset e-mail in the outbox; the background sender delivers it."""
     frontend = settings.FRONTEND_BASE_URL or ""
     link = f"{frontend.rstrip('/')}/reset.html?token={token}" if frontend else f"/reset.html?token={token}"
     subject = "Risko - Şifre Sıfırlama"
@@ -19,19 +19,13 @@ def send_password_reset_email(to_email: str, token: str):
         return True
 
     try:
-        msg = MIMEText(body, "plain", "utf-8")
-        msg["Subject"] = subject
-        msg["From"] = settings.SMTP_USERNAME or "no-reply@risko"
-        msg["To"] = to_email
-
-        server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT or 587)
-        if settings.SMTP_TLS:
-            server.starttls()
-        if settings.SMTP_USERNAME and settings.SMTP_PASSWORD:
-            server.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
-        server.sendmail(msg["From"], [to_email], msg.as_string())
-        server.quit()
+        if db is not None:
+            enqueue_email(db, to_email, subject, body)
+        else:
+            from app.db.session import SessionLocal
+            with SessionLocal() as session:
+                enqueue_email(session, to_email, subject, body)
         return True
     except Exception as e:
-        logger.error("Failed to send reset email: %s", e)
-        return False
\ No newline at end of file
+        logger.error("Failed to queue reset email: %s", e)
+        return False
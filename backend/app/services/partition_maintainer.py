@@ -0,0 +1,77 @@
+"""
+Scheduled creation of the monthly ``analyses`` partitions.
+
+The entrypoint creates partitions a few months ahead, but a long-running
+deploy would eventually outlive them and new rows would pile up in
+``analyses_default``. ``PartitionMaintainer`` runs ``ensure_analysis_partitions``
+when the worker starts and then every ``PARTITION_MAINTENANCE_INTERVAL_SECONDS``
+(daily) on its own thread; it is independent of the token sweeper and has its
+own ``PARTITION_MAINTENANCE_ENABLED`` switch. Running it in every worker is
+safe: concurrent runs are serialized by an advisory lock and partitions are
+created with ``IF NOT EXISTS``. On databases where ``analyses`` is not
+partitioned each run is a no-op.
+"""
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.db.partitions import ensure_analysis_partitions
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionMaintainer:
+    def __init__(self, session_factory=SessionLocal, interval: float = 86400.0, enabled: bool = True):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.enabled = enabled
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.failures = 0
+
+    def start(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="partition-maintainer", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while True:
+            self.run_once()
+            if self._stop.wait(self.interval):
+                return
+
+    def run_once(self) -> List[str]:
+        """Create the upcoming monthly partitions of ``analyses``; returns their names."""
+        try:
+            with self.session_factory() as db:
+                created = ensure_analysis_partitions(db.connection())
+                db.commit()
+        except Exception as e:
+            self.failures += 1
+            logger.warning("Analyses partition maintenance failed: %s", e)
+            return []
+        self.runs += 1
+        return created
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "runs": self.runs, "failures": self.failures}
+
+
+partition_maintainer = PartitionMaintainer(
+    interval=settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+    enabled=settings.PARTITION_MAINTENANCE_ENABLED,
+)
@@ -0,0 +1,143 @@
+"""
+Password hashing on a dedicated, bounded thread pool.
+
+bcrypt is deliberately slow (~0.2 s per hash at cost 12). Running it in
+Starlette's shared threadpool lets a burst of logins occupy every thread
+that sync endpoints and ``to_thread`` calls depend on. Auth endpoints await
+``password_hasher`` instead: at most ``PASSWORD_HASH_WORKERS`` hashes run at
+once (bcrypt releases the GIL, so threads hash in parallel) and at most
+``PASSWORD_HASH_MAX_QUEUE`` more may wait; beyond that ``HasherBusy`` is
+raised and the endpoint answers 503 instead of queueing without limit.
+
+``verify_and_update`` also returns a new hash when the stored one was made
+with other parameters than ``BCRYPT_ROUNDS`` (or a deprecated scheme), so
+login transparently upgrades hashes after a cost change.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+class HasherBusy(RuntimeError):
+    """Too many password hashes are already queued."""
+
+
+def default_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = 2, max_queue: int = 64, context_factory: Callable[[], Any] = default_context):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._context_factory = context_factory
+        self._context = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0  # queued or running
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    @property
+    def context(self):
+        # passlib is imported on first use, keeping it off the startup path
+        if self._context is None:
+            self._context = self._context_factory()
+        return self._context
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    def _timed(self, fn: Callable, args: Tuple, submitted: float):
+        started = time.perf_counter()
+        with self._lock:
+            self.active += 1
+            waited = started - submitted
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.run_seconds += time.perf_counter() - started
+
+    async def _run(self, fn: Callable, *args):
+        with self._lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HasherBusy("Password hashing queue is full")
+            self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool(), self._timed, fn, args, time.perf_counter())
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self.context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new hash or None); a new hash means the stored one uses outdated parameters."""
+        valid, new_hash = await self._run(self.context.verify_and_update, password, hashed)
+        if new_hash:
+            with self._lock:
+                self.rehashed += 1
+        return valid, new_hash
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": max(self.pending - self.active, 0),
+            "active": self.active,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_wait_seconds": round(self.wait_seconds / self.completed, 4) if self.completed else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 4),
+            "avg_run_seconds": round(self.run_seconds / self.completed, 4) if self.completed else 0.0,
+        }
+
+    def openmetrics_lines(self) -> List[str]:
+        """This worker's hashing pool in OpenMetrics form (not aggregated across workers)."""
+        s = self.stats()
+        lines = []
+        for name, kind, help_text, value in (
+            ("password_hash_queued", "gauge", "Password hashes waiting for a hashing thread.", s["queued"]),
+            ("password_hash_active", "gauge", "Password hashes running.", s["active"]),
+            ("password_hash_completed", "counter", "Password hashes and verifications completed.", s["completed"]),
+            ("password_hash_rejected", "counter", "Password hashes rejected because the queue was full.", s["rejected"]),
+            ("password_hash_rehashed", "counter", "Stored hashes upgraded on login.", s["rehashed"]),
+            ("password_hash_wait_seconds", "counter", "Time hashes spent queued.", round(self.wait_seconds, 4)),
+        ):
+            suffix = "_total" if kind == "counter" else ""
+            lines += [f"# TYPE {name} {kind}", f"# HELP {name} {help_text}", f"{name}{suffix} {value}"]
+        return lines
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
@@ -0,0 +1,206 @@
+"""
+Live earthquake feed shared by all Server-Sent Events clients of a worker.
+
+A single upstream poller per process fetches AFAD (and optionally Kandilli)
+events and fans new ones out to every connected subscriber. Each subscriber
+has a bounded queue; a client that cannot keep up is dropped instead of
+being buffered without limit (it can simply reconnect). The first events
+each source returns after the poller starts only seed the history: the
+upstream lists hold more past events than a client buffer, and publishing
+them all as new would drop every connected client at once. Seeding is
+tracked per source, so a source that was down at startup is seeded when it
+recovers instead of flooding clients with its backlog.
+"""
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """Bounded per-client event buffer. A ``None`` item marks the end of the stream."""
+
+    def __init__(self, buffer_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = False
+
+    def offer(self, event: Dict) -> bool:
+        """Queue an event without blocking; return False if the client is too slow."""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self):
+        """Discard pending events and wake the reader with the end-of-stream marker."""
+        self.dropped = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class EarthquakeFeed:
+    def __init__(self, poll_interval: float = 30.0, client_buffer_size: int = 100,
+                 max_clients: int = 1000, history_size: int = 50):
+        self.poll_interval = poll_interval
+        self.client_buffer_size = client_buffer_size
+        self.max_clients = max_clients
+        self.subscribers: List[Subscriber] = []
+        # Most recent events, replayed to newly connected clients
+        self.history = deque(maxlen=history_size)
+        # Bounded set of already published event ids (insertion ordered)
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._max_seen = history_size * 20
+        self._task: Optional[asyncio.Task] = None
+        self.dropped_clients = 0
+
+    # --- subscription management ---
+    def subscribe(self) -> Subscriber:
+        if len(self.subscribers) >= self.max_clients:
+            raise RuntimeError("Too many live feed clients")
+        sub = Subscriber(self.client_buffer_size)
+        # Replay at most half the buffer so live events still fit behind it
+        for event in list(self.history)[-max(self.client_buffer_size // 2, 1):]:
+            sub.offer(event)
+        self.subscribers.append(sub)
+        self._ensure_poller()
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        if sub in self.subscribers:
+            self.subscribers.remove(sub)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _ensure_poller(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    # --- fan-out ---
+    def _unseen(self, events: List[Dict]) -> List[Dict]:
+        """Events not published or seeded before; marks them as seen."""
+        new_events = []
+        for event in events:
+            key = f"{event.get('source')}:{event.get('id')}"
+            if key in self._seen:
+                continue
+            self._seen[key] = None
+            if len(self._seen) > self._max_seen:
+                self._seen.popitem(last=False)
+            new_events.append(event)
+        return new_events
+
+    def seed(self, events: List[Dict]) -> int:
+        """Record events as already known (history only, nothing sent); returns how many were new."""
+        new_events = self._unseen(events)
+        self.history.extend(new_events)
+        return len(new_events)
+
+    def ingest(self, events: List[Dict], seeded_sources: set) -> int:
+        """Seed events of sources not in ``seeded_sources`` (adding them) and publish the rest."""
+        fresh = [e for e in events if e.get('source') in seeded_sources]
+        backlog = [e for e in events if e.get('source') not in seeded_sources]
+        if backlog:
+            self.seed(backlog)
+            seeded_sources.update(e.get('source') for e in backlog)
+        return self.publish(fresh)
+
+    def publish(self, events: List[Dict]) -> int:
+        """Send unseen events to every subscriber and return how many were new."""
+        new_events = self._unseen(events)
+        for event in new_events:
+            self.history.append(event)
+            for sub in list(self.subscribers):
+                if not sub.offer(event):
+                    # Backpressure: slow clients are disconnected, not buffered
+                    sub.close()
+                    self.subscribers.remove(sub)
+                    self.dropped_clients += 1
+                    logger.info("Dropped slow live feed client (buffer %s full)", self.client_buffer_size)
+        return len(new_events)
+
+    # --- upstream polling ---
+    async def _poll_loop(self):
+        seeded_sources: set = set()
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            while True:
+                try:
+                    events = await self.fetch_events(client)
+                    # Oldest first so clients receive events in chronological order
+                    events.sort(key=lambda e: e.get('time') or '')
+                    self.ingest(events, seeded_sources)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("Live earthquake poll failed: %s", e)
+                await asyncio.sleep(self.poll_interval)
+
+    async def fetch_events(self, client: httpx.AsyncClient) -> List[Dict]:
+        events: List[Dict] = []
+        if settings.AFAD_API_URL:
+            try:
+                resp = await client.post(f"{settings.AFAD_API_URL}/event/filter", json={"limit": 100})
+                resp.raise_for_status()
+                events.extend(normalize_afad_event(e) for e in resp.json() or [])
+            except httpx.HTTPError as e:
+                logger.warning("AFAD live feed request failed: %s", e)
+        kandilli_url = settings.KANDILLI_HTTPS_URL or settings.KANDILLI_API_URL
+        if kandilli_url:
+            try:
+                resp = await client.get(kandilli_url)
+                resp.raise_for_status()
+                data = resp.json()
+                items = data.get('result', []) if isinstance(data, dict) else data
+                events.extend(normalize_kandilli_event(e) for e in items or [])
+            except httpx.HTTPError as e:
+                logger.warning("Kandilli live feed request failed: %s", e)
+        return events
+
+
+def normalize_afad_event(raw: Dict) -> Dict:
+    return {
+        'id': str(raw.get('eventID') or raw.get('eventId') or raw.get('id')),
+        'source': 'afad',
+        'magnitude': _to_float(raw.get('magnitude')),
+        'latitude': _to_float(raw.get('latitude')),
+        'longitude': _to_float(raw.get('longitude')),
+        'depth': _to_float(raw.get('depth')),
+        'location': raw.get('location'),
+        'time': raw.get('date'),
+    }
+
+
+def normalize_kandilli_event(raw: Dict) -> Dict:
+    coords = (raw.get('geojson') or {}).get('coordinates') or [None, None]
+    return {
+        'id': str(raw.get('earthquake_id') or raw.get('_id') or raw.get('id')),
+        'source': 'kandilli',
+        'magnitude': _to_float(raw.get('mag')),
+        'latitude': _to_float(coords[1]),
+        'longitude': _to_float(coords[0]),
+        'depth': _to_float(raw.get('depth')),
+        'location': raw.get('title'),
+        'time': raw.get('date_time') or raw.get('date'),
+    }
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+earthquake_feed = EarthquakeFeed(
+    poll_interval=settings.QUAKE_FEED_POLL_SECONDS,
+    client_buffer_size=settings.QUAKE_FEED_CLIENT_BUFFER,
+    max_clients=settings.QUAKE_FEED_MAX_CLIENTS,
+)
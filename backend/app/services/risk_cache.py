@@ -0,0 +1,347 @@
+"""
+Durable read-through cache of component risk scores in ``risk_data``.
+
+``RiskCalculationService.analyze_address`` looks up the scores of the
+geocoded location before computing them and stores freshly computed scores
+afterwards, so every worker and node shares them across restarts.
+
+Lookups are answered from a bounded in-process LRU (``RISK_CACHE_LOCAL_SIZE``
+cells) first and only read ``risk_data`` on a local miss. Stores go into
+that LRU at once and are written behind: a background thread upserts the
+queued rows every ``RISK_CACHE_FLUSH_SECONDS`` in one statement, so no
+commit happens on the request path. Endpoints run ``analyze_address`` in a
+worker thread, so the remaining reads never block the event loop.
+
+Rows are keyed by ``cell_key``: latitude/longitude rounded to
+``RISK_CACHE_PRECISION`` decimals (3 ≈ 110 m) plus the building age, which
+changes the fire score. A row counts as a hit only while it is younger than
+``RISK_CACHE_MAX_AGE_HOURS`` and was computed with the current
+``RISK_DATA_VERSION``; bump the version when the scoring model or its source
+data change. Scores computed on a fallback path (a source failed) are not
+stored.
+
+Database errors never fail an analysis: the cache is skipped for a minute and
+scores are computed as if it were empty.
+
+``warm`` bulk-loads rows; on PostgreSQL it streams them with ``COPY`` into a
+temporary table and upserts from there. To warm the cache from results that
+are already stored::
+
+    cd backend && python -m app.services.risk_cache warm
+
+Warm-up follows the same rule as ``put``: only results stored with
+``used_fallback: false`` are loaded. Results from before that marker existed
+cannot be told apart from fallback estimates and are skipped.
+"""
+import csv
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.risk import RiskData
+
+logger = logging.getLogger(__name__)
+
+COMPONENTS = ("earthquake_risk", "flood_risk", "fire_risk", "landslide_risk")
+# Columns written by put/warm, in COPY order
+ROW_COLUMNS = ("cell_key", "address", "latitude", "longitude") + COMPONENTS + (
+    "overall_risk_score", "building_age", "data_version", "created_at", "updated_at",
+)
+ERROR_BACKOFF_SECONDS = 60.0
+
+
+class RiskDataCache:
+    """Component scores per quantized location, persisted in ``risk_data``."""
+
+    def __init__(self, session_factory=SessionLocal, max_age: Optional[timedelta] = None,
+                 version: Optional[int] = None, precision: Optional[int] = None, enabled: Optional[bool] = None,
+                 local_size: Optional[int] = None, flush_interval: Optional[float] = None):
+        self.session_factory = session_factory
+        self.max_age = max_age if max_age is not None else timedelta(hours=settings.RISK_CACHE_MAX_AGE_HOURS)
+        self.version = version if version is not None else settings.RISK_DATA_VERSION
+        self.precision = precision if precision is not None else settings.RISK_CACHE_PRECISION
+        self.enabled = enabled if enabled is not None else settings.RISK_CACHE_ENABLED
+        self.local_size = local_size if local_size is not None else settings.RISK_CACHE_LOCAL_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else settings.RISK_CACHE_FLUSH_SECONDS
+        # cell_key -> (component scores, updated_at), least recently used first
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        # Rows waiting for the background writer, one per cell (the newest wins)
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._flush_lock = threading.Lock()
+        self.local_hits = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.stores = 0
+        self.errors = 0
+        self._skip_until = 0.0
+        self._lock = threading.Lock()
+
+    def quantize(self, lat: float, lon: float):
+        return round(lat, self.precision), round(lon, self.precision)
+
+    def cell_key(self, lat: float, lon: float, building_age: Optional[int] = None) -> str:
+        qlat, qlon = self.quantize(lat, lon)
+        age = "-" if building_age is None else str(int(building_age))
+        return f"{qlat:.{self.precision}f}:{qlon:.{self.precision}f}:{age}"
+
+    def _available(self) -> bool:
+        return self.enabled and time.monotonic() >= self._skip_until
+
+    def _failed(self, action: str, error: Exception):
+        with self._lock:
+            self.errors += 1
+            self._skip_until = time.monotonic() + ERROR_BACKOFF_SECONDS
+        logger.warning("Risk data cache %s failed, bypassing it for %.0fs: %s", action, ERROR_BACKOFF_SECONDS, error)
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _remember(self, key: str, scores: Dict[str, float], updated_at: datetime):
+        with self._lock:
+            self._local[key] = (scores, updated_at)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _local_get(self, key: str) -> Optional[Dict[str, float]]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            scores, updated_at = entry
+            if updated_at < datetime.utcnow() - self.max_age:
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            self.local_hits += 1
+            return dict(scores)
+
+    def get(self, lat: float, lon: float, building_age: Optional[int] = None) -> Optional[Dict[str, float]]:
+        """Fresh component scores for the location, or None on a miss."""
+        if not self.enabled:
+            return None
+        key = self.cell_key(lat, lon, building_age)
+        scores = self._local_get(key)
+        if scores is not None:
+            return scores
+        if not self._available():
+            return None
+        try:
+            with self.session_factory() as db:
+                row = db.execute(select(RiskData).where(RiskData.cell_key == key)).scalar_one_or_none()
+        except Exception as e:
+            self._failed("read", e)
+            return None
+        if row is None:
+            self._count("misses")
+            return None
+        if row.data_version != self.version or row.updated_at < datetime.utcnow() - self.max_age:
+            self._count("stale")
+            return None
+        self._count("hits")
+        scores = {c: getattr(row, c) for c in COMPONENTS}
+        self._remember(key, scores, row.updated_at)
+        return dict(scores)
+
+    def row_for(self, lat: float, lon: float, building_age: Optional[int], scores: Dict[str, float],
+                address: Optional[str] = None, updated_at: Optional[datetime] = None) -> Dict[str, Any]:
+        qlat, qlon = self.quantize(lat, lon)
+        now = updated_at or datetime.utcnow()
+        return {
+            "cell_key": self.cell_key(lat, lon, building_age),
+            "address": address,
+            "latitude": qlat,
+            "longitude": qlon,
+            **{c: scores[c] for c in COMPONENTS},
+            "overall_risk_score": scores.get("overall_risk_score"),
+            "building_age": building_age,
+            "data_version": self.version,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    def _upsert(self, db, rows: List[Dict[str, Any]]):
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            for row in rows:
+                existing = db.execute(select(RiskData).where(RiskData.cell_key == row["cell_key"])).scalar_one_or_none()
+                if existing is None:
+                    db.add(RiskData(**row))
+                elif existing.updated_at is None or existing.updated_at <= row["updated_at"]:
+                    for column, value in row.items():
+                        if column != "created_at":
+                            setattr(existing, column, value)
+            return
+        stmt = dialect_insert(RiskData)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["cell_key"],
+            set_={c: stmt.excluded[c] for c in ROW_COLUMNS if c not in ("cell_key", "created_at")},
+            where=RiskData.updated_at <= stmt.excluded.updated_at,
+        )
+        db.execute(stmt, rows)
+
+    def put(self, lat: float, lon: float, building_age: Optional[int], scores: Dict[str, float],
+            address: Optional[str] = None) -> bool:
+        """Remember freshly computed component scores and queue them for ``risk_data``; False if not queued."""
+        if not self.enabled:
+            return False
+        row = self.row_for(lat, lon, building_age, scores, address)
+        self._remember(row["cell_key"], {c: scores[c] for c in COMPONENTS}, row["updated_at"])
+        if not self._available():
+            return False
+        with self._lock:
+            self._pending[row["cell_key"]] = row
+        self._start()
+        return True
+
+    # --- write-behind ---
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._loop, name="risk-cache-writer", daemon=True)
+                    self._thread.start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Upsert the queued rows in one statement; returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = list(self._pending.values()), {}
+            if not rows:
+                return 0
+            try:
+                with self.session_factory() as db:
+                    self._upsert(db, rows)
+                    db.commit()
+            except Exception as e:
+                self._failed("write", e)
+                return 0
+            with self._lock:
+                self.stores += len(rows)
+            return len(rows)
+
+    def close(self, timeout: float = 10.0):
+        """Stop the writer and flush what is still queued (called on shutdown)."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def warm(self, rows: Iterable[Dict[str, Any]], batch_size: int = 5000) -> int:
+        """Bulk-load rows built with ``row_for``; the newest row per cell wins. Returns rows loaded."""
+        loaded = 0
+        batch: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            current = batch.get(row["cell_key"])
+            if current is None or current["updated_at"] <= row["updated_at"]:
+                batch[row["cell_key"]] = row
+            if len(batch) >= batch_size:
+                loaded += self._load(list(batch.values()))
+                batch = {}
+        if batch:
+            loaded += self._load(list(batch.values()))
+        return loaded
+
+    def _load(self, rows: List[Dict[str, Any]]) -> int:
+        with self.session_factory() as db:
+            if db.get_bind().dialect.name == "postgresql":
+                self._copy_upsert(db, rows)
+            else:
+                self._upsert(db, rows)
+            db.commit()
+        return len(rows)
+
+    def _copy_upsert(self, db, rows: List[Dict[str, Any]]):
+        """COPY rows into a temporary table, then upsert them into risk_data in one statement."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["" if row[c] is None else row[c] for c in ROW_COLUMNS])
+        buffer.seek(0)
+
+        columns = ", ".join(ROW_COLUMNS)
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in ROW_COLUMNS if c not in ("cell_key", "created_at"))
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS risk_data_load "
+                "(LIKE risk_data INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+            )
+            cursor.copy_expert(f"COPY risk_data_load ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(
+                f"INSERT INTO risk_data ({columns}) SELECT {columns} FROM risk_data_load "
+                f"ON CONFLICT (cell_key) DO UPDATE SET {updates} "
+                f"WHERE risk_data.updated_at <= EXCLUDED.updated_at"
+            )
+        finally:
+            cursor.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "local_hits": self.local_hits,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "stores": self.stores,
+            "errors": self.errors,
+            "pending": len(self._pending),
+        }
+
+
+risk_data_cache = RiskDataCache()
+
+
+def rows_from_stored_results(cache: RiskDataCache, fetch_size: int = 5000, bind=None):
+    """Cache rows for stored analysis results with coordinates and no fallback scores, streamed from analysis_results."""
+    from app.models.analysis import AnalysisResult
+
+    if bind is None:
+        from app.db.session import engine as bind
+
+    stmt = select(AnalysisResult.address, AnalysisResult.risk_scores, AnalysisResult.created_at).where(
+        AnalysisResult.latitude.isnot(None), AnalysisResult.longitude.isnot(None)
+    )
+    with bind.connect() as conn:
+        for address, result, created_at in conn.execution_options(yield_per=fetch_size).execute(stmt):
+            if not isinstance(result, dict) or result.get("used_fallback") is not False:
+                continue
+            if all(result.get(c) is not None for c in COMPONENTS):
+                yield cache.row_for(result["latitude"], result["longitude"], result.get("building_age"),
+                                    result, address, updated_at=created_at)
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ["warm"]:
+        sys.exit("usage: python -m app.services.risk_cache warm")
+    count = risk_data_cache.warm(rows_from_stored_results(risk_data_cache))
+    logger.info("Loaded %d locations into risk_data", count)
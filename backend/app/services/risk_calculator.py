@@ -1,16 +1,22 @@
 from typing import Dict, Tuple, Optional, List
 import random
 import time
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
+from contextvars import ContextVar
 from datetime import datetime
+from app.core.tracing import span, traced
+from app.services.risk_cache import risk_data_cache
+
+# Set when a score came from a fallback estimate (a data source failed); such scores are not cached
+_used_fallback: ContextVar[bool] = ContextVar("risk_used_fallback", default=False)
 
 
 class RiskCalculationService:
     """Service for calculating risk scores based on real Turkish data sources."""
     
-    def __init__(self):
-        self.geolocator = Nominatim(user_agent="risko_platform")
+    def __init__(self, cache=None):
+        self._geolocator = None
+        # Optional RiskDataCache consulted before computing component scores
+        self.cache = cache
         # Real Turkish data sources URLs
         self.data_sources = {
             'afad': 'https://api.afad.gov.tr',
@@ -67,6 +73,14 @@ class RiskCalculationService:
         # Simulation control: small chance to simulate external API failure
         self.simulated_api_failure_rate = 0.03  # 3% chance
     
+    @property
+    def geolocator(self):
+        # geopy is only imported on the first geocode, keeping it off the startup path
+        if self._geolocator is None:
+            from geopy.geocoders import Nominatim
+            self._geolocator = Nominatim(user_agent="risko_platform")
+        return self._geolocator
+
     def geocode_address(self, address: str) -> Optional[Tuple[float, float]]:
         """Convert Turkish address to latitude and longitude using real geocoding."""
         try:
@@ -122,6 +136,7 @@ class RiskCalculationService:
         if random.random() < self.simulated_api_failure_rate:
             raise RuntimeError("Simulated external API failure")
 
+    @traced("source.kandilli")
     def simulate_kandilli(self, lat: float, lon: float) -> Dict:
         """Return simulated fault line info near the coordinates.
 
@@ -143,6 +158,7 @@ class RiskCalculationService:
             })
         return {'faults': faults}
 
+    @traced("source.afad")
     def simulate_afad_recent_quakes(self, lat: float, lon: float) -> Dict:
         """Return simulated recent earthquake activity like AFAD might provide."""
         self._maybe_fail()
@@ -154,6 +170,7 @@ class RiskCalculationService:
             quakes.append({'magnitude': mag, 'distance_km': 5 * (i + 1), 'time': datetime.utcnow().isoformat() + 'Z'})
         return {'recent_quakes': quakes}
 
+    @traced("source.mgm")
     def simulate_mgm(self, lat: float, lon: float) -> Dict:
         """Return simulated climate data (e.g., average annual precipitation)."""
         self._maybe_fail()
@@ -166,6 +183,7 @@ class RiskCalculationService:
             avg_rain = 400
         return {'average_annual_precip_mm': avg_rain}
 
+    @traced("source.elevation")
     def simulate_elevation(self, lat: float, lon: float) -> Dict:
         """Return simulated elevation (meters) based on rough regions."""
         self._maybe_fail()
@@ -214,6 +232,7 @@ class RiskCalculationService:
             
         except Exception as e:
             print(f"Earthquake risk calculation error: {e}")
+            _used_fallback.set(True)
             return self._get_fallback_earthquake_risk(lat, lon)
     
     def _calculate_fault_proximity_risk(self, lat: float, lon: float) -> float:
@@ -308,6 +327,7 @@ class RiskCalculationService:
             
         except Exception as e:
             print(f"Flood risk calculation error: {e}")
+            _used_fallback.set(True)
             return self._get_fallback_flood_risk(lat, lon)
     
     def _get_elevation_risk(self, lat: float, lon: float) -> float:
@@ -377,6 +397,7 @@ class RiskCalculationService:
             
         except Exception as e:
             print(f"Fire risk calculation error: {e}")
+            _used_fallback.set(True)
             return self._get_fallback_fire_risk(lat, lon, building_age)
     
     def _get_climate_fire_risk(self, lat: float, lon: float) -> float:
@@ -460,6 +481,7 @@ class RiskCalculationService:
             
         except Exception as e:
             print(f"Landslide risk calculation error: {e}")
+            _used_fallback.set(True)
             return self._get_fallback_landslide_risk(lat, lon)
     
     def _get_slope_risk(self, lat: float, lon: float) -> float:
@@ -585,7 +607,8 @@ class RiskCalculationService:
     
     def analyze_address(self, address: str, building_age: Optional[int] = None) -> Dict:
         """Perform complete risk analysis for an address."""
-        coordinates = self.geocode_address(address)
+        with span("geocode"):
+            coordinates = self.geocode_address(address)
         
         if not coordinates:
             # Return default values if geocoding fails
@@ -605,15 +628,46 @@ class RiskCalculationService:
         
         lat, lon = coordinates
         
-        earthquake_risk = self.calculate_earthquake_risk(lat, lon)
-        flood_risk = self.calculate_flood_risk(lat, lon)
-        fire_risk = self.calculate_fire_risk(lat, lon, building_age)
-        landslide_risk = self.calculate_landslide_risk(lat, lon)
+        cached = None
+        if self.cache is not None:
+            with span("risk_cache.get"):
+                cached = self.cache.get(lat, lon, building_age)
+        
+        if cached:
+            earthquake_risk = cached['earthquake_risk']
+            flood_risk = cached['flood_risk']
+            fire_risk = cached['fire_risk']
+            landslide_risk = cached['landslide_risk']
+            used_fallback = False
+        else:
+            token = _used_fallback.set(False)
+            try:
+                with span("hazard.earthquake"):
+                    earthquake_risk = self.calculate_earthquake_risk(lat, lon)
+                with span("hazard.flood"):
+                    flood_risk = self.calculate_flood_risk(lat, lon)
+                with span("hazard.fire"):
+                    fire_risk = self.calculate_fire_risk(lat, lon, building_age)
+                with span("hazard.landslide"):
+                    landslide_risk = self.calculate_landslide_risk(lat, lon)
+                used_fallback = _used_fallback.get()
+            finally:
+                _used_fallback.reset(token)
         
         overall_risk = self.calculate_overall_risk(
             earthquake_risk, flood_risk, fire_risk, landslide_risk
         )
         
+        if self.cache is not None and not cached and not used_fallback:
+            with span("risk_cache.put"):
+                self.cache.put(lat, lon, building_age, {
+                    'earthquake_risk': earthquake_risk,
+                    'flood_risk': flood_risk,
+                    'fire_risk': fire_risk,
+                    'landslide_risk': landslide_risk,
+                    'overall_risk_score': overall_risk,
+                }, address)
+        
         return {
             'address': address,
             'latitude': lat,
@@ -624,8 +678,10 @@ class RiskCalculationService:
             'landslide_risk': round(landslide_risk, 2),
             'overall_risk_score': overall_risk,
             'risk_level': self.get_risk_level(overall_risk),
-            'building_age': building_age
+            'building_age': building_age,
+            # True when a data source failed and a score is a fallback estimate; callers must not reuse it
+            'used_fallback': used_fallback,
         }
 
 
-risk_service = RiskCalculationService()
+risk_service = RiskCalculationService(cache=risk_data_cache)
@@ -0,0 +1,203 @@
+"""
+"Analyses near a point" queries over stored analysis results.
+
+On PostgreSQL with PostGIS (migration 0004), ``analysis_results.location`` is
+a generated ``geography(Point, 4326)`` column with a GiST index, and radius /
+bounding-box searches use ``ST_DWithin`` / ``ST_Intersects`` so only nearby
+index entries are visited.
+
+Elsewhere (SQLite, dev databases without PostGIS) a per-process
+``GridIndex`` buckets result coordinates into fixed-size lat/lon cells; a
+query only looks at the cells overlapping the search area and then checks
+exact great-circle distances. The grid is loaded incrementally from the
+database and refreshed at most every few seconds. Bounding boxes are
+limited to ``MAX_BBOX_DEGREES`` per side (about the box of a 50 km radius
+search), so neither backend is asked to scan a continent.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, inspect, literal_column, select
+
+from app.models.analysis import AnalysisResult, TYPED_RESULT_FIELDS
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = 111320.0
+# Largest accepted bbox side, roughly the 100 km box around a 50 km radius
+MAX_BBOX_DEGREES = 1.0
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lon, max_lat, max_lon)
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def radius_bbox(lat: float, lon: float, radius_m: float) -> BBox:
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    dlon = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+class GridIndex:
+    """Fixed-size lat/lon grid of result hashes (pure Python, per process).
+
+    ``refresh`` reads from the database without holding the lock and only
+    takes it to apply the new rows, so searches never wait on a query.
+    """
+
+    def __init__(self, cell_degrees: float = 0.01, refresh_interval: float = 5.0):
+        self.cell_degrees = cell_degrees
+        self.refresh_interval = refresh_interval
+        self.cells: Dict[Tuple[int, int], Dict[str, Tuple[float, float]]] = defaultdict(dict)
+        self.size = 0
+        self._watermark: Optional[datetime] = None
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    def _add(self, result_hash: str, lat: float, lon: float):
+        bucket = self.cells[self._cell(lat, lon)]
+        if result_hash not in bucket:
+            self.size += 1
+        bucket[result_hash] = (lat, lon)
+
+    def add(self, result_hash: str, lat: float, lon: float):
+        with self._lock:
+            self._add(result_hash, lat, lon)
+
+    def refresh(self, db, force: bool = False):
+        """Load results stored since the last refresh (with overlap for rows committed late)."""
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        # One refresh at a time; other threads search the grid as it is
+        if not self._refresh_lock.acquire(blocking=force):
+            return
+        try:
+            stmt = select(AnalysisResult.result_hash, AnalysisResult.latitude, AnalysisResult.longitude,
+                          AnalysisResult.created_at).where(
+                AnalysisResult.latitude.isnot(None), AnalysisResult.longitude.isnot(None))
+            if self._watermark is not None:
+                stmt = stmt.where(AnalysisResult.created_at >= self._watermark - timedelta(minutes=1))
+            rows = db.execute(stmt).all()
+            with self._lock:
+                for result_hash, lat, lon, created_at in rows:
+                    self._add(result_hash, lat, lon)
+                    if created_at and (self._watermark is None or created_at > self._watermark):
+                        self._watermark = created_at
+            self._last_refresh = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def search(self, bbox: BBox) -> List[Tuple[str, float, float]]:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        (c0_lat, c0_lon), (c1_lat, c1_lon) = self._cell(min_lat, min_lon), self._cell(max_lat, max_lon)
+        found = []
+        with self._lock:
+            if (c1_lat - c0_lat + 1) * (c1_lon - c0_lon + 1) <= len(self.cells):
+                keys = ((i, j) for i in range(c0_lat, c1_lat + 1) for j in range(c0_lon, c1_lon + 1))
+                buckets = [self.cells[k] for k in keys if k in self.cells]
+            else:
+                # Fewer populated cells than the box covers: walk those instead
+                buckets = [bucket for (i, j), bucket in self.cells.items()
+                           if c0_lat <= i <= c1_lat and c0_lon <= j <= c1_lon]
+            for bucket in buckets:
+                for result_hash, (lat, lon) in bucket.items():
+                    if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                        found.append((result_hash, lat, lon))
+        return found
+
+
+grid_index = GridIndex()
+_postgis_available: Dict[str, bool] = {}
+
+
+def uses_postgis(db) -> bool:
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _postgis_available:
+        _postgis_available[key] = bind.dialect.name == "postgresql" and any(
+            c["name"] == "location" for c in inspect(bind).get_columns("analysis_results")
+        )
+    return _postgis_available[key]
+
+
+def _summary(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def avg(field):
+        values = [r[field] for r in rows if r.get(field) is not None]
+        return round(sum(values) / len(values), 1) if values else None
+
+    return {
+        "count": len(rows),
+        "average_overall_risk_score": avg("overall_risk_score"),
+        "average_earthquake_risk": avg("earthquake_risk"),
+        "average_flood_risk": avg("flood_risk"),
+        "average_fire_risk": avg("fire_risk"),
+        "average_landslide_risk": avg("landslide_risk"),
+    }
+
+
+def _item(result: AnalysisResult, distance_m: Optional[float]) -> Dict[str, Any]:
+    item = {"address": result.address, **{f: getattr(result, f) for f in TYPED_RESULT_FIELDS}}
+    if distance_m is not None:
+        item["distance_m"] = round(distance_m, 1)
+    return item
+
+
+def _postgis_search(db, lat: Optional[float], lon: Optional[float], radius_m: Optional[float],
+                    bbox: Optional[BBox], limit: int):
+    location = literal_column("analysis_results.location")
+    if radius_m is not None:
+        point = func.geography(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326))
+        distance = func.ST_Distance(location, point)
+        condition = func.ST_DWithin(location, point, radius_m)
+    else:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        envelope = func.geography(func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326))
+        distance = None
+        condition = func.ST_Intersects(location, envelope)
+    columns = [AnalysisResult] + ([distance.label("distance_m")] if distance is not None else [])
+    stmt = select(*columns).where(condition)
+    stmt = stmt.order_by(distance if distance is not None else AnalysisResult.created_at.desc()).limit(limit)
+    rows = db.execute(stmt).all()
+    return [(row[0], row[1] if distance is not None else None) for row in rows]
+
+
+def _grid_search(db, lat: Optional[float], lon: Optional[float], radius_m: Optional[float],
+                 bbox: Optional[BBox], limit: int):
+    grid_index.refresh(db)
+    if radius_m is not None:
+        candidates = [
+            (h, haversine_m(lat, lon, clat, clon)) for h, clat, clon in grid_index.search(radius_bbox(lat, lon, radius_m))
+        ]
+        matches = sorted((c for c in candidates if c[1] <= radius_m), key=lambda c: c[1])[:limit]
+    else:
+        matches = [(h, None) for h, _, _ in grid_index.search(bbox)][:limit]
+    if not matches:
+        return []
+    by_hash = {
+        r.result_hash: r for r in db.execute(
+            select(AnalysisResult).where(AnalysisResult.result_hash.in_([h for h, _ in matches]))
+        ).scalars()
+    }
+    # Results compacted away since the last refresh simply drop out
+    return [(by_hash[h], d) for h, d in matches if h in by_hash]
+
+
+def find_nearby(db, lat: Optional[float] = None, lon: Optional[float] = None, radius_m: Optional[float] = None,
+                bbox: Optional[BBox] = None, limit: int = 50) -> Dict[str, Any]:
+    """Stored results within ``radius_m`` of (lat, lon), or inside ``bbox``, nearest first, with averages."""
+    search = _postgis_search if uses_postgis(db) else _grid_search
+    found = search(db, lat, lon, radius_m, bbox, limit)
+    items = [_item(result, distance) for result, distance in found]
+    return {"summary": _summary(items), "analyses": items}
@@ -1,18 +1,36 @@
-import json
+"""
+Supabase JWT (RS256) verification against the project's JWKS.
+
+Keys are kept per process and refreshed in the background by an asyncio task
+shortly before ``JWKS_REFRESH_SECONDS`` elapse, so requests do not wait on
+the JWKS endpoint. A token signed with an unknown ``kid`` (key rotation)
+triggers an immediate refetch, at most once every
+``JWKS_MIN_REFETCH_SECONDS``.
+
+Verified claims are remembered in a bounded LRU keyed by the SHA-256 of the
+token until the token's ``exp``, so a token is RSA-verified once per worker
+rather than on every request.
+
+Without ``SUPABASE_JWKS_URL`` or ``SUPABASE_URL`` (e.g. ``AUTH_PROVIDER=local``)
+no key is ever fetched and no refresher is started; every lookup finds no key.
+
+Async handlers use ``verify_supabase_jwt_async`` (cache hits never leave the
+event loop; signature checks run in a worker thread). ``verify_supabase_jwt``
+is the blocking equivalent for sync code.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
 import time
-from typing import Optional
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
 
-import requests
-from jose import jwt
-from jose.utils import base64url_decode
+import httpx
 
 from app.core.config import settings
 
-
-_JWKS_CACHE = {
-    "keys": None,
-    "fetched_at": 0,
-}
+logger = logging.getLogger(__name__)
 
 
 def _get_jwks_url() -> Optional[str]:
@@ -24,32 +42,182 @@ def _get_jwks_url() -> Optional[str]:
     return None
 
 
-def _fetch_jwks():
-    now = time.time()
-    if _JWKS_CACHE["keys"] and now - _JWKS_CACHE["fetched_at"] < 3600:
-        return _JWKS_CACHE["keys"]
-    url = _get_jwks_url()
-    if not url:
-        raise RuntimeError("Supabase JWKS URL not configured")
-    resp = requests.get(url, timeout=5)
-    resp.raise_for_status()
-    data = resp.json()
-    _JWKS_CACHE["keys"] = data
-    _JWKS_CACHE["fetched_at"] = now
-    return data
+class JWKSCache:
+    """Signing keys by ``kid``, refreshed in the background and on unknown kids (rate-limited)."""
 
+    def __init__(self, max_age: float = 3600.0, min_refetch_interval: float = 30.0, url: Optional[str] = None):
+        self.max_age = max_age
+        self.min_refetch_interval = min_refetch_interval
+        self._url = url
+        self.keys: Dict[str, Dict[str, Any]] = {}
+        self.fetched_at = 0.0
+        self.fetches = 0
+        self.failures = 0
+        self._last_attempt = 0.0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
 
-def verify_supabase_jwt(token: str) -> dict:
-    """Verify Supabase JWT (RS256) via JWKS and return claims.
+    @property
+    def configured(self) -> bool:
+        return bool(self._url or _get_jwks_url())
+
+    @property
+    def url(self) -> str:
+        url = self._url or _get_jwks_url()
+        if not url:
+            raise RuntimeError("Supabase JWKS URL not configured")
+        return url
+
+    def _expired(self) -> bool:
+        return not self.keys or time.monotonic() - self.fetched_at >= self.max_age
+
+    def _needs_fetch(self, kid: Optional[str]) -> bool:
+        # Expired keys or an unknown kid trigger a fetch, but never more often than min_refetch_interval
+        stale = self._expired() or kid not in self.keys
+        return stale and time.monotonic() - self._last_attempt >= self.min_refetch_interval
+
+    def _fetch_failed(self, error: Exception):
+        self.failures += 1
+        if not self.keys:
+            raise error
+        logger.warning("JWKS fetch failed, keeping %d cached keys: %s", len(self.keys), error)
+
+    def _store(self, data: Dict[str, Any]):
+        keys = {k.get("kid"): k for k in data.get("keys", [])}
+        with self._lock:
+            self.keys = keys
+            self.fetched_at = time.monotonic()
+            self.fetches += 1
+
+    # --- blocking ---
+    def refresh(self):
+        self._last_attempt = time.monotonic()
+        resp = httpx.get(self.url, timeout=5.0)
+        resp.raise_for_status()
+        self._store(resp.json())
+
+    def get_key(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not self.configured:
+            return None
+        if self._needs_fetch(kid):
+            try:
+                self.refresh()
+            except Exception as e:
+                self._fetch_failed(e)
+        return self.keys.get(kid)
+
+    # --- async ---
+    async def refresh_async(self):
+        last_attempt = self._last_attempt
+        async with self._async_lock:
+            if self._last_attempt != last_attempt:
+                return  # another request fetched while we waited
+            self._last_attempt = time.monotonic()
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                resp = await client.get(self.url)
+                resp.raise_for_status()
+            self._store(resp.json())
+
+    async def get_key_async(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not self.configured:
+            return None
+        self.ensure_refresher()
+        if self._needs_fetch(kid):
+            try:
+                await self.refresh_async()
+            except Exception as e:
+                self._fetch_failed(e)
+        return self.keys.get(kid)
+
+    def ensure_refresher(self):
+        if not self.configured:
+            return
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Locks and tasks belong to one event loop (tests create several)
+            self._loop, self._async_lock, self._task = loop, asyncio.Lock(), None
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            # Refresh at 90% of the key lifetime; until the first fetch, requests fetch on demand
+            age = time.monotonic() - self.fetched_at
+            await asyncio.sleep(max(self.max_age * 0.9 - age, 1.0) if self.keys else self.min_refetch_interval)
+            try:
+                await self.refresh_async()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.warning("JWKS refresh failed: %s", e)
+
+    async def stop(self):
+        if self._task is not None and self._loop is asyncio.get_running_loop():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified claims keyed by token hash; entries expire with the token."""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, claims: Dict[str, Any]):
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)) or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[self.key(token)] = (claims, float(exp))
+            self._entries.move_to_end(self.key(token))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+jwks_cache = JWKSCache(settings.JWKS_REFRESH_SECONDS, settings.JWKS_MIN_REFETCH_SECONDS)
+verified_tokens = VerifiedTokenCache(settings.JWT_CLAIMS_CACHE_SIZE)
+
+
+def _kid(token: str) -> Optional[str]:
+    from jose import jwt
+
+    return jwt.get_unverified_header(token).get("kid")
+
+
+def _decode(token: str, key: Dict[str, Any]) -> dict:
+    from jose import jwt
 
-    Raises Exception if invalid.
-    """
-    jwks = _fetch_jwks()
-    headers = jwt.get_unverified_header(token)
-    kid = headers.get("kid")
-    key = next((k for k in jwks.get("keys", []) if k.get("kid") == kid), None)
-    if not key:
-        raise ValueError("No matching JWKS key")
     claims = jwt.decode(
         token,
         key,
@@ -57,4 +225,43 @@ def verify_supabase_jwt(token: str) -> dict:
         audience=None,  # Supabase does not require audience for client JWT
         options={"verify_aud": False},
     )
+    verified_tokens.put(token, claims)
     return claims
+
+
+def verify_supabase_jwt(token: str) -> dict:
+    """Verify Supabase JWT (RS256) via JWKS and return claims.
+
+    Raises Exception if invalid.
+    """
+    claims = verified_tokens.get(token)
+    if claims is not None:
+        return claims
+    key = jwks_cache.get_key(_kid(token))
+    if not key:
+        raise ValueError("No matching JWKS key")
+    return _decode(token, key)
+
+
+async def verify_supabase_jwt_async(token: str) -> dict:
+    """Async ``verify_supabase_jwt``: JWKS is fetched without blocking and RSA runs in a worker thread."""
+    claims = verified_tokens.get(token)
+    if claims is not None:
+        return claims
+    key = await jwks_cache.get_key_async(_kid(token))
+    if not key:
+        raise ValueError("No matching JWKS key")
+    from anyio import to_thread
+
+    return await to_thread.run_sync(_decode, token, key)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "jwks_keys": len(jwks_cache.keys),
+        "jwks_fetches": jwks_cache.fetches,
+        "jwks_failures": jwks_cache.failures,
+        "verified_tokens_cached": len(verified_tokens),
+        "verified_token_hits": verified_tokens.hits,
+        "verified_token_misses": verified_tokens.misses,
+    }
@@ -0,0 +1,118 @@
+"""
+Background deletion of expired and revoked auth tokens.
+
+Every login and refresh rotation adds a ``refresh_tokens`` row and every
+reset request a ``password_reset_tokens`` row. Revoking or using a token
+moves its ``expires_at`` to now, so "expired or revoked" is a single range
+on the indexed ``expires_at`` column. ``TokenSweeper`` deletes such rows
+every ``TOKEN_SWEEP_INTERVAL_SECONDS`` in batches of
+``TOKEN_SWEEP_BATCH_SIZE`` (one short transaction each) so the tables stay
+close to the number of live sessions. It also deletes ``email_outbox`` rows
+that are sent or failed: their bodies may hold password reset links, and
+the sender blanks them on delivery, but rows from before that (or a crash
+in between) would still expose live tokens. Running it in every worker is
+safe; concurrent sweeps just find less to delete.
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, select
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.outbox import EmailOutbox
+from app.models.user import PasswordResetToken, RefreshToken
+
+logger = logging.getLogger(__name__)
+
+
+class TokenSweeper:
+    def __init__(self, session_factory=SessionLocal, interval: float = 300.0, batch_size: int = 1000,
+                 enabled: bool = True):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.deleted = {model.__tablename__: 0 for model, _ in self._targets()}
+        self.sweeps = 0
+
+    def start(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="token-sweeper", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning("Token sweep failed: %s", e)
+
+    @staticmethod
+    def _targets():
+        """(model, criterion(now)) pairs: the rows each sweep deletes."""
+        return (
+            (RefreshToken, lambda now: RefreshToken.expires_at <= now),
+            (PasswordResetToken, lambda now: PasswordResetToken.expires_at <= now),
+            (EmailOutbox, lambda now: EmailOutbox.status.in_(("sent", "failed"))),
+        )
+
+    def _delete_batch(self, model, criterion) -> int:
+        due = select(model.id).where(criterion).limit(self.batch_size)
+        with self.session_factory() as db:
+            deleted = db.execute(delete(model).where(model.id.in_(due)).execution_options(synchronize_session=False))
+            db.commit()
+        return deleted.rowcount or 0
+
+    def sweep(self) -> Dict[str, int]:
+        """Delete expired or revoked tokens and finished outbox e-mails as of now; returns the count per table."""
+        now = datetime.utcnow()
+        counts = {}
+        for model, criterion in self._targets():
+            total = 0
+            while not self._stop.is_set():
+                n = self._delete_batch(model, criterion(now))
+                total += n
+                if n < self.batch_size:
+                    break
+            counts[model.__tablename__] = total
+            self.deleted[model.__tablename__] += total
+        self.sweeps += 1
+        if any(counts.values()):
+            logger.info("Token sweep deleted %s", counts)
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "sweeps": self.sweeps, "deleted": dict(self.deleted)}
+
+    def openmetrics_lines(self) -> List[str]:
+        """This worker's sweep counters in OpenMetrics form (not aggregated across workers)."""
+        lines = [
+            "# TYPE auth_tokens_swept counter",
+            "# HELP auth_tokens_swept Expired or revoked auth token rows (and finished outbox e-mails) deleted.",
+        ]
+        for table, count in self.deleted.items():
+            lines.append(f'auth_tokens_swept_total{{table="{table}"}} {count}')
+        return lines
+
+
+token_sweeper = TokenSweeper(
+    interval=settings.TOKEN_SWEEP_INTERVAL_SECONDS,
+    batch_size=settings.TOKEN_SWEEP_BATCH_SIZE,
+    enabled=settings.TOKEN_SWEEP_ENABLED,
+)
@@ -0,0 +1,121 @@
+"""
+Short-lived per-worker cache of users resolved from local access tokens.
+
+``get_current_user_from_token`` looks the token subject (the e-mail) up here
+before querying ``users``; entries live for ``USER_CACHE_TTL_SECONDS``.
+Password changes, deactivation and logout drop the subject's entry.
+
+When ``REDIS_URL`` is set, invalidations are also published on
+``USER_CACHE_CHANNEL`` and every worker subscribed to it drops the entry
+too; without Redis, other workers keep a stale entry for at most the TTL.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RedisInvalidationChannel:
+    """Publishes invalidated subjects and delivers those of other workers to a callback."""
+
+    def __init__(self, url: str, channel: str):
+        self.url = url
+        self.channel = channel
+        self._client = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _redis(self):
+        if self._client is None:
+            import redis  # optional dependency, only needed for cross-worker invalidation
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def publish(self, subject: str):
+        try:
+            self._redis().publish(self.channel, subject)
+        except Exception as e:
+            logger.warning("User cache invalidation broadcast failed: %s", e)
+
+    def subscribe(self, callback):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._listen, args=(callback,), name="user-cache-invalidation",
+                                        daemon=True)
+        self._thread.start()
+
+    def _listen(self, callback):
+        while True:
+            try:
+                pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    data = message.get("data")
+                    callback(data.decode() if isinstance(data, bytes) else str(data))
+            except Exception as e:
+                logger.warning("User cache invalidation listener failed, retrying: %s", e)
+                time.sleep(5)
+
+
+class UserCache:
+    """Bounded TTL cache of resolved users keyed by token subject."""
+
+    def __init__(self, ttl: float = 30.0, max_size: int = 10000, channel=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.channel = channel
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, subject: str) -> Optional[Any]:
+        if self.channel is not None:
+            self.channel.subscribe(self._drop)
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(subject)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[subject]
+            self.misses += 1
+            return None
+
+    def put(self, subject: str, user: Any):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[subject] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _drop(self, subject: str):
+        with self._lock:
+            if self._entries.pop(subject, None) is not None:
+                self.invalidations += 1
+
+    def invalidate(self, subject: Optional[str]):
+        """Forget ``subject`` in this worker and, with a channel, in all others."""
+        if not subject:
+            return
+        self._drop(subject)
+        if self.channel is not None:
+            self.channel.publish(subject)
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "invalidations": self.invalidations}
+
+
+user_cache = UserCache(
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+    channel=RedisInvalidationChannel(settings.REDIS_URL, settings.USER_CACHE_CHANNEL) if settings.REDIS_URL else None,
+)
@@ -1,26 +1,32 @@
 from typing import Optional
 from datetime import datetime, timedelta
+import hashlib
 import secrets
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from passlib.context import CryptContext
 
 from app.models.user import User, RefreshToken, PasswordResetToken
+from app.services.user_cache import user_cache
+from app.services.password_hasher import password_hasher
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def get_pwd_context():
+    """Password hashing context, built on first use so passlib stays off the startup path."""
+    return password_hasher.context
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
-def create_user(db: Session, name: str, email: str, password: str) -> User:
-    user = User(name=name, email=email, password_hash=get_password_hash(password))
+def create_user(db: Session, name: str, email: str, password: Optional[str] = None,
+                password_hash: Optional[str] = None) -> User:
+    """Create a user from a plain password, or from a hash computed with ``password_hasher``."""
+    user = User(name=name, email=email, password_hash=password_hash or get_password_hash(password))
     db.add(user)
     try:
         db.commit()
@@ -35,11 +41,45 @@ def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
 
+def hash_token(token: str) -> str:
+    """SHA-256 of a token as stored in ``refresh_tokens``/``password_reset_tokens`` (fixed width, indexable)."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def store_refresh_token(db: Session, user: User, token: str, expires_at: datetime) -> RefreshToken:
+    """Add (not commit) the refresh token record for ``token``."""
+    rt = RefreshToken(user_id=user.id, token_hash=hash_token(token), expires_at=expires_at, revoked=False)
+    db.add(rt)
+    return rt
+
+
+def get_active_refresh_token(db: Session, token: str) -> Optional[RefreshToken]:
+    return (
+        db.query(RefreshToken)
+        .filter(
+            RefreshToken.token_hash == hash_token(token),
+            RefreshToken.revoked == False,
+            RefreshToken.expires_at > datetime.utcnow(),
+        )
+        .first()
+    )
+
+
+def revoke_refresh_token(db: Session, token: str) -> bool:
+    """Revoke ``token`` (not committed); False if it is unknown."""
+    rt = db.query(RefreshToken).filter(RefreshToken.token_hash == hash_token(token)).first()
+    if rt is None:
+        return False
+    rt.revoked = True
+    rt.expires_at = min(rt.expires_at, datetime.utcnow())
+    return True
+
+
 def create_password_reset_token(db: Session, user: User, expires_minutes: int = 60) -> str:
     token = secrets.token_urlsafe(48)
     prt = PasswordResetToken(
         user_id=user.id,
-        token=token,
+        token_hash=hash_token(token),
         expires_at=datetime.utcnow() + timedelta(minutes=expires_minutes),
         used=False,
     )
@@ -52,7 +92,7 @@ def get_valid_password_reset(db: Session, token: str) -> Optional[PasswordResetT
     rec = (
         db.query(PasswordResetToken)
         .filter(
-            PasswordResetToken.token == token,
+            PasswordResetToken.token_hash == hash_token(token),
             PasswordResetToken.used == False,
             PasswordResetToken.expires_at > datetime.utcnow(),
         )
@@ -63,11 +103,26 @@ def get_valid_password_reset(db: Session, token: str) -> Optional[PasswordResetT
 
 def mark_password_reset_used(db: Session, rec: PasswordResetToken):
     rec.used = True
+    rec.expires_at = datetime.utcnow()  # due for the token sweeper
     db.add(rec)
     db.commit()
 
 
-def update_user_password(db: Session, user: User, new_password: str):
-    user.password_hash = get_password_hash(new_password)
+def update_user_password(db: Session, user: User, new_password: Optional[str] = None,
+                         password_hash: Optional[str] = None):
+    user.password_hash = password_hash or get_password_hash(new_password)
+    db.add(user)
+    db.commit()
+    user_cache.invalidate(user.email)
+
+
+def deactivate_user(db: Session, user: User):
+    """Disable the account and revoke its refresh tokens; cached sessions end immediately."""
+    user.is_active = False
+    now = datetime.utcnow()
+    db.query(RefreshToken).filter(RefreshToken.user_id == user.id, RefreshToken.expires_at > now).update(
+        {RefreshToken.revoked: True, RefreshToken.expires_at: now}, synchronize_session=False
+    )
     db.add(user)
     db.commit()
+    user_cache.invalidate(user.email)
@@ -0,0 +1,98 @@
+"""
+Import-time budget for the API entry point.
+
+Runs ``python -X importtime -c "import main"`` in a fresh interpreter, prints
+the slowest top-level packages and fails (exit status 1) when the cumulative
+import time of ``main`` exceeds the budget or when a module that must stay
+off the startup path (geocoding, JWT, password hashing, ML/GIS stacks) was
+imported eagerly.
+
+    cd backend && python -m benchmarks.import_time [budget_ms]
+
+The budget defaults to ``IMPORT_TIME_BUDGET_MS`` or 1500 ms. Timings are the
+best of three runs to reduce noise from a cold disk cache.
+"""
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_MS = 1500.0
+RUNS = 3
+
+# Imported on first use only; seeing one of these at startup is a regression
+LAZY_MODULES = (
+    "geopy", "jose", "passlib", "requests",
+    "tensorflow", "sklearn", "shapely", "geoalchemy2", "pandas", "numpy",
+)
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Parse ``-X importtime`` output into (module, self_us, cumulative_us) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # header line
+        rows.append((parts[2].strip(), self_us, cumulative_us))
+    return rows
+
+
+def measure(module: str = "main") -> List[Tuple[str, int, int]]:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def top_level_totals(rows: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """Self time summed per top-level package, e.g. everything under ``sqlalchemy``."""
+    totals: Dict[str, int] = {}
+    for name, self_us, _ in rows:
+        root = name.split(".", 1)[0]
+        totals[root] = totals.get(root, 0) + self_us
+    return totals
+
+
+def eager_lazy_modules(rows: List[Tuple[str, int, int]]) -> List[str]:
+    imported = {name.split(".", 1)[0] for name, _, _ in rows}
+    return sorted(imported.intersection(LAZY_MODULES))
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else float(os.environ.get("IMPORT_TIME_BUDGET_MS", DEFAULT_BUDGET_MS))
+    best_ms, best_rows = None, []
+    for _ in range(RUNS):
+        rows = measure()
+        total_ms = next(cum for name, _, cum in rows if name == "main") / 1000.0
+        if best_ms is None or total_ms < best_ms:
+            best_ms, best_rows = total_ms, rows
+
+    print(f"import main: {best_ms:.1f} ms (budget {budget_ms:.0f} ms, best of {RUNS})")
+    for root, us in sorted(top_level_totals(best_rows).items(), key=lambda kv: -kv[1])[:10]:
+        print(f"  {root:<24} {us / 1000.0:8.1f} ms")
+
+    failed = False
+    eager = eager_lazy_modules(best_rows)
+    if eager:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    if best_ms > budget_ms:
+        print(f"FAIL: import time {best_ms:.1f} ms exceeds budget {budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Per-request overhead of the request instrumentation middleware.
+
+Compares a bare app, the previous stack (``BaseHTTPMiddleware`` metrics plus
+the ``@app.middleware("http")`` request logger) and the pure ASGI
+``MetricsMiddleware``. Requests are driven straight through the ASGI
+interface so network and server costs are excluded.
+
+    cd backend && python -m benchmarks.middleware_overhead [requests]
+"""
+import asyncio
+import logging
+import sys
+import time
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.core.metrics import MetricsMiddleware, RequestMetrics
+
+
+async def ok(request):
+    return PlainTextResponse("ok")
+
+
+def bare_app():
+    return Starlette(routes=[Route("/ping", ok)])
+
+
+def legacy_app():
+    """Equivalent of the former BaseHTTPMiddleware metrics + log_requests pair."""
+    app = bare_app()
+    metrics = RequestMetrics()
+    log = logging.getLogger("bench.legacy")
+
+    class LegacyMetricsMiddleware(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            start_time = time.time()
+            response = await call_next(request)
+            response_time = time.time() - start_time
+            metrics.record(request.method, request.url.path, response_time, response.status_code)
+            response.headers["X-Response-Time"] = f"{response_time:.3f}s"
+            return response
+
+    async def log_requests(request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        log.info(f"{request.method} {request.url.path} - Status: {response.status_code} - Time: {process_time:.3f}s")
+        response.headers["X-Process-Time"] = str(process_time)
+        return response
+
+    app.add_middleware(LegacyMetricsMiddleware)
+    app.add_middleware(BaseHTTPMiddleware, dispatch=log_requests)
+    return app
+
+
+def asgi_app():
+    app = bare_app()
+    app.add_middleware(MetricsMiddleware, metrics=RequestMetrics())
+    return app
+
+
+async def drive(app, n: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/ping", "raw_path": b"/ping", "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(200):  # warm-up
+        await app(dict(scope), receive, send)
+    start = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    # Access log records are dropped by level, as with LOG_LEVEL=WARNING
+    logging.basicConfig(level=logging.WARNING)
+    results = {}
+    for name, factory in (("bare", bare_app), ("legacy", legacy_app), ("asgi", asgi_app)):
+        results[name] = asyncio.run(drive(factory(), n))
+    for name, us in results.items():
+        overhead = us - results["bare"]
+        print(f"{name:>7}: {us:8.1f} us/request  (middleware overhead {overhead:7.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
@@ -68,8 +68,26 @@ if [ "$APPLY_MIGRATIONS" = "true" ]; then
     echo "alembic upgrade failed" >&2
     exit 1
   }
+  # Tables without a migration (users, auth tokens, api_keys, ...) and the upcoming monthly
+  # partitions of analyses; create_all leaves the migrated tables alone
+  python -m app.db.init_db || {
+    echo "DB init after migrations failed" >&2
+    exit 1
+  }
 else
   echo "APPLY_MIGRATIONS not set to 'true' -> Skipping migrations"
+  # Create missing tables once here instead of in every worker at startup
+  if [ "${DB_CREATE_ALL_ON_STARTUP:-true}" = "true" ]; then
+    python -m app.db.init_db || echo "DB init failed; continuing" >&2
+  fi
+fi
+# Workers never run create_all themselves when started from this script
+export DB_CREATE_ALL_ON_STARTUP=false
+
+# Per-worker metrics snapshots are cumulative; start each container with an empty directory
+if [ -n "${METRICS_MULTIPROC_DIR:-}" ]; then
+  rm -rf "$METRICS_MULTIPROC_DIR"
+  mkdir -p "$METRICS_MULTIPROC_DIR"
 fi
 
 echo "Starting server"
@@ -1,20 +1,35 @@
 import logging
 import time
 import os
+from contextlib import asynccontextmanager
+from typing import Optional
+from anyio import to_thread
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from starlette.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from app.core.config import settings
-from app.core.metrics import MetricsMiddleware, set_metrics_middleware, get_metrics_middleware
-from app.api import risk, b2b
+from app.core.metrics import MetricsMiddleware, request_metrics, OPENMETRICS_CONTENT_TYPE
+from app.core.tracing import TracingMiddleware
+from app.core.profiler import ProfilerMiddleware
+from app.core.static_assets import PrecompressedStaticFiles, MANIFEST_NAME as ASSET_MANIFEST_NAME
+from app.api import risk, b2b, admin
 from app.api import proxy as proxy_router
 from app.api import analyze as analyze_router
 from app.api import analyses as analyses_router
 from app.api.auth import routes as auth_routes
-from app.db.session import Base, engine
+from app.db.init_db import init_db
+from app.db.session import async_engine, get_pool_stats, pool_openmetrics_lines
+from app.services.analysis_writer import analysis_writer
+from app.services.risk_cache import risk_data_cache
+from app.services import supabase_auth
+from app.services.user_cache import user_cache
+from app.services.password_hasher import password_hasher
+from app.services.email_outbox import email_sender
+from app.services.partition_maintainer import partition_maintainer
+from app.services.token_sweeper import token_sweeper
 
 # Logging configuration
 logging.basicConfig(
@@ -23,29 +38,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema bootstrap runs after the server starts, not at import (in prod use Alembic)
+    if settings.DB_CREATE_ALL_ON_STARTUP:
+        try:
+            await to_thread.run_sync(init_db)
+            logger.info("Database tables ensured (create_all).")
+        except Exception as e:
+            logger.error(f"DB init failed: {e}")
+    # Deliver e-mails queued in the outbox (no-op without SMTP_HOST)
+    email_sender.start()
+    token_sweeper.start()
+    partition_maintainer.start()
+    yield
+    # Flush analyses still buffered by the write-behind writer
+    await to_thread.run_sync(analysis_writer.close)
+    await to_thread.run_sync(risk_data_cache.close)
+    await to_thread.run_sync(password_hasher.shutdown)
+    await to_thread.run_sync(email_sender.close)
+    await to_thread.run_sync(token_sweeper.close)
+    await to_thread.run_sync(partition_maintainer.close)
+    await supabase_auth.jwks_cache.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     description="AI-powered regional disaster and crisis risk modeling platform for Turkey",
     docs_url="/docs" if settings.ENVIRONMENT != "production" else None,
-    redoc_url="/redoc" if settings.ENVIRONMENT != "production" else None
+    redoc_url="/redoc" if settings.ENVIRONMENT != "production" else None,
+    lifespan=lifespan
 )
 
-# Ensure DB tables exist (simple init; in prod use Alembic)
 # Add gzip compression (beneficial for JSON responses)
 app.add_middleware(GZipMiddleware, minimum_size=500)
 
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables ensured (create_all).")
-except Exception as e:
-    logger.error(f"DB init failed: {e}")
-
-# Add metrics middleware first
-metrics_middleware = MetricsMiddleware(app)
-app.add_middleware(MetricsMiddleware)
-set_metrics_middleware(metrics_middleware)
-
 # Security middleware for production
 if hasattr(settings, 'ENVIRONMENT') and settings.ENVIRONMENT == "production":
     if hasattr(settings, 'ALLOWED_HOSTS'):
@@ -64,21 +95,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    
-    logger.info(
-        f"{request.method} {request.url.path} - "
-        f"Status: {response.status_code} - "
-        f"Time: {process_time:.3f}s"
-    )
-    
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
+# Route attribution for on-demand profiles (no-op unless a profile is running)
+app.add_middleware(ProfilerMiddleware)
+
+# Per-stage tracing (Server-Timing header + OTLP/JSON export) for a sample of requests
+if settings.TRACE_SAMPLE_RATE > 0:
+    app.add_middleware(TracingMiddleware, sample_rate=settings.TRACE_SAMPLE_RATE)
+
+# Request metrics, X-Response-Time header and access logging (pure ASGI, outermost)
+app.add_middleware(MetricsMiddleware, metrics=request_metrics)
 
 # Include routers (preserve existing functionality)
 app.include_router(risk.router, prefix=f"{settings.API_V1_STR}/risk", tags=["Risk Analysis"])
@@ -87,13 +112,19 @@ app.include_router(analyses_router.router, prefix=f"{settings.API_V1_STR}", tags
 app.include_router(b2b.router, prefix=f"{settings.API_V1_STR}/b2b", tags=["B2B API"])
 app.include_router(auth_routes.router, prefix=f"{settings.API_V1_STR}/auth", tags=["Auth"])
 app.include_router(proxy_router.router, prefix=f"{settings.API_V1_STR}", tags=["Proxy"])
+app.include_router(admin.router, prefix=f"{settings.API_V1_STR}/admin", tags=["Admin"])
 
 """
 Serve frontend static files under /app path. Keep root (/) for API health/info JSON
 to satisfy tests expecting JSON at root. Frontend HTML can be accessed at /app/index.html.
 """
 frontend_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend")
-if os.path.exists(frontend_dir):
+# Prefer the precompressed, fingerprinted build (python -m app.core.static_assets) when present
+frontend_dist_dir = os.environ.get("FRONTEND_DIST_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend-dist")
+if os.path.exists(os.path.join(frontend_dist_dir, ASSET_MANIFEST_NAME)):
+    app.mount("/app", PrecompressedStaticFiles(directory=frontend_dist_dir, html=True), name="frontend")
+    logger.info(f"Mounted precompressed frontend build at '/app': {frontend_dist_dir}")
+elif os.path.exists(frontend_dir):
     app.mount("/app", StaticFiles(directory=frontend_dir, html=True), name="frontend")
     logger.info(f"Mounted frontend at '/app': {frontend_dir}")
 else:
@@ -110,16 +141,27 @@ async def health_check():
     }
 
 @app.get("/metrics")
-async def metrics():
-    """Basic metrics endpoint for monitoring."""
-    middleware = get_metrics_middleware()
-    if middleware:
-        return middleware.get_metrics()
-    else:
-        return {
-            "error": "Metrics middleware not available",
-            "version": settings.VERSION
-        }
+async def metrics(request: Request, format: Optional[str] = None):
+    """Request metrics as JSON, or OpenMetrics text for Prometheus scrapers."""
+    if format == "openmetrics" or "application/openmetrics-text" in request.headers.get("accept", ""):
+        body = request_metrics.openmetrics(extra_lines=(
+            analysis_writer.openmetrics_lines() + pool_openmetrics_lines() + password_hasher.openmetrics_lines()
+            + email_sender.openmetrics_lines() + token_sweeper.openmetrics_lines()
+        ))
+        return PlainTextResponse(body, media_type=OPENMETRICS_CONTENT_TYPE)
+    data = request_metrics.get_metrics()
+    data["analysis_writes"] = analysis_writer.stats()
+    data["db_pool"] = get_pool_stats()
+    data["risk_data_cache"] = risk_data_cache.stats()
+    data["email_outbox"] = email_sender.stats()
+    data["analyses_partitions"] = partition_maintainer.stats()
+    data["auth"] = {
+        **supabase_auth.stats(),
+        "user_cache": user_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "token_sweeper": token_sweeper.stats(),
+    }
+    return data
 
 # Global exception handler
 @app.exception_handler(Exception)
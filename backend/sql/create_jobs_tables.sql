@@ -25,3 +25,239 @@ CREATE TABLE IF NOT EXISTS cached_results (
 );
 
 CREATE INDEX IF NOT EXISTS idx_cached_results_job_id ON cached_results(job_id);
+
+-- Columns written by the Cloud Run worker (cloud-run-worker/worker.py)
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS worker_id text NULL;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS started_at timestamptz NULL;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS completed_at timestamptz NULL;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS error text NULL;
+
+-- Statuses are exactly pending|running|done|failed (earlier worker versions wrote 'queued'/'errored')
+UPDATE jobs SET status = 'pending' WHERE status = 'queued';
+UPDATE jobs SET status = 'failed' WHERE status = 'errored';
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'jobs_status_check') THEN
+    ALTER TABLE jobs ADD CONSTRAINT jobs_status_check CHECK (status IN ('pending', 'running', 'done', 'failed'));
+  END IF;
+END;
+$$;
+
+-- Leases expire: a worker must extend lease_expires_at (heartbeat_jobs) while
+-- it runs a job; reap_expired_jobs puts jobs of dead workers back. run_after
+-- delays retries (exponential backoff).
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS lease_expires_at timestamptz NULL;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS run_after timestamptz NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS idx_jobs_running_lease ON jobs(lease_expires_at) WHERE status = 'running';
+
+-- Atomic batch lease: claims up to p_limit due pending jobs for one worker
+-- for p_lease_seconds, counts the attempt and returns the rows. FOR UPDATE
+-- SKIP LOCKED lets concurrent workers each take a different set of rows
+-- without waiting on or double-claiming each other.
+-- Called by the worker as POST /rest/v1/rpc/lease_jobs (service role only).
+DROP FUNCTION IF EXISTS lease_jobs(text, int);
+CREATE OR REPLACE FUNCTION lease_jobs(p_worker_id text, p_limit int DEFAULT 1, p_lease_seconds int DEFAULT 300)
+RETURNS SETOF jobs
+LANGUAGE sql
+AS $$
+  UPDATE jobs
+  SET status = 'running', worker_id = p_worker_id, attempts = attempts + 1,
+      started_at = now(), updated_at = now(),
+      lease_expires_at = now() + p_lease_seconds * interval '1 second'
+  WHERE id IN (
+    SELECT id FROM jobs
+    WHERE status = 'pending' AND run_after <= now()
+    ORDER BY created_at
+    LIMIT greatest(p_limit, 1)
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING *;
+$$;
+
+-- Extends the leases p_worker_id still holds; returns their ids (a missing id
+-- means the lease was lost, e.g. reaped after the worker stalled).
+CREATE OR REPLACE FUNCTION heartbeat_jobs(p_worker_id text, p_job_ids uuid[], p_lease_seconds int DEFAULT 300)
+RETURNS SETOF uuid
+LANGUAGE sql
+AS $$
+  UPDATE jobs
+  SET lease_expires_at = now() + p_lease_seconds * interval '1 second', updated_at = now()
+  WHERE id = ANY(p_job_ids) AND worker_id = p_worker_id AND status = 'running'
+  RETURNING id;
+$$;
+
+-- Ends a failed attempt: back to 'pending' after base * 2^(attempts-1) seconds
+-- (at most an hour), or 'failed' once p_max_attempts attempts were made.
+-- With p_worker_id set, only that worker's current lease is affected.
+-- Returns the new status (NULL if the job was not running under that lease).
+CREATE OR REPLACE FUNCTION retry_or_fail_job(p_job_id uuid, p_worker_id text, p_error text,
+                                             p_max_attempts int DEFAULT 5, p_backoff_seconds int DEFAULT 30)
+RETURNS text
+LANGUAGE sql
+AS $$
+  UPDATE jobs
+  SET status = CASE WHEN attempts >= p_max_attempts THEN 'failed' ELSE 'pending' END,
+      error = p_error,
+      worker_id = NULL,
+      lease_expires_at = NULL,
+      run_after = CASE WHEN attempts >= p_max_attempts THEN run_after
+                       ELSE now() + least(p_backoff_seconds * power(2, greatest(attempts - 1, 0)), 3600)
+                                    * interval '1 second' END,
+      completed_at = CASE WHEN attempts >= p_max_attempts THEN now() END,
+      updated_at = now()
+  WHERE id = p_job_id AND status = 'running' AND (p_worker_id IS NULL OR worker_id = p_worker_id)
+  RETURNING status;
+$$;
+
+-- Re-queues (or fails) running jobs whose lease expired; safe to run from
+-- every worker at once. Returns the number of jobs reaped.
+CREATE OR REPLACE FUNCTION reap_expired_jobs(p_max_attempts int DEFAULT 5, p_backoff_seconds int DEFAULT 30)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_id uuid;
+  v_count int := 0;
+BEGIN
+  FOR v_id IN
+    SELECT id FROM jobs WHERE status = 'running' AND lease_expires_at < now() FOR UPDATE SKIP LOCKED
+  LOOP
+    PERFORM retry_or_fail_job(v_id, NULL, 'lease expired', p_max_attempts, p_backoff_seconds);
+    v_count := v_count + 1;
+  END LOOP;
+  RETURN v_count;
+END;
+$$;
+
+-- Marks many of the worker's running jobs done in one statement.
+-- p_results is [{"id": <job id>, "result_id": <cached_results id or null>}, ...];
+-- jobs whose lease this worker lost are left alone. Returns the updated ids.
+CREATE OR REPLACE FUNCTION complete_jobs(p_worker_id text, p_results jsonb)
+RETURNS SETOF uuid
+LANGUAGE sql
+AS $$
+  UPDATE jobs j
+  SET status = 'done',
+      result_id = r.result_id,
+      error = NULL,
+      lease_expires_at = NULL,
+      completed_at = now(),
+      updated_at = now()
+  FROM jsonb_to_recordset(p_results) AS r(id uuid, result_id uuid)
+  WHERE j.id = r.id AND j.status = 'running' AND j.worker_id = p_worker_id
+  RETURNING j.id;
+$$;
+
+REVOKE ALL ON FUNCTION lease_jobs(text, int, int) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION heartbeat_jobs(text, uuid[], int) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION retry_or_fail_job(uuid, text, text, int, int) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION reap_expired_jobs(int, int) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION complete_jobs(text, jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION lease_jobs(text, int, int) TO service_role;
+GRANT EXECUTE ON FUNCTION heartbeat_jobs(text, uuid[], int) TO service_role;
+GRANT EXECUTE ON FUNCTION retry_or_fail_job(uuid, text, text, int, int) TO service_role;
+GRANT EXECUTE ON FUNCTION reap_expired_jobs(int, int) TO service_role;
+GRANT EXECUTE ON FUNCTION complete_jobs(text, jsonb) TO service_role;
+
+-- Wake idle workers as soon as jobs are inserted (by the enqueue edge function
+-- or anything else). One notification per INSERT statement, so bulk inserts
+-- do not flood the channel. Workers LISTEN on 'jobs_pending' over a direct
+-- (or session-mode pooler) connection and keep a slow poll as a safety net.
+CREATE OR REPLACE FUNCTION notify_jobs_pending()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM pg_notify('jobs_pending', '');
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS jobs_notify_pending ON jobs;
+CREATE TRIGGER jobs_notify_pending
+AFTER INSERT ON jobs
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_jobs_pending();
+
+-- Input-hash result reuse. A job payload is {"addresses": [...]} (items are
+-- address strings or {"address", "building_age"} objects), a single
+-- {"address", ...} object, or a bare array of items. normalize_job_input maps
+-- every equivalent spelling (case, whitespace) to one canonical jsonb value;
+-- its sha256 is the key under which results are stored and found again.
+CREATE OR REPLACE FUNCTION normalize_job_input(p_input jsonb)
+RETURNS jsonb
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT jsonb_build_object('addresses', coalesce(jsonb_agg(
+    jsonb_build_object(
+      'address', lower(regexp_replace(btrim(
+        CASE jsonb_typeof(e) WHEN 'string' THEN e #>> '{}' ELSE e ->> 'address' END
+      ), '\s+', ' ', 'g')),
+      'building_age', CASE jsonb_typeof(e) WHEN 'object' THEN nullif(e ->> 'building_age', '')::int END
+    ) ORDER BY ord), '[]'::jsonb))
+  FROM jsonb_array_elements(
+    CASE
+      WHEN jsonb_typeof(p_input) = 'array' THEN p_input
+      WHEN p_input ? 'addresses' THEN p_input -> 'addresses'
+      WHEN p_input ? 'address' THEN jsonb_build_array(p_input)
+      ELSE '[]'::jsonb
+    END
+  ) WITH ORDINALITY AS t(e, ord);
+$$;
+
+CREATE OR REPLACE FUNCTION job_input_hash(p_input jsonb)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT encode(digest(normalize_job_input(p_input)::text, 'sha256'), 'hex');
+$$;
+
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS input_hash text NULL;
+ALTER TABLE cached_results ADD COLUMN IF NOT EXISTS input_hash text NULL;
+CREATE INDEX IF NOT EXISTS idx_cached_results_input_hash ON cached_results(input_hash, created_at DESC);
+
+CREATE OR REPLACE FUNCTION set_job_input_hash()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  NEW.input_hash := job_input_hash(NEW.payload);
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS jobs_set_input_hash ON jobs;
+CREATE TRIGGER jobs_set_input_hash
+BEFORE INSERT ON jobs
+FOR EACH ROW
+EXECUTE FUNCTION set_job_input_hash();
+
+-- Enqueue with reuse: returns {"cached": true, "result": <cached_results row>}
+-- when an unexpired result for an equivalent input exists (no job is
+-- created), else inserts the job and returns {"cached": false, "job": <row>}.
+-- Called by the enqueue edge function as POST /rest/v1/rpc/enqueue_job.
+CREATE OR REPLACE FUNCTION enqueue_job(p_input jsonb, p_user_id uuid DEFAULT NULL)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_hash text := job_input_hash(p_input);
+  v_result cached_results;
+  v_job jobs;
+BEGIN
+  SELECT * INTO v_result FROM cached_results
+  WHERE input_hash = v_hash AND (expires_at IS NULL OR expires_at > now())
+  ORDER BY created_at DESC
+  LIMIT 1;
+  IF FOUND THEN
+    RETURN jsonb_build_object('cached', true, 'result', to_jsonb(v_result));
+  END IF;
+  INSERT INTO jobs (user_id, payload) VALUES (p_user_id, p_input) RETURNING * INTO v_job;
+  RETURN jsonb_build_object('cached', false, 'job', to_jsonb(v_job));
+END;
+$$;
+
+REVOKE ALL ON FUNCTION enqueue_job(jsonb, uuid) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION enqueue_job(jsonb, uuid) TO service_role;
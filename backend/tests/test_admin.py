@@ -0,0 +1,61 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import admin
+from app.core.config import settings
+from app.core.profiler import profiler_state
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_API_KEYS", ["ops-key"])
+    app = FastAPI()
+    app.include_router(admin.router, prefix="/admin")
+    return TestClient(app)
+
+
+def test_profile_requires_admin_key(client, monkeypatch):
+    """Missing or unknown keys are rejected; no configured keys disables the endpoint."""
+    assert client.get("/admin/profile", params={"seconds": 0.05}).status_code == 401
+    resp = client.get("/admin/profile", params={"seconds": 0.05}, headers={"X-Admin-Key": "nope"})
+    assert resp.status_code == 401
+
+    monkeypatch.setattr(settings, "ADMIN_API_KEYS", [])
+    resp = client.get("/admin/profile", params={"seconds": 0.05}, headers={"X-Admin-Key": "ops-key"})
+    assert resp.status_code == 403
+
+
+def test_profile_returns_collapsed_stacks(client):
+    """A valid request samples the worker and returns a collapsed-stack download."""
+    resp = client.get(
+        "/admin/profile",
+        params={"seconds": 0.2, "interval_ms": 5},
+        headers={"X-Admin-Key": "ops-key"},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert resp.headers["content-disposition"].endswith('.collapsed"')
+    assert int(resp.headers["x-profile-samples"]) > 0
+    lines = resp.text.strip().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+    assert not profiler_state.lock.locked()
+
+
+def test_concurrent_profile_is_rejected(client):
+    """Only one profile runs per worker; a second request gets 409."""
+    assert profiler_state.lock.acquire(blocking=False)
+    try:
+        resp = client.get("/admin/profile", params={"seconds": 0.05}, headers={"X-Admin-Key": "ops-key"})
+    finally:
+        profiler_state.lock.release()
+    assert resp.status_code == 409
+
+
+def test_profile_validates_duration(client):
+    """Durations outside (0, 60] seconds are rejected before sampling."""
+    for seconds in (0, 61):
+        resp = client.get("/admin/profile", params={"seconds": seconds}, headers={"X-Admin-Key": "ops-key"})
+        assert resp.status_code == 422
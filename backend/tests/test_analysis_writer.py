@@ -0,0 +1,111 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.tracing import SpanExporter, TracingMiddleware
+from app.db.session import Base
+from app.models.analysis import Analysis, AnalysisResult
+from app.services.analysis_writer import AnalysisWriter
+
+
+def _session_factory(tmp_path, create_tables=True):
+    engine = create_engine(f"sqlite:///{tmp_path / 'writer.db'}")
+    if create_tables:
+        Base.metadata.create_all(bind=engine, tables=[AnalysisResult.__table__, Analysis.__table__])
+    return sessionmaker(bind=engine)
+
+
+def test_flushes_when_batch_is_full(tmp_path):
+    """Reaching batch_size wakes the writer without waiting for the interval."""
+    factory = _session_factory(tmp_path)
+    writer = AnalysisWriter(session_factory=factory, flush_interval=60, batch_size=3)
+    for i in range(3):
+        assert writer.submit("u1", f"addr {i}", {"overall_risk_score": i})
+
+    deadline = time.monotonic() + 5
+    while writer.written < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.close()
+
+    assert writer.stats()["written"] == 3
+    assert writer.flushes == 1
+    with factory() as db:
+        rows = db.query(Analysis).order_by(Analysis.id).all()
+        assert [r.result.address for r in rows] == ["addr 0", "addr 1", "addr 2"]
+        assert rows[0].user_id == "u1" and rows[0].created_at is not None
+        # Typed columns are filled from the result on insert
+        assert rows[2].result.overall_risk_score == 2 and rows[2].result.risk_scores == {"overall_risk_score": 2}
+
+
+def test_buffer_is_bounded_and_flushed_on_close(tmp_path):
+    """Rows beyond max_pending are dropped and counted; close() writes the rest."""
+    factory = _session_factory(tmp_path)
+    writer = AnalysisWriter(session_factory=factory, flush_interval=60, batch_size=100, max_pending=2)
+    results = [writer.submit(None, f"addr {i}", {"n": i}) for i in range(3)]
+    assert results == [True, True, False]
+    assert writer.stats()["pending"] == 2
+
+    writer.close()
+    stats = writer.stats()
+    assert (stats["pending"], stats["written"], stats["dropped"]) == (0, 2, 1)
+    with factory() as db:
+        assert db.query(Analysis).count() == 2
+
+
+def test_identical_results_are_stored_once(tmp_path):
+    """Repeated results share one analysis_results row; each analysis keeps its own row."""
+    factory = _session_factory(tmp_path)
+    writer = AnalysisWriter(session_factory=factory, flush_interval=60)
+    result = {"address": "Kadıköy", "overall_risk_score": 40.0, "risk_level": "medium"}
+    writer.submit("u1", "Kadıköy", dict(result))
+    writer.submit("u2", "Kadıköy", dict(result))
+    writer.flush()
+    # A later batch sees the stored hash (and a fresh writer would find it in the table)
+    writer.submit("u3", "Kadıköy", dict(reversed(list(result.items()))))
+    AnalysisWriter(session_factory=factory, enabled=False).submit(None, "Kadıköy", dict(result))
+    writer.close()
+
+    with factory() as db:
+        assert db.query(AnalysisResult).count() == 1
+        analyses = db.query(Analysis).all()
+    assert len(analyses) == 4
+    assert {a.result_hash for a in analyses} == {AnalysisResult.hash_result(result)}
+    assert writer.deduplicated == 2
+
+
+def test_failed_writes_are_counted(tmp_path):
+    factory = _session_factory(tmp_path, create_tables=False)
+    writer = AnalysisWriter(session_factory=factory, flush_interval=60)
+    writer.submit(None, "addr", {})
+    writer.submit(None, "addr", {})
+    writer.close()
+
+    assert writer.stats()["failed"] == 2
+    assert writer.written == 0
+    assert "analysis_writes_failed_total 2" in writer.openmetrics_lines()
+
+
+def test_synchronous_mode_writes_inline(tmp_path):
+    factory = _session_factory(tmp_path)
+    writer = AnalysisWriter(session_factory=factory, enabled=False)
+    assert writer.submit(None, "addr", {"overall_risk_score": 1})
+    assert writer.written == 1 and writer._thread is None
+
+
+def test_submit_is_traced_as_db_persist(tmp_path):
+    """Persistence stays visible in Server-Timing although the INSERT is written behind."""
+    writer = AnalysisWriter(session_factory=_session_factory(tmp_path), flush_interval=60)
+    app = FastAPI()
+
+    @app.post("/analyze")
+    def analyze():
+        return {"queued": writer.submit(None, "addr", {"n": 1})}
+
+    app.add_middleware(TracingMiddleware, sample_rate=1.0, exporter=SpanExporter())
+    resp = TestClient(app).post("/analyze")
+    assert resp.json() == {"queued": True}
+    assert "db.persist;dur=" in resp.headers["server-timing"]
+    writer.close()
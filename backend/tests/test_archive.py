@@ -0,0 +1,88 @@
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import Base
+from app.models.analysis import Analysis, AnalysisResult
+
+pytest.importorskip("pyarrow")
+
+from app.db import archive  # noqa: E402
+from app.db.archive import archive_analyses, archived_risk_statistics, read_archived_analyses  # noqa: E402
+
+
+def _seed(engine):
+    Base.metadata.create_all(bind=engine, tables=[AnalysisResult.__table__, Analysis.__table__])
+    results = {
+        "old": {"address": "Kadıköy, İstanbul", "overall_risk_score": 80.0, "earthquake_risk": 90.0, "risk_level": "critical"},
+        "shared": {"address": "Çankaya, Ankara", "overall_risk_score": 30.0, "earthquake_risk": 40.0, "risk_level": "medium"},
+    }
+    with sessionmaker(bind=engine)() as db:
+        for key, result in results.items():
+            db.add(AnalysisResult(result_hash=key, address=result["address"], risk_scores=result,
+                                  created_at=datetime(2025, 1, 1), **AnalysisResult.typed_values(result)))
+        db.add_all([
+            Analysis(user_id="u1", result_hash="old", created_at=datetime(2025, 1, 10)),
+            Analysis(user_id="u2", result_hash="old", created_at=datetime(2025, 1, 20)),
+            Analysis(user_id="u3", result_hash="shared", created_at=datetime(2025, 2, 3)),
+            Analysis(user_id="u4", result_hash="shared", created_at=datetime(2025, 6, 1)),
+        ])
+        db.commit()
+
+
+def test_archive_moves_old_rows_to_monthly_parquet(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    _seed(engine)
+    archive_dir = str(tmp_path / "archive")
+
+    summary = archive_analyses(engine, archive_dir, older_than=datetime(2025, 3, 1), fetch_size=1, delete_batch_size=1)
+
+    assert summary == {"2025-01": 2, "2025-02": 1}
+    assert os.listdir(os.path.join(archive_dir, "analyses", "month=2025-01")) == ["part-1-2.parquet"]
+    with sessionmaker(bind=engine)() as db:
+        assert [a.user_id for a in db.query(Analysis).all()] == ["u4"]
+        # "old" is no longer referenced and is compacted; "shared" is still used by u4
+        assert [r.result_hash for r in db.query(AnalysisResult).all()] == ["shared"]
+
+    table = read_archived_analyses(archive_dir)
+    assert sorted(table.column("user_id").to_pylist()) == ["u1", "u2", "u3"]
+    february = read_archived_analyses(archive_dir, start=datetime(2025, 2, 1), end=datetime(2025, 3, 1))
+    assert february.column("address").to_pylist() == ["Çankaya, Ankara"]
+
+
+def test_archived_statistics(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    _seed(engine)
+    archive_dir = str(tmp_path / "archive")
+    archive_analyses(engine, archive_dir, older_than=datetime(2025, 3, 1))
+
+    stats = archived_risk_statistics(archive_dir, region="kadıköy")
+    assert stats["total_analyzed_addresses"] == 2
+    assert stats["average_earthquake_risk"] == 90.0
+    assert stats["critical_risk_percentage"] == 100.0
+    assert archived_risk_statistics(str(tmp_path / "missing"))["total_analyzed_addresses"] == 0
+
+
+def test_rerun_after_interrupted_delete_does_not_duplicate(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    _seed(engine)
+    archive_dir = str(tmp_path / "archive")
+    delete_archived = archive._delete_archived
+
+    def interrupted(engine, start, end, batch_size):
+        # Only u1 (January 10) is deleted before the run dies
+        delete_archived(engine, start, datetime(2025, 1, 15), batch_size)
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(archive, "_delete_archived", interrupted)
+    with pytest.raises(RuntimeError):
+        archive_analyses(engine, archive_dir, older_than=datetime(2025, 3, 1))
+    monkeypatch.setattr(archive, "_delete_archived", delete_archived)
+
+    assert archive_analyses(engine, archive_dir, older_than=datetime(2025, 3, 1)) == {"2025-01": 0, "2025-02": 0}
+    assert sorted(read_archived_analyses(archive_dir).column("user_id").to_pylist()) == ["u1", "u2", "u3"]
+    with sessionmaker(bind=engine)() as db:
+        assert [a.user_id for a in db.query(Analysis).all()] == ["u4"]
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db import session as db_session
+from app.db.session import Base, LazySession, PoolStats, async_database_url, fetch_all
+from app.models.analysis import Analysis, AnalysisResult
+
+
+def test_async_database_url():
+    assert async_database_url("postgresql://u:p@db:5432/app") == "postgresql+asyncpg://u:p@db:5432/app"
+    assert async_database_url("postgres://u@db/app") == "postgresql+asyncpg://u@db/app"
+    assert async_database_url("sqlite:///./risko.db") == "sqlite+aiosqlite:///./risko.db"
+
+
+def test_get_db_does_not_open_unused_sessions(monkeypatch):
+    opened = []
+    monkeypatch.setattr(db_session, "SessionLocal", lambda: opened.append(1))
+    gen = db_session.get_db()
+    db = next(gen)
+    gen.close()
+    assert not db.opened and opened == []
+
+
+def test_pool_stats_track_checked_out_connections(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    stats = PoolStats("test", engine)
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+        assert stats.checked_out() == 1
+    assert stats.checked_out() == 0
+    assert stats.checkouts == 1 and stats.max_checked_out == 1
+
+
+def _seed(url):
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine, tables=[AnalysisResult.__table__, Analysis.__table__])
+    with sessionmaker(bind=engine)() as db:
+        db.add_all([AnalysisResult(result_hash=h, address=h, risk_scores={}) for h in ("a", "b")])
+        db.add_all([Analysis(user_id="u1", result_hash="a"), Analysis(user_id="u2", result_hash="b")])
+        db.commit()
+
+
+def test_fetch_all_with_lazy_sync_session(tmp_path):
+    url = f"sqlite:///{tmp_path / 'sync.db'}"
+    _seed(url)
+    db = LazySession(sessionmaker(bind=create_engine(url)))
+    rows = asyncio.run(fetch_all(db, select(Analysis).where(Analysis.user_id == "u1")))
+    assert [r.result.address for r in rows] == ["a"]
+    db.close()
+
+
+def test_fetch_all_with_async_session(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    _seed(url)
+
+    async def run():
+        engine = create_async_engine(async_database_url(url))
+        db = LazySession(async_sessionmaker(engine, expire_on_commit=False), is_async=True)
+        rows = await fetch_all(db, select(Analysis).order_by(Analysis.user_id))
+        await db.close()
+        await engine.dispose()
+        return rows
+
+    # The result is eager-loaded, so it is usable without lazy loads on the async session
+    assert [r.result.address for r in asyncio.run(run())] == ["a", "b"]
@@ -0,0 +1,163 @@
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import Base
+from app.models.outbox import EmailOutbox
+from app.services.email_outbox import EmailOutboxSender, SMTPConnection
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP dialogue: enough for smtplib.send_message without TLS or auth."""
+
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self._reply("220 localhost ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode().strip().split(" ")[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250 localhost")
+            elif verb == "MAIL":
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                code = server.rcpt_replies.pop(0) if server.rcpt_replies else "250 OK"
+                self._reply(code)
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                server.messages += 1
+                self._reply("250 OK queued")
+                if server.drop_after_message:
+                    server.drop_after_message = False
+                    return
+            elif verb in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.connections = 0
+        self.messages = 0
+        self.rcpt_replies = []
+        self.drop_after_message = False
+
+
+@pytest.fixture
+def smtp_server():
+    server = _SMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}")
+    Base.metadata.create_all(bind=engine, tables=[EmailOutbox.__table__])
+    return sessionmaker(bind=engine)
+
+
+def _sender(session_factory, server, **kwargs):
+    smtp = SMTPConnection("127.0.0.1", server.server_address[1], use_tls=False)
+    return EmailOutboxSender(session_factory, smtp, retry_base=30, retry_max=300, **kwargs)
+
+
+def _queue(session_factory, count):
+    with session_factory() as db:
+        db.add_all([EmailOutbox(to_email=f"user{i}@example.com", subject="Konu", body="Merhaba") for i in range(count)])
+        db.commit()
+
+
+def _rows(session_factory):
+    with session_factory() as db:
+        return db.query(EmailOutbox).order_by(EmailOutbox.id).all()
+
+
+def test_batches_share_one_connection(session_factory, smtp_server):
+    _queue(session_factory, 5)
+    sender = _sender(session_factory, smtp_server, batch_size=3)
+    assert sender.run_once() == 3
+    assert sender.run_once() == 2
+    assert sender.run_once() == 0
+    assert smtp_server.messages == 5
+    assert smtp_server.connections == 1
+    assert all(row.status == "sent" and row.sent_at and row.body == "" for row in _rows(session_factory))
+    sender.close()
+
+
+def test_transient_failure_is_retried_with_backoff(session_factory, smtp_server):
+    _queue(session_factory, 1)
+    smtp_server.rcpt_replies = ["451 Try again later"]
+    sender = _sender(session_factory, smtp_server)
+    before = datetime.utcnow()
+    sender.run_once()
+    row = _rows(session_factory)[0]
+    assert row.status == "pending" and row.attempts == 1 and "451" in row.last_error
+    assert row.next_attempt_at >= before + timedelta(seconds=29)
+    # Not due yet
+    assert sender.run_once() == 0
+    assert sender.backoff(2) == 60 and sender.backoff(10) == 300
+
+    with session_factory() as db:
+        db.query(EmailOutbox).update({"next_attempt_at": datetime.utcnow()})
+        db.commit()
+    sender.run_once()
+    row = _rows(session_factory)[0]
+    assert row.status == "sent" and row.attempts == 2
+    assert sender.stats()["retried"] == 1 and sender.stats()["sent"] == 1
+    sender.close()
+
+
+def test_permanent_failure_and_attempt_limit(session_factory, smtp_server):
+    _queue(session_factory, 2)
+    smtp_server.rcpt_replies = ["550 No such user", "451 Try again later"]
+    sender = _sender(session_factory, smtp_server, max_attempts=1)
+    sender.run_once()
+    first, second = _rows(session_factory)
+    assert first.status == "failed" and "550" in first.last_error and first.body == ""
+    assert second.status == "failed" and second.attempts == 1
+    assert smtp_server.messages == 0
+    sender.close()
+
+
+def test_reconnects_after_server_drops_connection(session_factory, smtp_server):
+    _queue(session_factory, 2)
+    smtp_server.drop_after_message = True
+    sender = _sender(session_factory, smtp_server)
+    sender.run_once()
+    assert [row.status for row in _rows(session_factory)] == ["sent", "sent"]
+    assert smtp_server.connections == 2
+    sender.close()
+
+
+def test_unreachable_server_leaves_batch_pending(session_factory):
+    _queue(session_factory, 3)
+    smtp = SMTPConnection("127.0.0.1", 1, use_tls=False, timeout=1)
+    sender = EmailOutboxSender(session_factory, smtp)
+    assert sender.run_once() == 1
+    rows = _rows(session_factory)
+    assert [row.attempts for row in rows] == [1, 0, 0]
+    assert all(row.status == "pending" for row in rows)
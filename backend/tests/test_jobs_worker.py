@@ -0,0 +1,260 @@
+import importlib.util
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+JOBS_SQL = ROOT / "backend" / "sql" / "create_jobs_tables.sql"
+
+
+def _load_worker():
+    spec = importlib.util.spec_from_file_location("jobs_worker", ROOT / "cloud-run-worker" / "worker.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+worker = _load_worker()
+
+
+@pytest.fixture
+def rpc(monkeypatch):
+    """Records RPC calls; ``rpc.responses[function]`` is returned (or called with the params)."""
+    calls = []
+    responses = {}
+
+    def fake_rpc(function, params, timeout=10):
+        calls.append((function, params))
+        response = responses.get(function)
+        return response(params) if callable(response) else response
+
+    fake_rpc.calls = calls
+    fake_rpc.responses = responses
+    monkeypatch.setattr(worker, "rpc", fake_rpc)
+    monkeypatch.setattr(worker, "leases", worker.LeaseKeeper())
+    monkeypatch.setattr(worker, "session", MagicMock())
+    return fake_rpc
+
+
+def _calls(rpc, function):
+    return [params for name, params in rpc.calls if name == function]
+
+
+def test_job_items_accepts_every_payload_shape():
+    assert worker.job_items({"addresses": ["Kadıköy", {"address": "Çankaya", "building_age": "30"}]}) == [
+        ("Kadıköy", None), ("Çankaya", 30)]
+    assert worker.job_items({"address": "Bornova", "building_age": ""}) == [("Bornova", None)]
+    assert worker.job_items(["Konak", {"address": "Nilüfer", "building_age": 5}]) == [("Konak", None), ("Nilüfer", 5)]
+    assert worker.job_items({"addresses": None}) == []
+    with pytest.raises(ValueError):
+        worker.job_items({"city": "İzmir"})
+
+
+def test_lease_jobs_holds_leased_jobs_and_heartbeat_reports_lost_ones(rpc, caplog):
+    rpc.responses["lease_jobs"] = [{"id": "a"}, {"id": "b"}]
+    rpc.responses["heartbeat_jobs"] = [{"heartbeat_jobs": "a"}]
+
+    assert [job["id"] for job in worker.lease_jobs(2)] == ["a", "b"]
+    assert _calls(rpc, "lease_jobs")[0]["p_limit"] == 2
+    with caplog.at_level(logging.WARNING, logger="cloud-run-worker"):
+        worker.leases.heartbeat()
+    assert sorted(_calls(rpc, "heartbeat_jobs")[0]["p_job_ids"]) == ["a", "b"]
+    assert "Lost lease on job(s) b" in caplog.text
+
+    worker.leases.release("a")
+    worker.leases.release("b")
+    worker.leases.heartbeat()
+    assert len(_calls(rpc, "heartbeat_jobs")) == 1  # nothing held, no call
+
+
+def test_lease_failure_returns_no_jobs(rpc):
+    def fail(params):
+        raise RuntimeError("PostgREST down")
+
+    rpc.responses["lease_jobs"] = fail
+    assert worker.lease_jobs() == []
+
+
+def test_reap_returns_the_number_of_requeued_jobs(rpc):
+    rpc.responses["reap_expired_jobs"] = 3
+    assert worker.leases.reap() == 3
+    assert _calls(rpc, "reap_expired_jobs") == [
+        {"p_max_attempts": worker.MAX_ATTEMPTS, "p_backoff_seconds": worker.RETRY_BACKOFF_SECONDS}]
+    rpc.responses["reap_expired_jobs"] = None
+    assert worker.leases.reap() == 0
+
+
+@pytest.mark.parametrize("status,level,message", [
+    ("pending", logging.WARNING, "will be retried"),
+    ("failed", logging.ERROR, "failed after 5 attempt(s)"),
+    (None, logging.WARNING, "lease was already lost"),
+])
+def test_retry_or_fail_job_reports_the_new_status(rpc, caplog, status, level, message):
+    rpc.responses["retry_or_fail_job"] = status
+    with caplog.at_level(logging.WARNING, logger="cloud-run-worker"):
+        worker.retry_or_fail_job({"id": "a", "attempts": 5}, RuntimeError("boom"))
+    params = _calls(rpc, "retry_or_fail_job")[0]
+    assert params["p_job_id"] == "a" and params["p_worker_id"] == worker.WORKER_ID and params["p_error"] == "boom"
+    record = next(r for r in caplog.records if message in r.getMessage())
+    assert record.levelno == level
+
+
+def test_finish_jobs_completes_stored_results_and_retries_the_rest(rpc):
+    worker.session.post.return_value.json.return_value = [{"job_id": "ok", "id": "result-ok"}]
+    rpc.responses["complete_jobs"] = ["ok"]
+    jobs = [{"id": "ok", "payload": {}}, {"id": "unstored", "payload": {}}, {"id": "broken", "payload": {}}]
+    worker.leases.hold(jobs)
+    result = {"results": [], "count": 0, "errors": 0, "fallbacks": 0}
+
+    worker.finish_jobs([(jobs[0], result, None), (jobs[1], result, None), (jobs[2], None, RuntimeError("boom"))])
+
+    rows = json.loads(worker.session.post.call_args.kwargs["data"])
+    assert [row["job_id"] for row in rows] == ["ok", "unstored"]
+    retried = {params["p_job_id"]: params["p_error"] for params in _calls(rpc, "retry_or_fail_job")}
+    assert retried == {"broken": "boom", "unstored": "result could not be stored"}
+    assert _calls(rpc, "complete_jobs") == [
+        {"p_worker_id": worker.WORKER_ID, "p_results": [{"id": "ok", "result_id": "result-ok"}]}]
+    assert not worker.leases._held
+
+
+def test_finish_jobs_never_completes_without_a_result_row(rpc):
+    worker.session.post.side_effect = RuntimeError("insert failed")
+    job = {"id": "a", "payload": {}}
+
+    worker.finish_jobs([(job, {"results": [], "count": 0, "errors": 0}, None)])
+
+    assert [params["p_job_id"] for params in _calls(rpc, "retry_or_fail_job")] == ["a"]
+    assert _calls(rpc, "complete_jobs") == []
+
+
+def test_results_with_errors_or_fallbacks_are_not_reusable(rpc):
+    worker.session.post.return_value.json.return_value = []
+    finished = [({"id": job_id}, {"errors": errors, "fallbacks": fallbacks})
+                for job_id, errors, fallbacks in (("clean", 0, 0), ("error", 1, 0), ("fallback", 0, 1))]
+
+    worker.write_cached_results(finished)
+
+    now = datetime.now(timezone.utc)
+    expires = {row["job_id"]: datetime.strptime(row["expires_at"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+               for row in json.loads(worker.session.post.call_args.kwargs["data"])}
+    assert (expires["clean"] - now).total_seconds() > worker.RESULT_TTL_SECONDS - 60
+    assert abs((expires["error"] - now).total_seconds()) < 60
+    assert abs((expires["fallback"] - now).total_seconds()) < 60
+
+
+def test_result_writer_batches_finished_jobs(monkeypatch):
+    batches = []
+    written = []
+    monkeypatch.setattr(worker, "finish_jobs", lambda batch: batches.append([job["id"] for job, _, _ in batch]))
+    writer = worker.ResultWriter(written.append, max_batch=2, max_delay=0.2)
+    for job_id in ("a", "b", "c"):
+        writer.put({"id": job_id}, {"count": 0})
+    writer.start()
+
+    deadline = time.monotonic() + 5
+    while sum(written) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert batches == [["a", "b"], ["c"]] and written == [2, 1]
+
+
+# --- SQL functions (need a PostgreSQL server: set JOBS_TEST_DATABASE_URL) ---
+
+@pytest.fixture
+def jobs_db():
+    dsn = os.environ.get("JOBS_TEST_DATABASE_URL")
+    if not dsn:
+        pytest.skip("JOBS_TEST_DATABASE_URL not set")
+    psycopg2 = pytest.importorskip("psycopg2")
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    schema = f"jobs_test_{uuid.uuid4().hex[:8]}"
+    with conn.cursor() as cur:
+        # Roles Supabase provides, referenced by the script's grants
+        cur.execute("""
+            DO $$
+            DECLARE r text;
+            BEGIN
+              FOREACH r IN ARRAY ARRAY['anon', 'authenticated', 'service_role'] LOOP
+                IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = r) THEN
+                  EXECUTE format('CREATE ROLE %I NOLOGIN', r);
+                END IF;
+              END LOOP;
+            END;
+            $$;
+        """)
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pgcrypto WITH SCHEMA public")
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"SET search_path TO {schema}, public")
+        cur.execute(JOBS_SQL.read_text())
+    try:
+        yield conn
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.close()
+
+
+def _one(conn, sql, *params):
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchone()
+
+
+def _all(conn, sql, *params):
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def _job(conn, job_id):
+    return _one(conn, "SELECT status, worker_id, attempts, error, run_after > now(), lease_expires_at IS NULL "
+                      "FROM jobs WHERE id = %s", job_id)
+
+
+def test_lease_retry_and_fail_transitions(jobs_db):
+    first = _one(jobs_db, "INSERT INTO jobs (payload) VALUES ('{\"address\": \"a\"}') RETURNING id")[0]
+    second = _one(jobs_db, "INSERT INTO jobs (payload) VALUES ('{\"address\": \"b\"}') RETURNING id")[0]
+
+    assert [row[0] for row in _all(jobs_db, "SELECT id FROM lease_jobs('w1', 1, 300)")] == [first]
+    assert [row[0] for row in _all(jobs_db, "SELECT id FROM lease_jobs('w2', 5, 300)")] == [second]
+    assert _all(jobs_db, "SELECT id FROM lease_jobs('w3', 5, 300)") == []
+    assert _job(jobs_db, first)[:3] == ("running", "w1", 1)
+
+    # Only the lease holder can end the attempt; a retry waits out its backoff
+    assert _one(jobs_db, "SELECT retry_or_fail_job(%s, 'w2', 'boom', 2, 30)", first)[0] is None
+    assert _one(jobs_db, "SELECT retry_or_fail_job(%s, 'w1', 'boom', 2, 30)", first)[0] == "pending"
+    assert _job(jobs_db, first) == ("pending", None, 1, "boom", True, True)
+    assert _all(jobs_db, "SELECT id FROM lease_jobs('w1', 5, 300)") == []
+
+    _one(jobs_db, "UPDATE jobs SET run_after = now() - interval '1 second' WHERE id = %s RETURNING id", first)
+    assert [row[0] for row in _all(jobs_db, "SELECT id FROM lease_jobs('w1', 5, 300)")] == [first]
+    assert _one(jobs_db, "SELECT retry_or_fail_job(%s, 'w1', 'boom again', 2, 30)", first)[0] == "failed"
+    assert _job(jobs_db, first)[:4] == ("failed", None, 2, "boom again")
+
+
+def test_heartbeat_reap_and_complete(jobs_db):
+    job_id = _one(jobs_db, "INSERT INTO jobs (payload) VALUES ('{\"address\": \"a\"}') RETURNING id")[0]
+    other = _one(jobs_db, "INSERT INTO jobs (payload) VALUES ('{\"address\": \"b\"}') RETURNING id")[0]
+    _all(jobs_db, "SELECT id FROM lease_jobs('w1', 5, 300)")
+
+    assert {row[0] for row in _all(jobs_db, "SELECT heartbeat_jobs('w1', ARRAY[%s, %s]::uuid[], 300)",
+                                   job_id, other)} == {job_id, other}
+    assert _all(jobs_db, "SELECT heartbeat_jobs('w2', ARRAY[%s]::uuid[], 300)", job_id) == []
+
+    # A stalled lease is handed back with backoff
+    _one(jobs_db, "UPDATE jobs SET lease_expires_at = now() - interval '1 second' WHERE id = %s RETURNING id", job_id)
+    assert _one(jobs_db, "SELECT reap_expired_jobs(5, 30)")[0] == 1
+    assert _job(jobs_db, job_id) == ("pending", None, 1, "lease expired", True, True)
+
+    # Completion only applies to the worker's own running jobs
+    results = json.dumps([{"id": str(job_id), "result_id": None}, {"id": str(other), "result_id": None}])
+    assert [str(row[0]) for row in _all(jobs_db, "SELECT complete_jobs('w1', %s::jsonb)", results)] == [str(other)]
+    assert _all(jobs_db, "SELECT complete_jobs('w2', %s::jsonb)", results) == []
+    assert _job(jobs_db, other)[:2] == ("done", "w1")
@@ -0,0 +1,84 @@
+import json
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from app.core.metrics import MetricsMiddleware, RequestMetrics, histogram_quantile
+
+
+def _client(metrics):
+    app = FastAPI()
+
+    @app.get("/ok")
+    def ok():
+        return {"status": "ok"}
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        if item_id > 10:
+            raise HTTPException(status_code=404)
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware, metrics=metrics, access_log=False)
+    return TestClient(app)
+
+
+def test_middleware_records_by_route_template():
+    """Distinct URLs of one route share a single series."""
+    metrics = RequestMetrics()
+    client = _client(metrics)
+    resp = client.get("/ok")
+    assert resp.headers["x-response-time"].endswith("s")
+    for i in (1, 2, 99):
+        client.get(f"/items/{i}")
+    client.get("/nope")
+
+    data = metrics.get_metrics()
+    assert data["total_requests"] == 5
+    assert data["total_errors"] == 2
+    assert data["endpoints"]["GET /items/{item_id}"]["request_count"] == 3
+    assert data["endpoints"]["GET /items/{item_id}"]["error_count"] == 1
+    assert "GET unmatched" in data["endpoints"]
+    assert "p99_response_time" in data["endpoints"]["GET /ok"]
+
+
+def test_series_count_is_bounded():
+    """Routes beyond the cap are folded into an overflow series."""
+    metrics = RequestMetrics(max_series=2)
+    for i in range(5):
+        metrics.record("GET", f"/r{i}", 0.01, 200)
+    assert len(metrics.series) == 3
+    assert metrics.series[("GET", "other")]["count"] == 3
+
+
+def test_histogram_quantile_interpolates_within_bucket():
+    """Quantiles are interpolated inside the bucket holding the rank."""
+    buckets = (0.1, 0.2, 0.4)
+    counts = [0, 10, 0, 0]
+    assert abs(histogram_quantile(0.5, buckets, counts) - 0.15) < 1e-9
+    assert histogram_quantile(0.99, buckets, [0, 0, 0, 5]) == 0.4
+
+
+def test_multiprocess_snapshots_are_merged(tmp_path):
+    """Snapshots written by several workers are summed."""
+    other_worker = RequestMetrics()
+    other_worker.record("GET", "/health", 0.002, 200)
+    for pid in (101, 102):
+        (tmp_path / f"metrics_{pid}.json").write_text(json.dumps(other_worker.snapshot()))
+
+    this_worker = RequestMetrics(multiproc_dir=str(tmp_path))
+    this_worker.record("GET", "/health", 0.2, 500)
+    data = this_worker.get_metrics()
+    assert data["endpoints"]["GET /health"]["request_count"] == 3
+    assert data["endpoints"]["GET /health"]["error_count"] == 1
+    assert data["endpoints"]["GET /health"]["max_response_time"] == 0.2
+
+
+def test_openmetrics_exposition():
+    """Histogram buckets are cumulative and the output ends with EOF."""
+    metrics = RequestMetrics(buckets=(0.1, 1.0))
+    metrics.record("GET", "/health", 0.05, 200)
+    metrics.record("GET", "/health", 0.5, 200)
+    text = metrics.openmetrics()
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/health",le="0.1"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/health",le="+Inf"} 2' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/health"} 2' in text
+    assert text.endswith("# EOF\n")
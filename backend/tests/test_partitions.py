@@ -0,0 +1,75 @@
+from datetime import date, datetime
+
+from app.db.partitions import add_months, create_partition_sql, move_default_rows_sql, partition_bounds, partition_name
+from app.models.analysis import AnalysisResult
+
+
+def test_monthly_partition_naming_and_bounds():
+    assert partition_name(date(2026, 3, 1)) == "analyses_y2026m03"
+    assert partition_bounds(datetime(2026, 12, 17, 10, 0)) == (date(2026, 12, 1), date(2027, 1, 1))
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+
+def test_create_partition_sql():
+    sql = create_partition_sql(date(2026, 10, 5))
+    assert sql == (
+        "CREATE TABLE IF NOT EXISTS analyses_y2026m10 PARTITION OF analyses "
+        "FOR VALUES FROM ('2026-10-01') TO ('2026-11-01')"
+    )
+
+
+def test_missed_month_moves_rows_out_of_default_partition():
+    statements = move_default_rows_sql(date(2026, 10, 1))
+    assert statements[0] == "ALTER TABLE analyses DETACH PARTITION analyses_default"
+    assert statements[1] == create_partition_sql(date(2026, 10, 1))
+    assert "DELETE FROM analyses_default WHERE created_at >= '2026-10-01' AND created_at < '2026-11-01'" in statements[2]
+    assert statements[2].endswith("INSERT INTO analyses_y2026m10 SELECT * FROM moved")
+    assert statements[3] == "ALTER TABLE analyses ATTACH PARTITION analyses_default DEFAULT"
+
+
+def test_typed_values_from_result():
+    result = {
+        "address": "Kadıköy", "latitude": 40.99, "longitude": 29.03,
+        "earthquake_risk": 80.0, "flood_risk": 20.0, "fire_risk": 30.0, "landslide_risk": 10.0,
+        "overall_risk_score": 52.5, "risk_level": "high", "building_age": 30,
+    }
+    values = AnalysisResult.typed_values(result)
+    assert values["overall_risk_score"] == 52.5 and values["risk_level"] == "high"
+    assert "building_age" not in values and "address" not in values
+
+
+def test_partition_maintainer_runs_at_start_on_its_own_thread(monkeypatch):
+    """Partition upkeep runs as soon as it starts and keeps counting failures separately."""
+    import threading
+    from contextlib import contextmanager
+    from unittest.mock import MagicMock
+    from app.services import partition_maintainer
+
+    ran = threading.Event()
+    calls = []
+
+    def fake_ensure(conn):
+        calls.append(conn)
+        ran.set()
+        return ["analyses_y2026m10"]
+
+    @contextmanager
+    def session_factory():
+        yield MagicMock()
+
+    monkeypatch.setattr(partition_maintainer, "ensure_analysis_partitions", fake_ensure)
+    maintainer = partition_maintainer.PartitionMaintainer(session_factory, interval=3600)
+    maintainer.start()
+    try:
+        assert ran.wait(5)
+    finally:
+        maintainer.close()
+    assert len(calls) == 1 and maintainer.stats() == {"enabled": True, "runs": 1, "failures": 0}
+
+    monkeypatch.setattr(partition_maintainer, "ensure_analysis_partitions", MagicMock(side_effect=RuntimeError("db down")))
+    assert maintainer.run_once() == [] and maintainer.failures == 1
+
+    disabled = partition_maintainer.PartitionMaintainer(session_factory, enabled=False)
+    disabled.start()
+    assert disabled._thread is None
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+import pytest
+from passlib.context import CryptContext
+
+from app.services.password_hasher import HasherBusy, PasswordHasher
+
+
+def _context(rounds):
+    # sha256_crypt is cheap and pure Python; bcrypt behaves the same way through CryptContext
+    return lambda: CryptContext(schemes=["sha256_crypt"], sha256_crypt__rounds=rounds)
+
+
+@pytest.mark.asyncio
+async def test_hash_verify_and_rehash_on_cost_change():
+    old = PasswordHasher(workers=1, context_factory=_context(1000))
+    stored = await old.hash("s3cret")
+    assert await old.verify("s3cret", stored)
+    assert await old.verify_and_update("s3cret", stored) == (True, None)
+
+    new = PasswordHasher(workers=1, context_factory=_context(2000))
+    valid, upgraded = await new.verify_and_update("s3cret", stored)
+    assert valid and upgraded and "rounds=2000" in upgraded
+    assert await new.verify_and_update("wrong", stored) == (False, None)
+    assert new.stats()["rehashed"] == 1
+    old.shutdown()
+    new.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_queue_is_bounded():
+    """With every worker busy and the queue full, further hashes are rejected at once."""
+    release = threading.Event()
+
+    class SlowContext:
+        def hash(self, password):
+            release.wait(5)
+            return f"h:{password}"
+
+    hasher = PasswordHasher(workers=1, max_queue=1, context_factory=SlowContext)
+    running = [asyncio.ensure_future(hasher.hash(str(i))) for i in range(2)]
+    await asyncio.sleep(0.05)
+    assert hasher.stats()["active"] == 1 and hasher.stats()["queued"] == 1
+
+    with pytest.raises(HasherBusy):
+        await hasher.hash("rejected")
+    release.set()
+    assert await asyncio.gather(*running) == ["h:0", "h:1"]
+    stats = hasher.stats()
+    assert (stats["completed"], stats["rejected"], stats["queued"]) == (2, 1, 0)
+    assert any(line.startswith("password_hash_rejected_total 1") for line in hasher.openmetrics_lines())
+    hasher.shutdown()
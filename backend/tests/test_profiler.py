@@ -0,0 +1,29 @@
+import threading
+import time
+from app.core.profiler import StackSampler
+
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_sampler_collects_collapsed_stacks():
+    """Stacks of other threads are counted in collapsed format."""
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,))
+    worker.start()
+    try:
+        sampler = StackSampler(interval=0.005)
+        sampler.run(0.2)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert sampler.sample_count > 5
+    text = sampler.collapsed()
+    assert "_busy_loop@test_profiler.py" in text
+    for line in text.strip().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+        assert "StackSampler" not in stack and "sample_once" not in stack
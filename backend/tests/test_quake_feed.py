@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from app.services.quake_feed import EarthquakeFeed, normalize_afad_event
+
+
+def _event(i):
+    return {"id": str(i), "source": "afad", "magnitude": 3.0, "time": f"2025-01-01T00:00:{i:02d}"}
+
+
+@pytest.mark.asyncio
+async def test_publish_fans_out_new_events_once():
+    """Each new event reaches every subscriber exactly once."""
+    feed = EarthquakeFeed(client_buffer_size=10)
+    a = feed.subscribe()
+    b = feed.subscribe()
+
+    assert feed.publish([_event(1), _event(2)]) == 2
+    assert feed.publish([_event(2), _event(3)]) == 1
+
+    for sub in (a, b):
+        ids = [sub.queue.get_nowait()["id"] for _ in range(sub.queue.qsize())]
+        assert ids == ["1", "2", "3"]
+
+    feed.unsubscribe(a)
+    feed.unsubscribe(b)
+    assert feed._task is None
+
+
+@pytest.mark.asyncio
+async def test_slow_client_is_dropped():
+    """A subscriber whose buffer is full is closed instead of growing."""
+    feed = EarthquakeFeed(client_buffer_size=2)
+    slow = feed.subscribe()
+    fast = feed.subscribe()
+
+    feed.publish([_event(1), _event(2)])
+    fast.queue.get_nowait()
+    fast.queue.get_nowait()
+    feed.publish([_event(3)])
+
+    assert slow.dropped
+    assert slow not in feed.subscribers
+    assert slow.queue.get_nowait() is None
+    assert fast in feed.subscribers
+    assert feed.dropped_clients == 1
+    feed.unsubscribe(fast)
+
+
+@pytest.mark.asyncio
+async def test_new_subscriber_receives_recent_history():
+    """Late subscribers get the recent events replayed."""
+    feed = EarthquakeFeed(client_buffer_size=5)
+    first = feed.subscribe()
+    feed.publish([_event(1), _event(2)])
+    late = feed.subscribe()
+    assert late.queue.qsize() == 2
+    feed.unsubscribe(first)
+    feed.unsubscribe(late)
+
+
+@pytest.mark.asyncio
+async def test_first_poll_seeds_history_without_flooding_clients():
+    """The upstream backlog on startup is not published, so connected clients are not dropped."""
+    feed = EarthquakeFeed(poll_interval=0.01, client_buffer_size=10, history_size=5)
+    backlog = [_event(i) for i in range(30)]
+    polls = []
+
+    async def fetch_events(client):
+        polls.append(1)
+        return list(backlog) + ([_event(30)] if len(polls) > 1 else [])
+
+    feed.fetch_events = fetch_events
+    sub = feed.subscribe()
+    while len(polls) < 3:
+        await asyncio.sleep(0.01)
+
+    assert sub in feed.subscribers and feed.dropped_clients == 0
+    assert [sub.queue.get_nowait()["id"] for _ in range(sub.queue.qsize())] == ["30"]
+    assert [e["id"] for e in feed.history] == ["26", "27", "28", "29", "30"]
+    late = feed.subscribe()
+    assert late.queue.qsize() == 5
+    feed.unsubscribe(sub)
+    feed.unsubscribe(late)
+
+
+@pytest.mark.asyncio
+async def test_source_recovering_after_startup_is_seeded_not_flooded():
+    """A source that was down on the first poll seeds its backlog when it comes back."""
+    feed = EarthquakeFeed(client_buffer_size=10, history_size=5)
+    sub = feed.subscribe()
+    seeded = set()
+    kandilli = [dict(_event(i), source="kandilli") for i in range(30)]
+    afad = [_event(i) for i in range(30)]
+
+    assert feed.ingest(kandilli, seeded) == 0
+    assert feed.ingest(kandilli + afad, seeded) == 0
+    assert seeded == {"afad", "kandilli"}
+    assert feed.ingest(kandilli + afad + [_event(30)], seeded) == 1
+
+    assert sub in feed.subscribers and feed.dropped_clients == 0
+    assert [sub.queue.get_nowait()["id"] for _ in range(sub.queue.qsize())] == ["30"]
+    feed.unsubscribe(sub)
+
+
+def test_normalize_afad_event():
+    """AFAD payloads are mapped onto the common event shape."""
+    event = normalize_afad_event({"eventID": 42, "magnitude": "4.1", "latitude": "38.1",
+                                  "longitude": "27.2", "depth": "7", "location": "Izmir", "date": "2025-01-01"})
+    assert event["id"] == "42"
+    assert event["source"] == "afad"
+    assert event["magnitude"] == 4.1
+    assert event["latitude"] == 38.1
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import Base
+from app.models.risk import RiskData
+from app.services.risk_cache import RiskDataCache
+from app.services.risk_calculator import RiskCalculationService
+
+SCORES = {"earthquake_risk": 80.0, "flood_risk": 40.0, "fire_risk": 30.0, "landslide_risk": 20.0}
+
+
+def _cache(tmp_path, **kwargs):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    Base.metadata.create_all(bind=engine, tables=[RiskData.__table__])
+    kwargs.setdefault("max_age", timedelta(hours=1))
+    return RiskDataCache(session_factory=sessionmaker(bind=engine), version=1, precision=3, enabled=True, **kwargs)
+
+
+def test_get_put_by_quantized_location(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.get(41.00012, 29.00049) is None
+    assert cache.put(41.00012, 29.00049, None, SCORES, "Kadıköy")
+    # Within the same rounded cell, but a different building age is a separate entry
+    assert cache.get(41.0004, 29.0001) == SCORES
+    assert cache.get(41.0004, 29.0001, building_age=30) is None
+    assert cache.stats()["local_hits"] == 1 and cache.stats()["misses"] == 2
+    # Written behind: only the flush reaches risk_data, where another worker finds it
+    assert cache.stats()["pending"] == 1 and cache.stats()["stores"] == 0
+    assert cache.flush() == 1
+    other = RiskDataCache(session_factory=cache.session_factory, max_age=timedelta(hours=1), version=1,
+                          precision=3, enabled=True)
+    assert other.get(41.0004, 29.0001) == SCORES
+    assert other.get(41.0004, 29.0001) == SCORES
+    assert other.stats()["hits"] == 1 and other.stats()["local_hits"] == 1
+    cache.close()
+
+
+def test_stale_and_old_version_rows_are_misses(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put(41.0, 29.0, None, SCORES)
+    cache.close()
+    newer = RiskDataCache(session_factory=cache.session_factory, max_age=timedelta(hours=1), version=2,
+                          precision=3, enabled=True)
+    assert newer.get(41.0, 29.0) is None
+    expired = RiskDataCache(session_factory=cache.session_factory, max_age=timedelta(0), version=1,
+                            precision=3, enabled=True)
+    assert expired.get(41.0, 29.0) is None
+    assert newer.stats()["stale"] == 1 and expired.stats()["stale"] == 1
+
+
+def test_warm_keeps_newest_row_per_cell(tmp_path):
+    cache = _cache(tmp_path)
+    old, new = datetime.utcnow() - timedelta(minutes=10), datetime.utcnow()
+    rows = [
+        cache.row_for(41.0001, 29.0, None, {**SCORES, "flood_risk": 10.0}, updated_at=old),
+        cache.row_for(41.0002, 29.0, None, SCORES, updated_at=new),
+        cache.row_for(39.93, 32.86, 20, SCORES, updated_at=new),
+    ]
+    assert cache.warm(rows, batch_size=2) == 2  # the first two rows share a cell
+    assert cache.get(41.0, 29.0)["flood_risk"] == 40.0
+    # An older row loaded later does not overwrite a newer one
+    cache.warm([cache.row_for(41.0, 29.0, None, {**SCORES, "flood_risk": 5.0}, updated_at=old)])
+    assert cache.get(41.0, 29.0)["flood_risk"] == 40.0
+    with cache.session_factory() as db:
+        assert db.query(RiskData).count() == 2
+
+
+def test_warm_from_stored_results_skips_fallback_scores(tmp_path):
+    from app.models.analysis import AnalysisResult
+    from app.services.risk_cache import rows_from_stored_results
+
+    cache = _cache(tmp_path)
+    engine = create_engine(f"sqlite:///{tmp_path / 'results.db'}")
+    Base.metadata.create_all(bind=engine, tables=[AnalysisResult.__table__])
+    stored = {
+        "measured": {**SCORES, "latitude": 41.0, "longitude": 29.0, "used_fallback": False},
+        "estimated": {**SCORES, "latitude": 40.0, "longitude": 29.0, "used_fallback": True},
+        "unmarked": {**SCORES, "latitude": 39.0, "longitude": 29.0},
+    }
+    with engine.begin() as conn:
+        conn.execute(AnalysisResult.__table__.insert(), [
+            AnalysisResult.row_for(result, address, AnalysisResult.hash_result(result))
+            for address, result in stored.items()
+        ])
+
+    rows = list(rows_from_stored_results(cache, bind=engine))
+    assert [row["address"] for row in rows] == ["measured"]
+
+
+def test_service_reads_through_cache(tmp_path, monkeypatch):
+    cache = _cache(tmp_path)
+    service = RiskCalculationService(cache=cache)
+    service.simulated_api_failure_rate = 0
+    monkeypatch.setattr(service, "geocode_address", lambda address: (41.0082, 28.9784))
+
+    first = service.analyze_address("Istanbul")
+    calls = []
+    monkeypatch.setattr(service, "calculate_earthquake_risk", lambda lat, lon: calls.append(1) or 0.0)
+    second = service.analyze_address("Istanbul")
+
+    assert calls == []
+    assert first["used_fallback"] is False and second["used_fallback"] is False
+    assert second["earthquake_risk"] == first["earthquake_risk"]
+    assert second["overall_risk_score"] == first["overall_risk_score"]
+    cache.close()
+    assert cache.stats()["local_hits"] == 1 and cache.stats()["stores"] == 1
+
+
+def test_fallback_scores_are_not_cached(tmp_path, monkeypatch):
+    cache = _cache(tmp_path)
+    service = RiskCalculationService(cache=cache)
+    service.simulated_api_failure_rate = 1
+    monkeypatch.setattr(service, "geocode_address", lambda address: (41.0082, 28.9784))
+    assert service.analyze_address("Istanbul")["used_fallback"] is True
+    cache.close()
+    assert cache.stats()["stores"] == 0
+
+
+def test_database_errors_bypass_cache(tmp_path):
+    cache = RiskDataCache(session_factory=sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / 'none.db'}")),
+                          enabled=True)
+    assert cache.get(41.0, 29.0) is None
+    assert cache.put(41.0, 29.0, None, SCORES) is False
+    assert cache.stats()["errors"] == 1  # the failed read skips the cache for a while
+
+
+def test_writes_are_batched_behind(tmp_path):
+    cache = _cache(tmp_path, flush_interval=60)
+    for i in range(5):
+        cache.put(41.0 + i / 100, 29.0, None, SCORES)
+    cache.put(41.0, 29.0, None, {**SCORES, "flood_risk": 1.0})  # same cell: only the newest row is queued
+    with cache.session_factory() as db:
+        assert db.query(RiskData).count() == 0
+    cache.close()
+    with cache.session_factory() as db:
+        assert db.query(RiskData).count() == 5
+        assert db.query(RiskData).filter_by(cell_key=cache.cell_key(41.0, 29.0)).one().flood_risk == 1.0
+    assert cache.stats()["stores"] == 5 and cache.stats()["pending"] == 0
@@ -0,0 +1,76 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.b2b import get_nearby_analyses
+from app.db.session import Base
+from app.models.analysis import AnalysisResult
+from app.services import spatial
+from app.services.spatial import GridIndex, find_nearby, haversine_m
+
+
+def _add(db, address, lat, lon, score):
+    result = {"address": address, "latitude": lat, "longitude": lon, "overall_risk_score": score}
+    db.add(AnalysisResult(**AnalysisResult.row_for(result, address, AnalysisResult.hash_result(result))))
+
+
+def test_haversine_distance():
+    # Kadıköy pier to Beşiktaş pier is roughly 3.4 km across the Bosphorus
+    assert 3000 < haversine_m(40.9917, 29.0230, 41.0422, 29.0070) < 6000
+    assert haversine_m(41.0, 29.0, 41.0, 29.0) == 0
+
+
+def test_grid_search_only_returns_points_in_box():
+    index = GridIndex(cell_degrees=0.01)
+    index.add("a", 41.000, 29.000)
+    index.add("b", 41.005, 29.004)
+    index.add("c", 41.200, 29.200)
+    index.add("a", 41.000, 29.000)  # re-adding is a no-op
+    assert index.size == 3
+    assert sorted(h for h, _, _ in index.search((40.99, 28.99, 41.01, 29.01))) == ["a", "b"]
+
+
+def test_grid_search_walks_populated_cells_for_large_boxes():
+    index = GridIndex(cell_degrees=0.001)
+    index.add("a", 41.000, 29.000)
+    index.add("b", 39.900, 32.800)
+    # 1 degree by 4 degrees is 4 million cells but only two are populated
+    assert [h for h, _, _ in index.search((40.5, 28.5, 41.5, 32.5))] == ["a"]
+    assert sorted(h for h, _, _ in index.search((39.0, 28.0, 42.0, 33.0))) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_nearby_rejects_oversized_bbox():
+    with pytest.raises(HTTPException) as exc:
+        await get_nearby_analyses(lat=None, lon=None, radius_m=1000, bbox="36,26,42,45", limit=50,
+                                  api_key="key", db=None)
+    assert exc.value.status_code == 400
+
+
+def test_find_nearby_uses_grid_on_sqlite(tmp_path, monkeypatch):
+    """Without PostGIS, radius and bbox queries go through the in-process grid index."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'spatial.db'}")
+    Base.metadata.create_all(bind=engine, tables=[AnalysisResult.__table__])
+    monkeypatch.setattr(spatial, "grid_index", GridIndex(refresh_interval=0))
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        _add(db, "near", 41.0010, 29.0010, 40.0)
+        _add(db, "nearest", 41.0001, 29.0001, 60.0)
+        _add(db, "far", 41.1000, 29.1000, 90.0)
+        db.commit()
+
+        found = find_nearby(db, lat=41.0, lon=29.0, radius_m=500)
+        assert [a["address"] for a in found["analyses"]] == ["nearest", "near"]
+        assert found["analyses"][0]["distance_m"] < found["analyses"][1]["distance_m"]
+        assert found["summary"]["count"] == 2
+        assert found["summary"]["average_overall_risk_score"] == 50.0
+
+        boxed = find_nearby(db, bbox=(41.05, 29.05, 41.15, 29.15))
+        assert [a["address"] for a in boxed["analyses"]] == ["far"]
+        assert "distance_m" not in boxed["analyses"][0]
+
+        # Rows stored later are picked up on the next refresh
+        _add(db, "new", 41.0002, 29.0002, 10.0)
+        db.commit()
+        assert find_nearby(db, lat=41.0, lon=29.0, radius_m=500)["summary"]["count"] == 3
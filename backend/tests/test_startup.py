@@ -0,0 +1,18 @@
+from benchmarks.import_time import eager_lazy_modules, measure, parse_importtime
+
+
+def test_parse_importtime_output():
+    """Self and cumulative microseconds are parsed per module; the header is skipped."""
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   _io\n"
+        "import time:      3000 |       5400 | main\n"
+    )
+    assert parse_importtime(stderr) == [("_io", 120, 120), ("main", 3000, 5400)]
+
+
+def test_heavy_modules_are_not_imported_at_startup():
+    """Importing the app does not pull in geocoding, JWT, hashing or HTTP client stacks."""
+    rows = measure("main")
+    assert any(name == "main" for name, _, _ in rows)
+    assert eager_lazy_modules(rows) == []
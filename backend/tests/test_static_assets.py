@@ -0,0 +1,53 @@
+import gzip
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.static_assets import build_static_assets, PrecompressedStaticFiles
+
+
+def _build(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "app.js").write_text("console.log('risko');\n" * 100)
+    (src / "index.html").write_text('<html><script src="./app.js"></script>' + " " * 600 + "</html>")
+    out = tmp_path / "dist"
+    manifest = build_static_assets(str(src), str(out))
+    app = FastAPI()
+    app.mount("/app", PrecompressedStaticFiles(directory=str(out), html=True), name="frontend")
+    return manifest, TestClient(app)
+
+
+def test_build_fingerprints_and_rewrites_html(tmp_path):
+    """Hashed copies are written and HTML references point at them."""
+    manifest, client = _build(tmp_path)
+    hashed = manifest["app.js"]
+    assert hashed.startswith("app.") and hashed.endswith(".js") and hashed != "app.js"
+    assert (tmp_path / "dist" / (hashed + ".gz")).exists()
+    html = (tmp_path / "dist" / "index.html").read_text()
+    assert f'src="./{hashed}"' in html
+
+
+def test_serves_precompressed_variant_with_immutable_cache(tmp_path):
+    """Hashed assets are served from the .gz file with long-lived caching."""
+    manifest, client = _build(tmp_path)
+    resp = client.get(f"/app/{manifest['app.js']}", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "javascript" in resp.headers["content-type"]
+    assert "immutable" in resp.headers["cache-control"]
+    assert resp.text.startswith("console.log")
+
+    raw = (tmp_path / "dist" / (manifest["app.js"] + ".gz")).read_bytes()
+    assert gzip.decompress(raw).decode().startswith("console.log")
+
+
+def test_entry_points_revalidate_and_identity_fallback(tmp_path):
+    """HTML is revalidated, and clients without gzip get the plain file."""
+    manifest, client = _build(tmp_path)
+    resp = client.get("/app/", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["cache-control"] == "no-cache"
+
+    resp = client.get("/app/app.js", headers={"Accept-Encoding": "identity"})
+    assert resp.status_code == 200
+    assert "content-encoding" not in resp.headers
@@ -0,0 +1,112 @@
+import functools
+import time
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from app.services import supabase_auth
+from app.services.supabase_auth import JWKSCache, VerifiedTokenCache
+
+
+def _key_pair(kid):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+    public = jwk.construct(private.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo), "RS256").to_dict()
+    public = {k: v.decode() if isinstance(v, bytes) else v for k, v in public.items()}
+    return pem, {**public, "kid": kid, "use": "sig"}
+
+
+def _token(pem, kid, exp_in=300, sub="user-1"):
+    return jwt.encode({"sub": sub, "exp": int(time.time()) + exp_in}, pem, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def jwks_server(monkeypatch):
+    """Serves ``published`` as the JWKS and counts requests."""
+    state = {"keys": [], "requests": 0}
+
+    def handler(request):
+        state["requests"] += 1
+        return httpx.Response(200, json={"keys": state["keys"]})
+
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(supabase_auth.httpx, "AsyncClient", functools.partial(httpx.AsyncClient, transport=transport))
+    monkeypatch.setattr(supabase_auth.httpx, "get",
+                        lambda url, **kw: httpx.Client(transport=transport).get(url))
+    cache = JWKSCache(max_age=3600, min_refetch_interval=30, url="https://example.test/jwks.json")
+    monkeypatch.setattr(supabase_auth, "jwks_cache", cache)
+    monkeypatch.setattr(supabase_auth, "verified_tokens", VerifiedTokenCache(100))
+    return state
+
+
+@pytest.mark.asyncio
+async def test_verified_claims_are_cached(jwks_server):
+    pem, public = _key_pair("k1")
+    jwks_server["keys"] = [public]
+    token = _token(pem, "k1")
+
+    assert (await supabase_auth.verify_supabase_jwt_async(token))["sub"] == "user-1"
+    assert (await supabase_auth.verify_supabase_jwt_async(token))["sub"] == "user-1"
+    assert supabase_auth.verify_supabase_jwt(token)["sub"] == "user-1"
+    assert jwks_server["requests"] == 1
+    assert supabase_auth.verified_tokens.hits == 2
+    await supabase_auth.jwks_cache.stop()
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_refetch_is_rate_limited(jwks_server):
+    old_pem, old_public = _key_pair("old")
+    new_pem, new_public = _key_pair("new")
+    jwks_server["keys"] = [old_public]
+    await supabase_auth.verify_supabase_jwt_async(_token(old_pem, "old"))
+
+    # Key rotation: the first token with the new kid refetches the JWKS
+    jwks_server["keys"] = [old_public, new_public]
+    supabase_auth.jwks_cache._last_attempt -= 60
+    assert (await supabase_auth.verify_supabase_jwt_async(_token(new_pem, "new")))["sub"] == "user-1"
+    assert jwks_server["requests"] == 2
+
+    # Tokens with unknown kids right afterwards do not hit the endpoint again
+    for i in range(3):
+        with pytest.raises(ValueError):
+            await supabase_auth.verify_supabase_jwt_async(_token(new_pem, f"bogus-{i}"))
+    assert jwks_server["requests"] == 2
+    await supabase_auth.jwks_cache.stop()
+
+
+@pytest.mark.asyncio
+async def test_unconfigured_jwks_never_fetches_or_refreshes(monkeypatch):
+    """Without a JWKS URL (local auth) lookups find no key at once and no refresher starts."""
+    monkeypatch.setattr(supabase_auth.settings, "SUPABASE_JWKS_URL", None)
+    monkeypatch.setattr(supabase_auth.settings, "SUPABASE_URL", None)
+    cache = JWKSCache(max_age=3600, min_refetch_interval=30)
+    monkeypatch.setattr(supabase_auth, "jwks_cache", cache)
+    monkeypatch.setattr(supabase_auth, "verified_tokens", VerifiedTokenCache(100))
+    pem, _ = _key_pair("k1")
+
+    with pytest.raises(ValueError, match="No matching JWKS key"):
+        await supabase_auth.verify_supabase_jwt_async(_token(pem, "k1"))
+    with pytest.raises(ValueError, match="No matching JWKS key"):
+        supabase_auth.verify_supabase_jwt(_token(pem, "k1"))
+    assert cache._task is None
+    assert cache.fetches == 0 and cache.failures == 0
+
+
+def test_token_cache_is_bounded_and_expires():
+    cache = VerifiedTokenCache(max_size=2)
+    now = time.time()
+    cache.put("a", {"exp": now + 60})
+    cache.put("b", {"exp": now + 60})
+    assert cache.get("a") is not None  # a becomes most recently used
+    cache.put("c", {"exp": now + 60})
+    assert cache.get("b") is None and cache.get("a") is not None and len(cache) == 2
+
+    cache.put("expired", {"exp": now - 1})
+    assert cache.get("expired") is None
+    cache.put("no-exp", {"sub": "x"})
+    assert cache.get("no-exp") is None
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from app.api.auth import routes
+from app.db.session import Base
+from app.models.outbox import EmailOutbox
+from app.models.user import User, RefreshToken, PasswordResetToken
+from app.services import user_service
+from app.services.token_sweeper import TokenSweeper
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tokens.db'}")
+    Base.metadata.create_all(bind=engine, tables=[User.__table__, RefreshToken.__table__,
+                                                  PasswordResetToken.__table__, EmailOutbox.__table__])
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(User(name="Ayşe", email="ayse@example.com", password_hash="x"))
+        db.commit()
+    factory.engine = engine
+    return factory
+
+
+def test_tokens_are_stored_hashed_and_looked_up_by_index(session_factory):
+    with session_factory() as db:
+        user = db.query(User).one()
+        refresh = routes.create_refresh_token(subject=user.email)
+        user_service.store_refresh_token(db, user, refresh, routes.refresh_token_expiry())
+        reset = user_service.create_password_reset_token(db, user)
+        db.commit()
+
+        stored = db.query(RefreshToken).one()
+        assert stored.token_hash == user_service.hash_token(refresh) != refresh
+        assert db.query(PasswordResetToken).one().token_hash == user_service.hash_token(reset)
+
+        assert user_service.get_active_refresh_token(db, refresh) is not None
+        assert user_service.get_valid_password_reset(db, reset) is not None
+        plan = db.execute(text("EXPLAIN QUERY PLAN SELECT id FROM refresh_tokens WHERE token_hash = 'x'")).fetchall()
+        assert "ix_refresh_tokens_token_hash" in str(plan)
+
+        assert user_service.revoke_refresh_token(db, refresh)
+        db.commit()
+        assert user_service.get_active_refresh_token(db, refresh) is None
+
+
+def test_sweeper_deletes_expired_and_revoked_in_batches(session_factory):
+    now = datetime.utcnow()
+    with session_factory() as db:
+        user = db.query(User).one()
+        for i in range(7):
+            user_service.store_refresh_token(db, user, f"expired-{i}", now - timedelta(minutes=1))
+        user_service.store_refresh_token(db, user, "live", now + timedelta(days=1))
+        user_service.store_refresh_token(db, user, "revoked", now + timedelta(days=1))
+        user_service.revoke_refresh_token(db, "revoked")
+        db.add(PasswordResetToken(user_id=user.id, token_hash="old", expires_at=now - timedelta(hours=1)))
+        db.add(PasswordResetToken(user_id=user.id, token_hash="new", expires_at=now + timedelta(hours=1)))
+        db.commit()
+
+    sweeper = TokenSweeper(session_factory, batch_size=3)
+    statements = []
+    event.listen(session_factory.engine, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]) if args[2].startswith("DELETE") else None)
+    assert sweeper.sweep() == {"refresh_tokens": 8, "password_reset_tokens": 1, "email_outbox": 0}
+    # 8 rows in batches of 3 (3 + 3 + 2), then one batch each for the reset tokens and the outbox
+    assert len(statements) == 5
+
+    with session_factory() as db:
+        assert [rt.token_hash for rt in db.query(RefreshToken)] == [user_service.hash_token("live")]
+        assert [t.token_hash for t in db.query(PasswordResetToken)] == ["new"]
+    assert sweeper.sweep() == {"refresh_tokens": 0, "password_reset_tokens": 0, "email_outbox": 0}
+    assert sweeper.stats()["deleted"]["refresh_tokens"] == 8
+    assert 'auth_tokens_swept_total{table="refresh_tokens"} 8' in sweeper.openmetrics_lines()
+
+
+def test_sweeper_deletes_finished_outbox_mail(session_factory):
+    with session_factory() as db:
+        db.add_all([EmailOutbox(to_email="a@example.com", subject="Konu", body=f"link-{status}", status=status)
+                    for status in ("pending", "sent", "failed")])
+        db.commit()
+
+    assert TokenSweeper(session_factory).sweep()["email_outbox"] == 2
+    with session_factory() as db:
+        assert [row.status for row in db.query(EmailOutbox)] == ["pending"]
+
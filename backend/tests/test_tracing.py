@@ -0,0 +1,58 @@
+import json
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.tracing import TracingMiddleware, SpanExporter, span, traced
+
+
+@traced("stage.inner")
+def _inner():
+    return 42
+
+
+def _client(sample_rate, exporter):
+    app = FastAPI()
+
+    @app.get("/work")
+    def work():
+        with span("stage.outer"):
+            value = _inner()
+        return {"value": value}
+
+    app.add_middleware(TracingMiddleware, sample_rate=sample_rate, exporter=exporter)
+    return TestClient(app)
+
+
+def test_sampled_request_gets_server_timing(tmp_path):
+    """Stage spans appear in Server-Timing and in the OTLP/JSON export."""
+    export_file = tmp_path / "traces.jsonl"
+    exporter = SpanExporter(file_path=str(export_file))
+    client = _client(1.0, exporter)
+
+    resp = client.get("/work")
+    assert resp.json() == {"value": 42}
+    timing = resp.headers["server-timing"]
+    assert "stage.outer;dur=" in timing
+    assert "stage.inner;dur=" in timing
+    assert "total;dur=" in timing
+
+    for _ in range(100):
+        if export_file.exists() and export_file.read_text():
+            break
+        time.sleep(0.02)
+    payload = json.loads(export_file.read_text().splitlines()[0])
+    spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    by_name = {s["name"]: s for s in spans}
+    assert by_name["stage.inner"]["parentSpanId"] == by_name["stage.outer"]["spanId"]
+    assert len({s["traceId"] for s in spans}) == 1
+
+
+def test_unsampled_request_is_untouched():
+    """With a zero sample rate spans are no-ops and no header is added."""
+    exporter = SpanExporter()
+    client = _client(0.0, exporter)
+    resp = client.get("/work")
+    assert resp.json() == {"value": 42}
+    assert "server-timing" not in resp.headers
+    with span("outside") as s:
+        assert s is None
@@ -0,0 +1,102 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.api.auth import routes
+from app.db.session import Base
+from app.models.user import User, RefreshToken
+from app.services import user_service
+from app.services.user_cache import UserCache
+
+
+class FakeChannel:
+    def __init__(self):
+        self.published = []
+        self.callback = None
+
+    def publish(self, subject):
+        self.published.append(subject)
+
+    def subscribe(self, callback):
+        self.callback = callback
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    Base.metadata.create_all(bind=engine, tables=[User.__table__, RefreshToken.__table__])
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    cache = UserCache(ttl=60)
+    monkeypatch.setattr(routes, "user_cache", cache)
+    monkeypatch.setattr(user_service, "user_cache", cache)
+    monkeypatch.setattr(user_service, "get_password_hash", lambda password: f"hashed:{password}")
+    session = sessionmaker(bind=engine)()
+    session.add(User(name="Ayşe", email="ayse@example.com", password_hash="x"))
+    session.commit()
+    session.queries = queries
+    session.cache = cache
+    yield session
+    session.close()
+
+
+def _bearer(email="ayse@example.com"):
+    return f"Bearer {routes.create_access_token(subject=email)}"
+
+
+def test_second_lookup_skips_database(db):
+    first = routes.get_current_user_from_token(_bearer(), db)
+    count = len(db.queries)
+    second = routes.get_current_user_from_token(_bearer(), db)
+    assert second == first and second.email == "ayse@example.com"
+    assert len(db.queries) == count
+    assert db.cache.stats()["hits"] == 1
+
+
+def test_password_change_and_deactivation_invalidate(db):
+    routes.get_current_user_from_token(_bearer(), db)
+    user = db.query(User).filter_by(email="ayse@example.com").one()
+    user_service.update_user_password(db, user, "new-password")
+    assert db.cache.get("ayse@example.com") is None
+
+    routes.get_current_user_from_token(_bearer(), db)
+    user_service.deactivate_user(db, user)
+    with pytest.raises(HTTPException) as exc:
+        routes.get_current_user_from_token(_bearer(), db)
+    assert exc.value.status_code == 401
+
+
+def test_logout_invalidates(db):
+    routes.get_current_user_from_token(_bearer(), db)
+    user = db.query(User).filter_by(email="ayse@example.com").one()
+    refresh = routes.create_refresh_token(subject=user.email)
+    user_service.store_refresh_token(db, user, refresh, routes.refresh_token_expiry())
+    db.commit()
+    routes.logout(routes.LogoutRequest(refresh_token=refresh), db)
+    assert db.cache.get("ayse@example.com") is None
+
+
+def test_invalidation_is_broadcast_and_received():
+    channel = FakeChannel()
+    cache = UserCache(ttl=60, channel=channel)
+    cache.put("a@example.com", "A")
+    cache.put("b@example.com", "B")
+    assert cache.get("a@example.com") == "A"
+
+    cache.invalidate("a@example.com")
+    assert channel.published == ["a@example.com"]
+    # Another worker's invalidation arrives through the subscription
+    channel.callback("b@example.com")
+    assert cache.get("b@example.com") is None
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_entries_expire_and_are_bounded():
+    cache = UserCache(ttl=0.0)
+    cache.put("a", "A")
+    assert cache.get("a") is None
+    cache = UserCache(ttl=60, max_size=1)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") is None and cache.get("b") == "B"
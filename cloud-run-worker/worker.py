@@ -1,29 +1,51 @@
 #!/usr/bin/env python3
 """
 Simple Cloud Run worker PoC that polls a Supabase 'jobs' table via the REST API
-using the service role key, marks jobs as running, performs a CPU-bound dummy
-computation (simulating heavy analysis), writes a row into `cached_results`, and
-updates the job status to 'done'.
+using the service role key, leases pending jobs in batches, runs the backend's
+RiskCalculationService over the addresses in each job payload, writes a row
+into `cached_results`, and updates the job status to 'done'. A job whose
+normalized input already has an unexpired `cached_results` row (same
+`input_hash`) is completed with that row instead of being recomputed.
 
 This is intentionally minimal and meant as a PoC. It requires the following
 environment variables to be set at runtime:
   - SUPABASE_URL (e.g. https://xxxx.supabase.co)
   - SUPABASE_SERVICE_ROLE_KEY (service role key, keep secret)
   - POLL_INTERVAL (optional, seconds, default 5)
+  - LEASE_BATCH_SIZE (optional, jobs claimed per lease call, default 5)
+  - WORKER_PROCESSES (optional, compute processes, default 1; 0 = one per CPU)
+  - PREFETCH (optional, leased jobs buffered beyond the busy processes, default 2)
+  - DATABASE_URL (optional, Postgres connection string; enables LISTEN/NOTIFY wake-ups)
+  - SAFETY_POLL_INTERVAL (optional, seconds between polls while listening, default 60)
+  - LEASE_SECONDS / HEARTBEAT_INTERVAL / REAP_INTERVAL (optional, job lease length, heartbeat and
+    reaper periods in seconds, defaults 300 / 100 / 60)
+  - MAX_ATTEMPTS / RETRY_BACKOFF_SECONDS (optional, attempts per job and base retry delay, defaults 5 / 30)
+  - WRITE_BATCH_SIZE / WRITE_BATCH_DELAY (optional, finished jobs written back per request and how
+    long to wait for more in seconds, defaults 20 / 0.2)
+  - HTTP_POOL_SIZE (optional, keep-alive connections to Supabase, default 4)
+  - RESULT_TTL_SECONDS (optional, how long results are reused for equal inputs, default 7 days)
   - WORKER_ID (optional, for logging)
 
 Do NOT commit secrets into the repo. Use Cloud Run environment variables or
 Secret Manager to pass the service role key.
 """
 import os
+import sys
 import time
+import select
+import threading
+import functools
+import multiprocessing
+import queue
 import uuid
 import json
-import math
 import logging
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("cloud-run-worker")
@@ -32,12 +54,35 @@ logger = logging.getLogger("cloud-run-worker")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "5"))
+LEASE_BATCH_SIZE = int(os.getenv("LEASE_BATCH_SIZE", "5"))
+# 1 = single process; >1 = supervisor with that many compute processes; 0 = one per CPU
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1")) or (os.cpu_count() or 1)
+PREFETCH = int(os.getenv("PREFETCH", "2"))
+# Direct Postgres connection used only to LISTEN for new jobs (optional)
+DATABASE_URL = os.getenv("DATABASE_URL")
+NOTIFY_CHANNEL = os.getenv("NOTIFY_CHANNEL", "jobs_pending")
+SAFETY_POLL_INTERVAL = float(os.getenv("SAFETY_POLL_INTERVAL", "60"))
+# A leased job is re-queued if its worker stops heartbeating for LEASE_SECONDS
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "300"))
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", str(LEASE_SECONDS / 3)))
+REAP_INTERVAL = float(os.getenv("REAP_INTERVAL", "60"))
+# Failed attempts are retried after RETRY_BACKOFF_SECONDS * 2^(attempt-1), up to MAX_ATTEMPTS attempts
+MAX_ATTEMPTS = int(os.getenv("MAX_ATTEMPTS", "5"))
+RETRY_BACKOFF_SECONDS = int(os.getenv("RETRY_BACKOFF_SECONDS", "30"))
+# Finished jobs are written back in bulk: up to WRITE_BATCH_SIZE per request,
+# waiting at most WRITE_BATCH_DELAY seconds for a batch to fill
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "20"))
+WRITE_BATCH_DELAY = float(os.getenv("WRITE_BATCH_DELAY", "0.2"))
+# Threads calling Supabase at once: the main loop, the lease keeper and the result writer
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "4"))
+# How long a stored result is reused for equivalent inputs
+RESULT_TTL_SECONDS = int(os.getenv("RESULT_TTL_SECONDS", str(7 * 24 * 3600)))
+# RiskCalculationService comes from the backend package (backend/app); the image copies it next to this file
+BACKEND_PATH = os.getenv("BACKEND_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+if os.path.isdir(os.path.join(BACKEND_PATH, "app")) and BACKEND_PATH not in sys.path:
+    sys.path.insert(0, BACKEND_PATH)
 WORKER_ID = os.getenv("WORKER_ID", str(uuid.uuid4())[:8])
 
-if not SUPABASE_URL or not SERVICE_ROLE_KEY:
-    logger.error("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
-    raise SystemExit(1)
-
 
 HEADERS = {
     "apikey": SERVICE_ROLE_KEY,
@@ -46,125 +91,481 @@ HEADERS = {
 }
 
 
-def lease_job() -> Optional[dict]:
-    """Attempt to find one queued job and atomically mark it as 'running'.
-    We use the Supabase REST API: GET jobs where status=queued, then PATCH the
-    same row to set status=running and worker_id. This is a simple lease and
-    may race; for production use prefer Postgres advisory locks or
-    SELECT...FOR UPDATE via a dedicated worker DB connection.
+def make_session() -> requests.Session:
+    """One keep-alive session for every Supabase call, so TLS connections are reused.
+
+    The pool blocks instead of opening throwaway connections when more than
+    HTTP_POOL_SIZE threads call at once.
+    """
+    s = requests.Session()
+    s.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, pool_block=True)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+session = make_session()
+
+
+class JobNotifier:
+    """Blocks until the jobs insert trigger sends NOTIFY (or a timeout passes).
+
+    Uses one autocommit psycopg2 connection that only LISTENs. If the
+    connection is down, waiting degrades to sleeping POLL_INTERVAL and the
+    next wait reconnects, so the worker never depends on it for correctness.
+    """
+
+    def __init__(self, dsn: str, channel: str = NOTIFY_CHANNEL):
+        self.dsn = dsn
+        self.channel = channel
+        self._conn = None
+
+    def connect(self) -> bool:
+        if self._conn is not None:
+            return True
+        try:
+            import psycopg2  # only needed when DATABASE_URL is set
+
+            conn = psycopg2.connect(self.dsn)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN "{self.channel}"')
+            self._conn = conn
+            logger.info("Listening for new jobs on channel %s", self.channel)
+            return True
+        except Exception as e:
+            logger.warning("LISTEN connection failed, falling back to polling: %s", e)
+            return False
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def wait(self, timeout: float) -> bool:
+        """True if a notification arrived; at most ``timeout`` seconds (POLL_INTERVAL when disconnected)."""
+        if not self.connect():
+            time.sleep(POLL_INTERVAL)
+            return False
+        try:
+            if not self._conn.notifies:
+                select.select([self._conn], [], [], timeout)
+                self._conn.poll()
+            notified = bool(self._conn.notifies)
+            self._conn.notifies.clear()
+            return notified
+        except Exception as e:
+            logger.warning("LISTEN connection lost: %s", e)
+            self.close()
+            return False
+
+
+notifier = JobNotifier(DATABASE_URL) if DATABASE_URL else None
+
+
+def wait_for_jobs():
+    """Idle until new jobs may be available: a NOTIFY when listening, else a fixed poll interval."""
+    if notifier is not None:
+        notifier.wait(SAFETY_POLL_INTERVAL)
+    else:
+        time.sleep(POLL_INTERVAL)
+
+
+def rpc(function: str, params: dict, timeout: float = 10):
+    """Call a Postgres function through PostgREST and return its decoded result."""
+    r = session.post(f"{SUPABASE_URL}/rest/v1/rpc/{function}", data=json.dumps(params), timeout=timeout)
+    r.raise_for_status()
+    return r.json()
+
+
+def _ids(rows) -> set:
+    """Values of a SETOF uuid function result (PostgREST returns scalars or one-key objects)."""
+    return {row if isinstance(row, str) else next(iter(row.values())) for row in rows or []}
+
+
+class LeaseKeeper:
+    """Keeps this worker's job leases alive and reaps the expired leases of others.
+
+    Leased jobs are held from lease until their final status is written. A
+    daemon thread extends all held leases with one ``heartbeat_jobs`` call
+    every HEARTBEAT_INTERVAL seconds and calls ``reap_expired_jobs`` every
+    REAP_INTERVAL seconds, which re-queues (with backoff) or fails jobs whose
+    worker stopped heartbeating.
+    """
+
+    def __init__(self):
+        self._held = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def hold(self, jobs: List[dict]):
+        with self._lock:
+            self._held.update(j["id"] for j in jobs)
+
+    def release(self, job_id):
+        with self._lock:
+            self._held.discard(job_id)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="lease-keeper", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        last_beat = last_reap = time.monotonic()
+        while True:
+            time.sleep(min(HEARTBEAT_INTERVAL, REAP_INTERVAL))
+            try:
+                if time.monotonic() - last_beat >= HEARTBEAT_INTERVAL:
+                    last_beat = time.monotonic()
+                    self.heartbeat()
+                if time.monotonic() - last_reap >= REAP_INTERVAL:
+                    last_reap = time.monotonic()
+                    self.reap()
+            except Exception:
+                logger.exception("Lease heartbeat/reap failed")
+
+    def heartbeat(self):
+        with self._lock:
+            held = list(self._held)
+        if not held:
+            return
+        kept = rpc("heartbeat_jobs", {"p_worker_id": WORKER_ID, "p_job_ids": held, "p_lease_seconds": LEASE_SECONDS})
+        lost = set(held) - _ids(kept)
+        if lost:
+            # Reaped after missed heartbeats; the job may already run elsewhere
+            logger.warning("Lost lease on job(s) %s", ", ".join(map(str, lost)))
+
+    def reap(self) -> int:
+        reaped = rpc("reap_expired_jobs", {"p_max_attempts": MAX_ATTEMPTS, "p_backoff_seconds": RETRY_BACKOFF_SECONDS})
+        if reaped:
+            logger.info("Reaped %s job(s) with expired leases", reaped)
+        return reaped or 0
+
+
+leases = LeaseKeeper()
+
+
+def lease_jobs(limit: int = LEASE_BATCH_SIZE) -> List[dict]:
+    """Claim up to ``limit`` due pending jobs for this worker in one round-trip.
+
+    Calls the ``lease_jobs`` Postgres function (backend/sql/create_jobs_tables.sql)
+    through PostgREST. It marks the rows 'running' with a lease of
+    LEASE_SECONDS, counts the attempt and returns them in a single statement
+    using FOR UPDATE SKIP LOCKED, so concurrent replicas never claim the same
+    job and never wait on each other's locks.
     """
-    url = f"{SUPABASE_URL}/rest/v1/jobs"
-    params = {
-        "status": "eq.queued",
-        "limit": 1,
-        "order": "created_at.asc",
-        "select": "*",
-    }
     try:
-        resp = requests.get(url, headers=HEADERS, params=params, timeout=10)
-        resp.raise_for_status()
-        items = resp.json()
-        if not items:
-            return None
-        job = items[0]
-
-        # Try to claim the job
-        job_id = job.get("id")
-        claim_url = f"{url}?id=eq.{job_id}"
-        patch = {"status": "running", "worker_id": WORKER_ID, "started_at": "now()"}
-        p = requests.patch(claim_url, headers=HEADERS, data=json.dumps(patch), timeout=10)
-        if p.status_code in (200, 204):
-            logger.info("Leased job %s", job_id)
-            # Re-fetch to get latest row
-            r2 = requests.get(f"{url}?id=eq.{job_id}&select=*", headers=HEADERS, timeout=10)
-            r2.raise_for_status()
-            refreshed = r2.json()[0]
-            return refreshed
-        else:
-            logger.info("Failed to claim job %s (status %s)", job_id, p.status_code)
-            return None
+        jobs = rpc("lease_jobs", {"p_worker_id": WORKER_ID, "p_limit": limit, "p_lease_seconds": LEASE_SECONDS}) or []
+        if jobs:
+            leases.hold(jobs)
+            logger.info("Leased %d job(s): %s", len(jobs), ", ".join(str(j.get("id")) for j in jobs))
+        return jobs
     except Exception as e:
-        logger.exception("Error leasing job: %s", e)
-        return None
+        logger.exception("Error leasing jobs: %s", e)
+        return []
+
 
+def job_items(payload) -> List[Tuple[str, Optional[int]]]:
+    """(address, building_age) pairs of a job payload.
 
-def heavy_compute(seed: int) -> dict:
-    """Simulate heavy CPU work. We'll compute a moderately expensive value
-    deterministically from the seed (e.g., sum of fibonacci numbers or
-    repeated prime testing). Returns a dict with metadata and numeric result.
+    Accepts the shapes normalize_job_input (create_jobs_tables.sql) hashes:
+    {"addresses": [...]}, a single {"address": ...} object or a bare list,
+    where items are address strings or {"address", "building_age"} objects.
     """
-    # Simple CPU-bound task: compute the sum of first N fibonacci numbers mod big prime
-    n = max(30, min(1000, seed % 500 + 30))
-    a, b = 0, 1
-    total = 0
-    for i in range(n):
-        a, b = b, a + b
-        total += a
-        # Introduce some non-trivial work
-        if i % 50 == 0:
-            _ = math.isqrt(total)
-    result = total % 1000000007
-    return {"n": n, "result": result}
-
-
-def write_cached_result(job: dict, result: dict) -> Optional[int]:
-    url = f"{SUPABASE_URL}/rest/v1/cached_results"
-    payload = {
-        "job_id": job.get("id"),
-        "result": result,
-        "created_at": "now()",
+    if isinstance(payload, list):
+        entries = payload
+    elif isinstance(payload, dict) and "addresses" in payload:
+        entries = payload["addresses"] or []
+    elif isinstance(payload, dict) and "address" in payload:
+        entries = [payload]
+    else:
+        raise ValueError("payload has no addresses")
+    items = []
+    for entry in entries:
+        if isinstance(entry, str):
+            items.append((entry, None))
+        else:
+            age = entry.get("building_age")
+            items.append((entry["address"], int(age) if age not in (None, "") else None))
+    return items
+
+
+def _utc_iso(delta: timedelta = timedelta(0)) -> str:
+    return (datetime.now(timezone.utc) + delta).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def find_cached_results(hashes: List[str]) -> Dict[str, str]:
+    """Newest unexpired ``cached_results`` id per input hash, in one request."""
+    if not hashes:
+        return {}
+    params = {
+        "select": "id,input_hash",
+        "input_hash": f"in.({','.join(sorted(set(hashes)))})",
+        "or": f"(expires_at.is.null,expires_at.gt.{_utc_iso()})",
+        "order": "created_at.desc",
     }
     try:
-        r = requests.post(url, headers=HEADERS, data=json.dumps(payload), timeout=10)
+        r = session.get(f"{SUPABASE_URL}/rest/v1/cached_results", params=params, timeout=10)
         r.raise_for_status()
-        # Supabase returns the created row(s)
-        created = r.json()
-        if created and isinstance(created, list):
-            return created[0].get("id")
-        return None
+        found: Dict[str, str] = {}
+        for row in r.json():
+            found.setdefault(row["input_hash"], row["id"])
+        return found
     except Exception:
-        logger.exception("Failed to write cached_result")
-        return None
-
-
-def update_job_completion(job_id: int, status: str, result_id: Optional[int] = None, error: Optional[str] = None):
-    url = f"{SUPABASE_URL}/rest/v1/jobs?id=eq.{job_id}"
-    payload = {"status": status}
-    if result_id is not None:
-        payload["cached_result_id"] = result_id
-    if error:
-        payload["error"] = error
-    payload["completed_at"] = "now()"
+        logger.exception("Failed to look up cached results")
+        return {}
+
+
+def reuse_cached_results(jobs: List[dict]) -> List[dict]:
+    """Complete jobs whose input already has an unexpired result; returns the jobs left to compute."""
+    found = find_cached_results([j["input_hash"] for j in jobs if j.get("input_hash")])
+    remaining = []
+    reused: Dict[str, str] = {}
+    for job in jobs:
+        result_id = found.get(job.get("input_hash"))
+        if result_id is None:
+            remaining.append(job)
+            continue
+        logger.info("Job %s reuses cached result %s", job.get("id"), result_id)
+        reused[job["id"]] = result_id
+    complete_jobs(reused)
+    for job_id in reused:
+        leases.release(job_id)
+    return remaining
+
+
+def write_cached_results(finished: List[Tuple[dict, dict]]) -> Dict[str, str]:
+    """Insert one ``cached_results`` row per (job, result) in a single request; returns result id per job id."""
+    if not finished:
+        return {}
+    rows = []
+    for job, result in finished:
+        # Results with failed addresses (e.g. geocoding errors) or fallback estimates (a data source
+        # failed) are stored for the job but never reused
+        reusable = not result.get("errors") and not result.get("fallbacks")
+        ttl = timedelta(seconds=RESULT_TTL_SECONDS) if reusable else timedelta(0)
+        rows.append({
+            "job_id": job.get("id"),
+            "input": job.get("payload"),
+            "input_hash": job.get("input_hash"),
+            "output": result,
+            "expires_at": _utc_iso(ttl),
+        })
     try:
-        r = requests.patch(url, headers=HEADERS, data=json.dumps(payload), timeout=10)
+        r = session.post(f"{SUPABASE_URL}/rest/v1/cached_results", headers={"Prefer": "return=representation"},
+                         data=json.dumps(rows), timeout=30)
         r.raise_for_status()
-        logger.info("Updated job %s to %s", job_id, status)
+        # Supabase returns the created rows
+        return {row["job_id"]: row["id"] for row in r.json() or []}
+    except Exception:
+        logger.exception("Failed to write %d cached_result(s)", len(rows))
+        return {}
+
+
+def complete_jobs(result_ids: Dict[str, str]):
+    """Mark jobs done with their result ids through one ``complete_jobs`` call."""
+    if not result_ids:
+        return
+    params = {"p_worker_id": WORKER_ID,
+              "p_results": [{"id": job_id, "result_id": result_id} for job_id, result_id in result_ids.items()]}
+    try:
+        done = _ids(rpc("complete_jobs", params, timeout=30))
+        logger.info("Completed %d job(s): %s", len(done), ", ".join(sorted(map(str, done))))
+        lost = set(result_ids) - done
+        if lost:
+            logger.warning("Job(s) %s were no longer leased by this worker", ", ".join(map(str, lost)))
     except Exception:
-        logger.exception("Failed updating job status for %s", job_id)
+        # The leases expire and the reaper re-queues the jobs
+        logger.exception("Failed to complete job(s) %s", ", ".join(map(str, result_ids)))
+
+
+_risk_service = None
+
+
+def compute_job(job: dict) -> dict:
+    """Risk analysis of every address in the job; runs in a pool process in supervisor mode."""
+    global _risk_service
+    if _risk_service is None:
+        # Backend code, imported on first use in each process. No risk_data cache: the backend's cache
+        # lives in the API database, and results are reused through cached_results instead
+        from app.services.risk_calculator import RiskCalculationService
+
+        _risk_service = RiskCalculationService(cache=None)
+    results = [_risk_service.analyze_address(address, age) for address, age in job_items(job.get("payload"))]
+    return {"results": results, "count": len(results), "errors": sum(1 for r in results if "error" in r),
+            "fallbacks": sum(1 for r in results if r.get("used_fallback"))}
+
+
+def retry_or_fail_job(job: dict, error: BaseException):
+    """Give the job back for a later attempt (with backoff) or fail it after MAX_ATTEMPTS."""
+    job_id = job.get("id")
+    try:
+        status = rpc("retry_or_fail_job", {
+            "p_job_id": job_id, "p_worker_id": WORKER_ID, "p_error": str(error)[:1000],
+            "p_max_attempts": MAX_ATTEMPTS, "p_backoff_seconds": RETRY_BACKOFF_SECONDS,
+        })
+        if status == "failed":
+            logger.error("Job %s failed after %s attempt(s): %s", job_id, job.get("attempts"), error)
+        elif status == "pending":
+            logger.warning("Job %s attempt %s failed, will be retried: %s", job_id, job.get("attempts"), error)
+        else:
+            logger.warning("Job %s failed but its lease was already lost: %s", job_id, error)
+    except Exception:
+        # The lease expires and the reaper retries the job
+        logger.exception("Failed to record failure of job %s", job_id)
+
+
+def finish_jobs(finished: List[Tuple[dict, Optional[dict], Optional[BaseException]]]):
+    """The network part after computing: store the results and close the jobs, in bulk.
+
+    ``finished`` holds (job, result, error) triples. Successful jobs cost two
+    requests per batch; failed ones (rare), and jobs whose result could not
+    be stored, are handed back one by one.
+    """
+    try:
+        for job, _, error in finished:
+            if error is not None:
+                retry_or_fail_job(job, error)
+        done = [(job, result) for job, result, error in finished if error is None]
+        result_ids = write_cached_results(done)
+        # A job is only done once its result is stored; otherwise it is retried like a failed attempt
+        for job, _ in done:
+            if job["id"] not in result_ids:
+                retry_or_fail_job(job, RuntimeError("result could not be stored"))
+        complete_jobs({job["id"]: result_ids[job["id"]] for job, _ in done if job["id"] in result_ids})
+    finally:
+        for job, _, _ in finished:
+            leases.release(job.get("id"))
+
+
+def run_job(job: dict) -> Tuple[dict, Optional[dict], Optional[BaseException]]:
+    logger.info("Processing job %s", job.get("id"))
+    try:
+        return job, compute_job(job), None
+    except Exception as e:
+        return job, None, e
+
+
+class ResultWriter:
+    """Collects finished jobs from the compute pool and writes them back in bulk.
+
+    A daemon thread takes the first finished job, waits up to
+    WRITE_BATCH_DELAY seconds for up to WRITE_BATCH_SIZE in total and passes
+    them to ``finish_jobs``; ``on_written`` then gets the batch size so the
+    supervisor can lease more.
+    """
+
+    def __init__(self, on_written: Callable[[int], None], max_batch: int = WRITE_BATCH_SIZE,
+                 max_delay: float = WRITE_BATCH_DELAY):
+        self.on_written = on_written
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Tuple[dict, Optional[dict], Optional[BaseException]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def put(self, job: dict, result: Optional[dict] = None, error: Optional[BaseException] = None):
+        self._queue.put((job, result, error))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="result-writer", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                finish_jobs(batch)
+            except Exception:
+                logger.exception("Failed to write back %d job(s)", len(batch))
+            finally:
+                self.on_written(len(batch))
 
 
 def main_loop():
-    logger.info("Starting worker %s, polling %ss", WORKER_ID, POLL_INTERVAL)
+    logger.info("Starting worker %s, polling %ss, leasing up to %d jobs", WORKER_ID, POLL_INTERVAL, LEASE_BATCH_SIZE)
+    if notifier is not None:
+        # LISTEN before the first lease so no insert between the two is missed
+        notifier.connect()
+    leases.start()
     while True:
-        job = lease_job()
-        if not job:
-            time.sleep(POLL_INTERVAL)
+        jobs = lease_jobs()
+        if not jobs:
+            wait_for_jobs()
             continue
+        # Compute the whole leased batch, then write it back in two requests
+        finish_jobs([run_job(job) for job in reuse_cached_results(jobs)])
 
-        job_id = job.get("id")
-        try:
-            seed = job.get("seed", int(time.time())) if job else int(time.time())
-            logger.info("Processing job %s (seed=%s)", job_id, seed)
-            result = heavy_compute(int(seed))
-            result_id = write_cached_result(job, result)
-            update_job_completion(job_id, "done", result_id=result_id)
-        except Exception as e:
-            logger.exception("Error processing job %s: %s", job_id, e)
-            update_job_completion(job_id, "errored", error=str(e))
+
+def supervisor_loop(processes: int, prefetch: int = PREFETCH):
+    """Run jobs on ``processes`` worker processes, overlapping network I/O with compute.
+
+    The main thread leases jobs whenever fewer than ``processes + prefetch``
+    are in flight, so the pool always has the next job queued when a process
+    frees up. Results are written back in batches by a ResultWriter thread
+    while the processes are already computing the following jobs.
+    """
+    capacity = processes + prefetch
+    in_flight = 0
+    cond = threading.Condition()
+
+    def release(count: int):
+        nonlocal in_flight
+        with cond:
+            in_flight -= count
+            cond.notify()
+
+    writer = ResultWriter(release)
+
+    def on_done(job: dict, future):
+        error = future.exception()
+        writer.put(job, None if error else future.result(), error)
+
+    logger.info("Starting supervisor %s: %d processes, %d prefetched, polling %ss",
+                WORKER_ID, processes, prefetch, POLL_INTERVAL)
+    if notifier is not None:
+        notifier.connect()
+    leases.start()
+    writer.start()
+    # Spawned (not forked) processes: no inherited LISTEN socket or locks held by the I/O threads
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        while True:
+            with cond:
+                cond.wait_for(lambda: in_flight < capacity)
+                free = capacity - in_flight
+            leased = lease_jobs(min(free, LEASE_BATCH_SIZE))
+            if not leased:
+                wait_for_jobs()
+                continue
+            jobs = reuse_cached_results(leased)
+            with cond:
+                in_flight += len(jobs)
+            for job in jobs:
+                logger.info("Processing job %s", job.get("id"))
+                future = pool.submit(compute_job, job)
+                # A dead pool process breaks the pool; every later submit raises and the container restarts
+                future.add_done_callback(functools.partial(on_done, job))
 
 
 if __name__ == "__main__":
+    if not SUPABASE_URL or not SERVICE_ROLE_KEY:
+        logger.error("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
+        raise SystemExit(1)
     try:
-        main_loop()
+        if WORKER_PROCESSES > 1:
+            supervisor_loop(WORKER_PROCESSES)
+        else:
+            main_loop()
     except KeyboardInterrupt:
         logger.info("Worker interrupted, exiting")
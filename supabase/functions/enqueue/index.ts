@@ -11,24 +11,30 @@ serve(async (req) => {
     const { user_id, input } = body
     if (!input) return new Response(JSON.stringify({ error: 'missing input' }), { status: 400 })
 
-    // Insert a new job into Supabase Postgres via REST
-    const insertResp = await fetch(`${Deno.env.get('SUPABASE_URL')}/rest/v1/jobs`, {
+    // Reuse an unexpired result for an equivalent input, else insert a new job (enqueue_job in create_jobs_tables.sql)
+    const enqueueResp = await fetch(`${Deno.env.get('SUPABASE_URL')}/rest/v1/rpc/enqueue_job`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
         'apikey': serviceKey,
         'Authorization': `Bearer ${serviceKey}`
       },
-      body: JSON.stringify([{ user_id: user_id || null, payload: input }])
+      body: JSON.stringify({ p_input: input, p_user_id: user_id || null })
     })
 
-    const text = await insertResp.text()
-    if (!insertResp.ok) {
-      return new Response(text, { status: insertResp.status, headers: { 'Content-Type': 'application/json' } })
+    const text = await enqueueResp.text()
+    if (!enqueueResp.ok) {
+      return new Response(text, { status: enqueueResp.status, headers: { 'Content-Type': 'application/json' } })
+    }
+
+    const outcome = JSON.parse(text)
+    if (outcome.cached) {
+      // Cache hit: the result is returned directly and no job is created
+      return new Response(JSON.stringify({ cached: true, result: outcome.result }), { status: 200, headers: { 'Content-Type': 'application/json' } })
     }
 
     // Return inserted job (array) to caller
-    return new Response(text, { status: 201, headers: { 'Content-Type': 'application/json' } })
+    return new Response(JSON.stringify([outcome.job]), { status: 201, headers: { 'Content-Type': 'application/json' } })
   } catch (e) {
     return new Response(JSON.stringify({ error: String(e) }), { status: 500, headers: { 'Content-Type': 'application/json' } })
   }